@@ -0,0 +1,230 @@
+import json
+import time
+from collections import OrderedDict
+
+import boto3
+from botocore.exceptions import ClientError
+from notifier import parse_repository_details
+
+
+EMPTY_REVISION = {
+    'commit_id': None,
+    'commit_message': None,
+    'commit_url': None,
+    'repo_owner': '',
+    'repo': '',
+}
+
+
+class RevisionCache():
+    """Commit metadata of pipeline executions, keyed by (pipeline, execution id).
+
+    An execution sends 8-12 state changes that all need the same artifactRevisions, so
+    they are fetched with GetPipelineExecution once and then served from:
+      - an LRU of max_entries entries living for ttl seconds in the warm container
+      - optionally the DynamoDB table_name, shared by every container, whose items
+        expire through the table's TTL on expiresAt
+
+    The revisions only exist once the Source stage has succeeded, so executions
+    without them are never cached, and the Source SUCCEEDED event refreshes the entry.
+    """
+
+    def __init__(self, codepipeline, table_name=None, ttl=3600, max_entries=128) -> None:
+        self.codepipeline = codepipeline
+        self.table = boto3.resource('dynamodb').Table(table_name) if table_name else None
+        self.ttl = ttl
+        self._local = LocalCache(ttl, max_entries)
+
+
+    def get(self, pipeline_name, execution_id, refresh=False):
+        key = f"{pipeline_name}#{execution_id}"
+
+        if not refresh:
+            revision = self._local.get(key)
+            if revision is None and self.table:
+                revision = self._get_shared(key)
+                if revision is not None:
+                    self._local.put(key, revision)
+            if revision is not None:
+                return revision
+
+        revision = self._fetch(pipeline_name, execution_id)
+        if revision['commit_id'] is not None:
+            self._local.put(key, revision)
+            if self.table:
+                self._put_shared(key, revision)
+        return revision
+
+
+    def _fetch(self, pipeline_name, execution_id):
+        response = self.codepipeline.get_pipeline_execution(
+            pipelineName=pipeline_name,
+            pipelineExecutionId=execution_id
+        )
+
+        print(f"Pipeline Execution {json.dumps(response, default=str)}")
+
+        # Revision summary isn't included until the Source stage Succeeds
+        artifact_revisions = response['pipelineExecution']['artifactRevisions']
+        if len(artifact_revisions) == 0:
+            return dict(EMPTY_REVISION)
+
+        revision_summary = json.loads(artifact_revisions[0]['revisionSummary'])
+        commit_url = artifact_revisions[0]['revisionUrl']
+        repo_owner, repo = parse_repository_details(commit_url)
+        return {
+            'commit_id': artifact_revisions[0]['revisionId'],
+            'commit_message': revision_summary['CommitMessage'],
+            'commit_url': commit_url,
+            'repo_owner': repo_owner,
+            'repo': repo,
+        }
+
+
+    def _get_shared(self, key):
+        item = self.table.get_item(Key={'executionKey': key}).get('Item')
+        # DynamoDB deletes expired items within a few days, not straight away. An item with only the
+        # ThreadStore attributes has no revision yet
+        if item is None or item['expiresAt'] <= time.time() or item.get('commit_id') is None:
+            return None
+        return {name: item.get(name) for name in EMPTY_REVISION}
+
+
+    def _put_shared(self, key, revision):
+        # The item is shared with ThreadStore, only set the revision's attributes
+        put_attributes(self.table, key, self.ttl, revision)
+
+
+class ThreadStore():
+    """The Slack message (channel id, ts) posted for each pipeline execution, which the
+    later events of the execution update and reply to.
+
+    Kept in the warm container and, with table_name, in the DynamoDB table of
+    RevisionCache so every container threads under the same message. The first
+    container to store a message for an execution wins, see claim.
+    """
+
+    def __init__(self, table_name=None, ttl=3600, max_entries=128) -> None:
+        self.table = boto3.resource('dynamodb').Table(table_name) if table_name else None
+        self.ttl = ttl
+        self._local = LocalCache(ttl, max_entries)
+        # The latest state notified per action, a few actions per execution
+        self._states = LocalCache(ttl, max_entries * 8)
+
+
+    def get(self, pipeline_name, execution_id):
+        key = f"{pipeline_name}#{execution_id}"
+        thread = self._local.get(key)
+        if thread is None and self.table:
+            thread = self._get_shared(key)
+            if thread is not None:
+                self._local.put(key, thread)
+        return thread
+
+
+    def claim(self, pipeline_name, execution_id, channel, ts):
+        """Stores (channel, ts) for the execution unless another container stored one
+        first. Returns the (channel, ts) stored"""
+        key = f"{pipeline_name}#{execution_id}"
+        thread = (channel, ts)
+        if self.table:
+            try:
+                put_attributes(
+                    self.table, key, self.ttl, {'threadChannel': channel, 'threadTs': ts},
+                    ConditionExpression="attribute_not_exists(threadTs)"
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                thread = self._get_shared(key, consistent=True) or thread
+        self._local.put(key, thread)
+        return thread
+
+
+    def advance(self, pipeline_name, execution_id, action_key, order):
+        """Records order as the latest state notified for one action of the execution,
+        unless a later one was already notified. Returns whether it was recorded, the
+        event being notified again (a retry) counts as recorded.
+
+        order is a string that sorts like the states, see app.state_order
+        """
+        key = f"{pipeline_name}#{execution_id}#{action_key}"
+        notified = self._states.get(key)
+        if notified is not None and notified > order:
+            return False
+        if self.table:
+            try:
+                put_attributes(
+                    self.table, f"{pipeline_name}#{execution_id}", self.ttl, {f"state#{action_key}": order},
+                    ConditionExpression="attribute_not_exists(#a0) OR #a0 <= :a0"
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                return False
+        self._states.put(key, order)
+        return True
+
+
+    def forget(self, pipeline_name, execution_id):
+        """Drops the message of an execution, after it was deleted in Slack"""
+        key = f"{pipeline_name}#{execution_id}"
+        self._local.pop(key)
+        if self.table:
+            self.table.update_item(
+                Key={'executionKey': key},
+                UpdateExpression="REMOVE threadChannel, threadTs"
+            )
+
+
+    def _get_shared(self, key, consistent=False):
+        item = self.table.get_item(Key={'executionKey': key}, ConsistentRead=consistent).get('Item')
+        if item is None or 'threadTs' not in item or item['expiresAt'] <= time.time():
+            return None
+        return (item['threadChannel'], item['threadTs'])
+
+
+class LocalCache():
+    """An LRU of at most max_entries values, each living for ttl seconds"""
+
+    def __init__(self, ttl, max_entries) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+    def pop(self, key):
+        self._entries.pop(key, None)
+
+
+def put_attributes(table, key, ttl, attributes, **kwargs):
+    """Sets attributes on the item of an execution, leaving its other attributes alone,
+    and pushes back its expiry"""
+    names = {f"#a{i}": name for i, name in enumerate(attributes)}
+    values = {f":a{i}": value for i, value in enumerate(attributes.values())}
+    table.update_item(
+        Key={'executionKey': key},
+        UpdateExpression="SET expiresAt = :expiresAt, " + ", ".join(f"#a{i} = :a{i}" for i in range(len(attributes))),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={':expiresAt': int(time.time() + ttl), **values},
+        **kwargs
+    )
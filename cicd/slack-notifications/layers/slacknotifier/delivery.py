@@ -0,0 +1,112 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# (connect, read) seconds. Without them a stalled hooks.slack.com holds the Lambda until its timeout
+CONNECT_TIMEOUT = float(os.environ.get('SLACK_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('SLACK_READ_TIMEOUT', 10))
+
+# A 429 is retried after its Retry-After, as long as that is no more than MAX_RETRY_AFTER seconds
+MAX_ATTEMPTS = int(os.environ.get('SLACK_MAX_ATTEMPTS', 4))
+MAX_RETRY_AFTER = 30
+
+SLACK_API_URL = os.environ.get('SLACK_API_URL', 'https://slack.com/api')
+
+# Connections kept alive per host, and webhook posts sent at once by post_many
+POOL_SIZE = 10
+
+# Created on first use and reused by every warm invocation, so only the first post of a container
+# pays for DNS, TCP and TLS to hooks.slack.com
+_session = None
+_executor = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        _session.mount('https://', adapter)
+        _session.mount('http://', adapter)
+    return _session
+
+
+def post(webhook_url, message, session=None, headers=None):
+    """Posts message to a Slack webhook over the pooled session, retrying 429s after
+    their Retry-After. Returns the last response"""
+    session = session or get_session()
+    # bytes, so http.client sends it in the same packet as the headers
+    data = json.dumps(message).encode()
+    headers = {'Content-Type': 'application/json; charset=utf-8', **(headers or {})}
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        response = session.post(
+            url=webhook_url,
+            data=data,
+            headers=headers,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        if response.status_code != 429 or attempt == MAX_ATTEMPTS:
+            break
+
+        retry_after = get_retry_after(response)
+        if retry_after > MAX_RETRY_AFTER:
+            break
+        print(f"Slack rate limited the webhook, retrying in {retry_after}s")
+        time.sleep(retry_after)
+
+    if response.status_code != 200:
+        print(f"Slack webhook returned {response.status_code}: {response.text}")
+    return response
+
+
+def api_call(method, payload, token, session=None):
+    """Calls a Slack Web API method (chat.postMessage, chat.update...) with a bot token.
+    Returns the response body, whose 'ok' says if it worked"""
+    response = post(f"{SLACK_API_URL}/{method}", payload, session, headers={'Authorization': f"Bearer {token}"})
+    try:
+        body = response.json()
+    except ValueError:
+        body = {'ok': False, 'error': f"HTTP {response.status_code}"}
+    if not body.get('ok'):
+        print(f"Slack {method} failed: {body.get('error')}")
+    return body
+
+
+def post_many(webhook_urls, messages, session=None):
+    """Posts messages[i] to webhook_urls[i], all at once. Returns the responses in the
+    same order"""
+    if len(webhook_urls) == 1:
+        return [post(webhook_urls[0], messages[0], session)]
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=POOL_SIZE)
+    return list(_executor.map(lambda target: post(*target, session), zip(webhook_urls, messages)))
+
+
+def send(message, webhook_urls, channels=None, session=None):
+    """Sends message to every webhook, once per channel when channels are given"""
+    if not channels:
+        return post_many(webhook_urls, [message] * len(webhook_urls), session)
+
+    targets = [(url, {**message, 'channel': channel}) for url in webhook_urls for channel in channels]
+    return post_many([url for url, _ in targets], [message for _, message in targets], session)
+
+
+def get_retry_after(response):
+    try:
+        return max(float(response.headers.get('Retry-After', 1)), 0)
+    except ValueError:
+        # Retry-After can also be an HTTP date, Slack only sends seconds
+        return 1
+
+
+def split_env(value):
+    """Splits a comma separated environment variable, dropping the empty entries"""
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
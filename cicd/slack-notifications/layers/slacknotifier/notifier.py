@@ -0,0 +1,191 @@
+import os
+import boto3
+import time
+import delivery
+from urllib.parse import urlparse, parse_qs
+
+
+# Resolved on first use: from the event's 'account', ACCOUNT_ID, or STS as a last resort, so the cold start
+# doesn't wait on an STS round trip before the handler runs
+_account_id = os.environ.get('ACCOUNT_ID') or None
+
+FOOTER_ICON = "https://a.slack-edge.com/production-standard-emoji-assets/13.0/google-medium/1f6a8.png" # You can replace this with the URL of your desired footer icon
+COMMIT_MESSAGE_LIMIT = 120
+
+# With the Web API (SLACK_MODE=api) each execution gets one message that its later events update. 'failures'
+# also replies in its thread for failures, 'all' for every event
+THREAD_REPLIES = os.environ.get('SLACK_THREAD_REPLIES', 'failures')
+
+# Compiled once, rendered with str.format for every message
+PRETEXT = "{status_icon} *<{pipeline_link}|AWS CodePipeline | {pipeline_name} | {region} | {account_id} >*".format
+FALLBACK = "{status_icon} *<{pipeline_link}|AWS CodePipeline | {region} | {account_id} >*".format
+COMMIT = "Commit Message: _{commit_message}_\nCommit: <https://github.com/{repo_owner}/{repo}/commit/{commit_id}|*{commit_id_short}*>".format
+FOOTER = "AWS CodePipeline | Execution: *<{execution_link}|{execution_id} >*".format
+
+
+def get_account_id(event_account=None):
+    global _account_id
+    if event_account:
+        _account_id = event_account
+    elif _account_id is None:
+        _account_id = boto3.client("sts").get_caller_identity()["Account"]
+    return _account_id
+
+
+def parse_repository_details(commit_url):
+    """Gets (owner, repo) from the FullRepositoryId of a CodeStar connection revision URL"""
+    # Parse the URL
+    parsed_url = urlparse(commit_url)
+    # Extract query parameters
+    query_params = parse_qs(parsed_url.query)
+    # Extract the FullRepositoryId parameter
+    full_repository_id = query_params.get('FullRepositoryId', [None])[0]
+    if full_repository_id:
+        owner_repo = full_repository_id.split('/')
+        if len(owner_repo) == 2:
+            return owner_repo[0], owner_repo[1]
+    return None, None
+
+
+class SlackNotifier():
+    slack_channel = os.environ['SLACK_CHANNEL']
+    # Comma separated, the message is posted to each of them
+    slack_channels = delivery.split_env(slack_channel)
+    display_name = os.environ.get('SLACK_DISPLAY_NAME', 'CI/CD Alerts')
+    display_icon = os.environ.get('SLACK_DISPLAY_ICON', ':incoming_envelope:')
+
+    def __init__(self, region, pipeline_name, execution_id, commit_url, commit_message, commit_id, stage, action, state, category, account_id=None, threads=None) -> None:
+        # Comma separated, the message goes to every webhook
+        self.webhook_urls = delivery.split_env(os.environ['SLACK_WEBHOOK_URL'])
+        self.execution_link = f"https://{region}.console.aws.amazon.com/codesuite/codepipeline/pipelines/{pipeline_name}/executions/{execution_id}/timeline?region={region}"
+        self.pipeline_link = f"https://{region}.console.aws.amazon.com/codesuite/codepipeline/pipelines/{pipeline_name}/view?region={region}"
+        self.region = region
+        self.pipeline_name = pipeline_name
+        self.execution_id = execution_id
+        self.commit_url = commit_url
+        self.commit_message = commit_message
+        self.commit_id = commit_id
+        self.stage = stage
+        self.action = action
+        self.state = state
+        self.category = category
+        self.account_id = get_account_id(account_id)
+        # cache.ThreadStore of the messages posted through the Web API, None for webhooks
+        self.threads = threads
+        self.execution_summary = ''
+        self.error_code = ''
+        parsed_details = self._parse_repository_details(self.commit_url)
+        self.repo_owner, self.repo = parsed_details if commit_url is not None else ('', '')
+
+
+    def _parse_repository_details(self, commit_url):
+        return parse_repository_details(commit_url)
+
+
+    def notify(self, route, execution_result=None):
+        """Sends the message of a routes.Route, execution_result being the event's detail.execution-result"""
+        if route.channel:
+            self.slack_channel = route.channel
+            self.slack_channels = [route.channel]
+        if route.webhook_urls:
+            self.webhook_urls = route.webhook_urls
+
+        if route.template == 'failed':
+            self.execution_summary = execution_result['external-execution-summary']
+            self.error_code = execution_result['error-code']
+            self.send_failed_message(status_icon=route.icon, color=route.color)
+        else:
+            self.send_message(status_icon=route.icon, color=route.color)
+
+
+    def send_failed_message(self, status_icon, color):
+        self._send(self.render_message(status_icon, color, failed=True), failed=True)
+
+
+    def send_message(self, status_icon, color):
+        self._send(self.render_message(status_icon, color))
+
+
+    def render_message(self, status_icon, color, failed=False):
+        commit_id_short = None
+        if self.commit_id is not None:
+            commit_id_short = self.commit_id[:7]
+
+        commit_message = self.commit_message
+        if commit_message is not None and len(commit_message) > COMMIT_MESSAGE_LIMIT:
+            commit_message = f"{commit_message[:COMMIT_MESSAGE_LIMIT - 1]}..."
+
+        header = {
+            "status_icon": status_icon,
+            "pipeline_link": self.pipeline_link,
+            "pipeline_name": self.pipeline_name,
+            "region": self.region,
+            "account_id": self.account_id,
+        }
+        fields = [
+            {
+                "title": f"Pipeline {self.category} Action {self.state}",
+                "value": COMMIT(commit_message=commit_message, repo_owner=self.repo_owner, repo=self.repo, commit_id=self.commit_id, commit_id_short=commit_id_short)
+            }
+        ]
+        if failed:
+            fields.append({
+                "title": f"Failure Reason: {self.error_code}",
+                "value": f"```\n{self.execution_summary}\n```"
+            })
+        fields.append({"title": "Stage", "value": self.stage, "short": True})
+        fields.append({"title": "Action", "value": self.action, "short": True})
+
+        return {
+            "channel": self.slack_channel, # Override channel to send messages to
+            "username": self.display_name, # Override display name
+            "icon_emoji": self.display_icon,
+            "attachments": [
+                {
+                    "fallback": FALLBACK(**header), # Hyperlink
+                    "pretext": PRETEXT(**header),
+                    "color": color,
+                    "fields": fields,
+                    "footer": FOOTER(execution_link=self.execution_link, execution_id=self.execution_id),
+                    "footer_icon": FOOTER_ICON,
+                    "ts": time.time()
+                }
+            ]
+        }
+
+
+    def _send(self, message, failed=False):
+        if self.threads is None:
+            delivery.send(message, self.webhook_urls, self.slack_channels if len(self.slack_channels) > 1 else None)
+        else:
+            self._send_to_thread(message, failed)
+
+
+    def _send_to_thread(self, message, failed):
+        token = os.environ['SLACK_BOT_TOKEN']
+        payload = {
+            "username": message["username"],
+            "icon_emoji": message["icon_emoji"],
+            "attachments": message["attachments"],
+        }
+
+        thread = self.threads.get(self.pipeline_name, self.execution_id)
+        if thread is not None:
+            channel, ts = thread
+            response = delivery.api_call('chat.update', {"channel": channel, "ts": ts, "attachments": message["attachments"]}, token)
+            if response.get('error') == 'message_not_found':
+                self.threads.forget(self.pipeline_name, self.execution_id)
+            else:
+                if failed or THREAD_REPLIES == 'all':
+                    # Failures are broadcast to the channel as well
+                    delivery.api_call('chat.postMessage', {**payload, "channel": channel, "thread_ts": ts, "reply_broadcast": failed}, token)
+                return
+
+        response = delivery.api_call('chat.postMessage', {**payload, "channel": self.slack_channels[0]}, token)
+        if not response.get('ok'):
+            return
+        channel, ts = self.threads.claim(self.pipeline_name, self.execution_id, response['channel'], response['ts'])
+        if ts != response['ts']:
+            # Another container posted the execution's message first, move this event into its thread
+            delivery.api_call('chat.delete', {"channel": response['channel'], "ts": response['ts']}, token)
+            delivery.api_call('chat.postMessage', {**payload, "channel": channel, "thread_ts": ts}, token)
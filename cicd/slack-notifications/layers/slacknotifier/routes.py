@@ -0,0 +1,92 @@
+import json
+import os
+from collections import namedtuple
+
+
+SUCCESS_COLOR = "#34bb13"
+FAILURE_COLOR = "#D00000"
+
+# How an event is notified. template is 'message' or 'failed' (adds the failure reason), channel and webhook_urls
+# replace SLACK_CHANNEL and SLACK_WEBHOOK_URL for the events of the route when they are set
+Route = namedtuple('Route', ['icon', 'color', 'template', 'channel', 'webhook_urls'], defaults=[None, None])
+
+CATEGORY_ICONS = {
+    'Source': os.environ.get('SOURCE_ICON', ':pushpin:'),
+    'Approval': os.environ.get('APPROVAL_ICON', ':spiral_note_pad:'),
+    'Build': os.environ.get('BUILD_ICON', ':hammer_and_wrench:'),
+    'Test': os.environ.get('TEST_ICON', ':test_tube:'),
+    'Deploy': os.environ.get('DEPLOY_ICON', ':rocket:'),
+    'Invoke': os.environ.get('INVOKE_ICON', ':zap:'),
+}
+
+
+def default_routes():
+    """(category, state) -> Route of the events notified out of the box. Source only has a commit to show once it
+    succeeded, and CANCELED isn't notified"""
+    routes = {}
+    for category, icon in CATEGORY_ICONS.items():
+        if category != 'Source':
+            routes[(category, 'STARTED')] = Route(icon, SUCCESS_COLOR, 'message')
+        routes[(category, 'SUCCEEDED')] = Route(icon, SUCCESS_COLOR, 'message')
+        routes[(category, 'FAILED')] = Route(':x:', FAILURE_COLOR, 'failed')
+    return routes
+
+
+class RoutingTable(dict):
+    """(pipeline or None, category, state) -> Route, None for the events that aren't notified. A pipeline without
+    overrides takes the routes of None, copied under its name the first time it is looked up, so every event after
+    that is a single dict access"""
+
+    def __missing__(self, key):
+        _, category, state = key
+        route = self[key] = self.get((None, category, state))
+        return route
+
+
+def load_routes(config=None):
+    """Builds the routing table, (pipeline or None, category, state) -> Route, from the defaults and the JSON in
+    NOTIFIER_ROUTES (or the file named by NOTIFIER_ROUTES_FILE):
+
+        {
+            "*": {"Build:FAILED": {"channel": "#build-failures"}},
+            "prod-pipeline": {"Deploy:SUCCEEDED": {"icon": ":tada:"}, "Build:STARTED": null}
+        }
+
+    "*" changes the routes of every pipeline. An override is merged into the route it replaces, null stops the
+    event being notified, and a new (category, state) needs at least icon, color and template.
+    """
+    if config is None:
+        config = os.environ.get('NOTIFIER_ROUTES')
+        if not config and os.environ.get('NOTIFIER_ROUTES_FILE'):
+            with open(os.environ['NOTIFIER_ROUTES_FILE']) as f:
+                config = f.read()
+        config = json.loads(config) if config else {}
+
+    defaults = default_routes()
+    routes = RoutingTable(((None, category, state), route) for (category, state), route in defaults.items())
+
+    # "*" first, the pipeline overrides are merged on top of it
+    for pipeline in sorted(config, key=lambda name: name != '*'):
+        for event, override in config[pipeline].items():
+            category, state = event.split(':')
+            key = (None if pipeline == '*' else pipeline, category, state)
+            base = routes.get(key) or routes.get((None, category, state))
+
+            if override is None:
+                routes[key] = None
+            elif base is None:
+                routes[key] = Route(**override)
+            else:
+                routes[key] = base._replace(**override)
+
+    # The overridden pipelines get every route they don't override from None, they never fall back at lookup
+    for pipeline in config.keys() - {'*'}:
+        for _, category, state in [key for key in routes if key[0] is None]:
+            routes.setdefault((pipeline, category, state), routes[(None, category, state)])
+
+    return routes
+
+
+def resolve(routes, pipeline_name, category, state):
+    """The Route of an event, None when it isn't notified"""
+    return routes[(pipeline_name, category, state)]
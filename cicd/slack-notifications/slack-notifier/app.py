@@ -1,19 +1,53 @@
 import os
 import boto3
 import json
+from cache import RevisionCache, ThreadStore
 from notifier import SlackNotifier
+import routes
 
 
 client = boto3.client('codepipeline')
 
+# Commit metadata per pipeline execution, kept by the warm container and, if REVISION_CACHE_TABLE is set, in
+# DynamoDB for the other containers
+revisions = RevisionCache(
+    client,
+    table_name=os.environ.get('REVISION_CACHE_TABLE'),
+    ttl=int(os.environ.get('REVISION_CACHE_TTL', 3600)),
+    max_entries=int(os.environ.get('REVISION_CACHE_SIZE', 128))
+)
+
+# 'webhook' posts a message per event, 'api' posts one message per execution with the Slack Web API (SLACK_BOT_TOKEN)
+# and updates it, sharing the message ts through REVISION_CACHE_TABLE when it is set
+SLACK_MODE = os.environ.get('SLACK_MODE', 'webhook')
+# Whether the STARTED/SUCCEEDED/CANCELED events come through the coalescing queue, behind the failures
+COALESCE_EVENTS = os.environ.get('COALESCE_EVENTS', 'false') == 'true'
+# The messages of the executions in api mode, and the latest state notified per action whenever the events can
+# arrive out of order
+threads = ThreadStore(
+    table_name=os.environ.get('REVISION_CACHE_TABLE'),
+    ttl=int(os.environ.get('REVISION_CACHE_TTL', 3600))
+) if SLACK_MODE == 'api' or COALESCE_EVENTS else None
+
 REGION = os.environ['AWS_REGION']
 
-SOURCE_ICON = os.environ.get('SOURCE_ICON', ':pushpin:')
-APPROVAL_ICON = os.environ.get('APPROVAL_ICON', ':spiral_note_pad:')
-BUILD_ICON = os.environ.get('BUILD_ICON', ':hammer_and_wrench:')
-DEPLOY_ICON = os.environ.get('DEPLOY_ICON', ':rocket:')
+# (pipeline, category, state) -> routes.Route, from the defaults and NOTIFIER_ROUTES
+ROUTES = routes.load_routes()
+
+# Order of the states of one action, for the events of a batch sent in the same second
+STATE_ORDER = {'STARTED': 0, 'SUCCEEDED': 1, 'CANCELED': 1, 'FAILED': 2}
+
+
+def state_order(pipeline_event):
+    """(event time, state order) of an action's state change, as a string that sorts the same way"""
+    return f"{pipeline_event['time']}#{STATE_ORDER.get(pipeline_event['detail']['state'], 0)}"
+
 
 def handler(event, context):
+    # SQS batch of the coalescing queue
+    if 'Records' in event:
+        return batch_handler(event, context)
+
     print(json.dumps(event))
 
 
@@ -25,28 +59,28 @@ def handler(event, context):
     stage = event['detail']['stage']
     action = event['detail']['action']
 
+    route = routes.resolve(ROUTES, pipeline_name, category, state)
+    if route is None:
+        print(f"No route for {category} {state}, not notifying")
+        return
 
+    # With coalescing, a failure is delivered straight away while the earlier states of the action wait in the
+    # queue. Updating the execution's message with one of them would undo the failure
+    if threads is not None and not threads.advance(pipeline_name, execution_id, f"{stage}#{action}", state_order(event)):
+        print(f"A later state than {state} of {stage} {action} was already notified, dropping it")
+        return
 
-    response = client.get_pipeline_execution(
-        pipelineName=pipeline_name,
-        pipelineExecutionId=execution_id
-    )
 
-    print(f"Pipeline Execution {json.dumps(response)}")
-
-    commit_message = None
-    commit_id = None
-    commit_url = None
-
-
-    # Revision summary isn't included until the Source stage Succeeds
-    artifact_revisions = response['pipelineExecution']['artifactRevisions']
-    if len(artifact_revisions) > 0:
-        revision_summary_str = artifact_revisions[0]['revisionSummary']
-        revision_summary = json.loads(revision_summary_str)
-        commit_message = revision_summary['CommitMessage']
-        commit_id = artifact_revisions[0]['revisionId']
-        commit_url = artifact_revisions[0]['revisionUrl']
+    # The commit is the same for every event of the execution, only fetch it again when the Source stage
+    # has just produced it
+    revision = revisions.get(
+        pipeline_name,
+        execution_id,
+        refresh=(category == "Source" and state == "SUCCEEDED")
+    )
+    commit_message = revision['commit_message']
+    commit_id = revision['commit_id']
+    commit_url = revision['commit_url']
 
 
     slack = SlackNotifier(
@@ -59,48 +93,48 @@ def handler(event, context):
         stage,
         action,
         state,
-        category
+        category,
+        # EventBridge already says which account the pipeline runs in
+        account_id=event.get('account'),
+        threads=threads if SLACK_MODE == 'api' else None
     )
 
-    
-    if category == "Source":
-        if state == "SUCCEEDED":
-            slack.send_message(status_icon=SOURCE_ICON, color="#34bb13")
-        elif state == "FAILED":
-            slack.execution_summary = event['detail']['execution-result']['external-execution-summary']
-            slack.error_code = event['detail']['execution-result']['error-code']
-            
-            slack.send_failed_message(status_icon=":x:", color="#D00000")
-
-
-    if category == "Approval":
-        if state == "STARTED":
-            slack.send_message(status_icon=APPROVAL_ICON, color="#34bb13")
-        elif state == "SUCCEEDED":
-            slack.send_message(status_icon=APPROVAL_ICON, color="#34bb13")
-        elif state == "FAILED":
-            slack.execution_summary = event['detail']['execution-result']['external-execution-summary']
-            slack.error_code = event['detail']['execution-result']['error-code']
-            slack.send_failed_message(status_icon=":x:", color="#D00000")
-    
-    if category == "Build":
-        if state == "STARTED":
-            slack.send_message(status_icon=BUILD_ICON, color="#34bb13")
-        elif state == "SUCCEEDED":
-            slack.send_message(status_icon=BUILD_ICON, color="#34bb13")
-        elif state == "FAILED":
-            slack.execution_summary = event['detail']['execution-result']['external-execution-summary']
-            slack.error_code = event['detail']['execution-result']['error-code']
-            
-            slack.send_failed_message(status_icon=":x:", color="#D00000")
-    
-    if category == "Deploy":
-        if state == "STARTED":
-            slack.send_message(status_icon=DEPLOY_ICON, color="#34bb13")
-        elif state == "SUCCEEDED":
-            slack.send_message(status_icon=DEPLOY_ICON, color="#34bb13")
-        elif state == "FAILED":
-            slack.execution_summary = event['detail']['execution-result']['external-execution-summary']
-            slack.error_code = event['detail']['execution-result']['error-code']
-            
-            slack.send_failed_message(status_icon=":x:", color="#D00000")
\ No newline at end of file
+    slack.notify(route, event['detail'].get('execution-result'))
+
+
+def batch_handler(event, context):
+    """Handles a batch of the coalescing SQS queue, where EventBridge sends every state change except failures.
+
+    The transitions of the same (execution-id, stage, action) are collapsed to the latest one before a message
+    is sent for it, so an action that started and succeeded within the batching window sends one message.
+
+    Returns
+    ------
+    batchItemFailures: the SQS messageIds to retry
+    """
+    latest = {}
+    for record in event['Records']:
+        pipeline_event = json.loads(record['body'])
+        detail = pipeline_event['detail']
+        key = (detail['execution-id'], detail['stage'], detail['action'])
+        order = state_order(pipeline_event)
+
+        message_ids = [record['messageId']]
+        if key in latest:
+            message_ids += latest[key][2]
+            if latest[key][0] > order:
+                latest[key][2] = message_ids
+                continue
+        latest[key] = [order, pipeline_event, message_ids]
+
+    print(f"Coalesced {len(event['Records'])} state changes into {len(latest)}")
+
+    failures = []
+    for order, pipeline_event, message_ids in sorted(latest.values(), key=lambda entry: entry[0]):
+        try:
+            handler(pipeline_event, context)
+        except Exception as e:
+            print(f"Couldn't notify {pipeline_event['id']}: {e!r}")
+            failures += [{"itemIdentifier": message_id} for message_id in message_ids]
+
+    return {"batchItemFailures": failures}
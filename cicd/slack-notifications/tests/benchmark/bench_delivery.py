@@ -0,0 +1,60 @@
+"""Latency of Slack webhook posts with and without the pooled session of delivery.py,
+against the local webhook stand-in.
+
+The stand-in sleeps HANDSHAKE_DELAY on every new connection for the DNS/TCP/TLS setup
+to hooks.slack.com, and RESPONSE_DELAY on every post. "unpooled" is requests.post,
+like notifier.py used to, which opens a connection per message.
+
+run from cicd/slack-notifications/:
+    python -m tests.benchmark.bench_delivery
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "layers", "slacknotifier"))
+
+import delivery  # noqa: E402
+from tests.webhook_server import WebhookServer  # noqa: E402
+
+
+HANDSHAKE_DELAY = 0.03
+RESPONSE_DELAY = 0.01
+MESSAGES = 50
+WEBHOOKS = 4
+MESSAGE = {"channel": "#deployments", "attachments": [{"pretext": "x" * 400, "fields": [{"title": "Stage"}] * 4}]}
+
+
+def unpooled_post(url, message):
+    return requests.post(url=url, data=json.dumps(message), timeout=(delivery.CONNECT_TIMEOUT, delivery.READ_TIMEOUT))
+
+
+def p50_ms(post):
+    latencies = []
+    for _ in range(MESSAGES):
+        start = time.perf_counter()
+        post()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def main():
+    with WebhookServer(HANDSHAKE_DELAY, RESPONSE_DELAY) as server:
+        urls = [f"{server.url}/{i}" for i in range(WEBHOOKS)]
+
+        unpooled = p50_ms(lambda: unpooled_post(urls[0], MESSAGE))
+        pooled = p50_ms(lambda: delivery.post(urls[0], MESSAGE))
+        print(f"one webhook        unpooled p50 {unpooled:7.1f}ms   pooled p50 {pooled:7.1f}ms")
+
+        serial = p50_ms(lambda: [unpooled_post(url, MESSAGE) for url in urls])
+        concurrent = p50_ms(lambda: delivery.send(MESSAGE, urls))
+        print(f"{WEBHOOKS} webhooks         unpooled, one by one p50 {serial:7.1f}ms   pooled, concurrent p50 {concurrent:7.1f}ms")
+        print(f"{server.connections} connections opened for {len(server.messages)} messages")
+
+
+if __name__ == "__main__":
+    main()
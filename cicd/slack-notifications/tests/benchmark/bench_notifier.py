@@ -0,0 +1,63 @@
+"""Cold-start account id lookup and per-message render time of notifier.py.
+
+"sts" is what every cold start used to pay in the SlackNotifier class body: an STS
+client and a GetCallerIdentity call, here answered in-process by moto, so it is the
+client-side cost alone and the real round trip comes on top. "event" takes the
+account from the EventBridge event instead.
+
+run from cicd/slack-notifications/ (needs moto):
+    python -m tests.benchmark.bench_notifier
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("SLACK_CHANNEL", "#deployments")
+os.environ.setdefault("SLACK_WEBHOOK_URL", "http://127.0.0.1:1/webhook")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "layers", "slacknotifier"))
+
+from moto import mock_aws  # noqa: E402
+
+import notifier  # noqa: E402
+
+
+COLD_STARTS = 20
+MESSAGES = 10_000
+COMMIT_URL = "https://console.aws.amazon.com/redirect?referenceType=COMMIT&FullRepositoryId=cloud303-kloucks/documentdb-example"
+
+
+def account_id_ms(event_account):
+    latencies = []
+    for _ in range(COLD_STARTS):
+        notifier._account_id = None
+        start = time.perf_counter()
+        notifier.get_account_id(event_account)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def main():
+    with mock_aws():
+        sts = account_id_ms(None)
+    event = account_id_ms("570351108046")
+    print(f"cold start account id   sts p50 {sts:8.2f}ms   event p50 {event:8.4f}ms")
+
+    slack = notifier.SlackNotifier(
+        "us-west-2", "s3-pipeline-test", "097432b6-3b5e-4e53-ae25-456cd1024587", COMMIT_URL, "initial commit",
+        "ddbe7ef257512f9455e9b74a5ebe8ef831e615b7", "Source", "SourceAction", "SUCCEEDED", "Source",
+    )
+    for failed in (False, True):
+        start = time.perf_counter()
+        for _ in range(MESSAGES):
+            slack.render_message(":pushpin:", "#34bb13", failed=failed)
+        per_message = (time.perf_counter() - start) / MESSAGES * 1e6
+        print(f"render {'failed' if failed else 'message'}  {per_message:8.2f}us per message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Dispatch time of one event: the if-chain the handler used to run against the
+routes.py table lookup, over every (category, state) an action can send.
+
+run from cicd/slack-notifications/:
+    python -m tests.benchmark.bench_routing
+"""
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "layers", "slacknotifier"))
+
+import routes  # noqa: E402
+
+
+ROUNDS = 50_000
+EVENTS = list(itertools.product(
+    ["Source", "Approval", "Build", "Test", "Deploy", "Invoke"],
+    ["STARTED", "SUCCEEDED", "FAILED", "CANCELED"],
+))
+
+
+def if_chain(pipeline_name, category, state):
+    """The handler's former dispatch, returning what it would have sent"""
+    if category == "Source":
+        if state == "SUCCEEDED":
+            return (":pushpin:", "#34bb13")
+        elif state == "FAILED":
+            return (":x:", "#D00000")
+    if category == "Approval":
+        if state == "STARTED":
+            return (":spiral_note_pad:", "#34bb13")
+        elif state == "SUCCEEDED":
+            return (":spiral_note_pad:", "#34bb13")
+        elif state == "FAILED":
+            return (":x:", "#D00000")
+    if category == "Build":
+        if state == "STARTED":
+            return (":hammer_and_wrench:", "#34bb13")
+        elif state == "SUCCEEDED":
+            return (":hammer_and_wrench:", "#34bb13")
+        elif state == "FAILED":
+            return (":x:", "#D00000")
+    if category == "Deploy":
+        if state == "STARTED":
+            return (":rocket:", "#34bb13")
+        elif state == "SUCCEEDED":
+            return (":rocket:", "#34bb13")
+        elif state == "FAILED":
+            return (":x:", "#D00000")
+    return None
+
+
+def ns_per_event(dispatch, *table):
+    """Called like the handler calls it, without a functools.partial in between"""
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for category, state in EVENTS:
+            dispatch(*table, "s3-pipeline-test", category, state)
+    return (time.perf_counter() - start) / (ROUNDS * len(EVENTS)) * 1e9
+
+
+def main():
+    table = routes.load_routes({})
+    overridden = routes.load_routes({"s3-pipeline-test": {"Build:FAILED": {"channel": "#build-failures"}}})
+
+    print(f"if-chain                  {ns_per_event(if_chain):8.1f}ns per event")
+    print(f"routes table              {ns_per_event(routes.resolve, table):8.1f}ns per event")
+    print(f"routes table, overridden  {ns_per_event(routes.resolve, overridden):8.1f}ns per event")
+
+
+if __name__ == "__main__":
+    main()
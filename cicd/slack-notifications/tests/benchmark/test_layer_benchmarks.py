@@ -0,0 +1,111 @@
+"""pytest-benchmark suite of the notifier layer (layers/slacknotifier) that both
+CodePipeline notification stacks deploy, so a regression in rendering, revision
+parsing or delivery shows up once for both of them.
+
+run from cicd/slack-notifications/ (needs pytest-benchmark):
+    python -m pytest tests/benchmark --benchmark-only
+    # compare against a saved run
+    python -m pytest tests/benchmark --benchmark-only --benchmark-autosave --benchmark-compare
+"""
+import json
+
+import pytest
+import requests
+
+import cache
+import delivery
+import notifier
+import routes
+
+
+PIPELINE = "s3-pipeline-test"
+EXECUTION_ID = "097432b6-3b5e-4e53-ae25-456cd1024587"
+COMMIT_ID = "ddbe7ef257512f9455e9b74a5ebe8ef831e615b7"
+COMMIT_URL = (
+    "https://us-west-2.console.aws.amazon.com/codesuite/settings/connections/redirect?connectionArn=arn"
+    "&referenceType=COMMIT&FullRepositoryId=cloud303-kloucks/documentdb-example&Commit=" + COMMIT_ID
+)
+EXECUTION = {"pipelineExecution": {"pipelineName": PIPELINE, "artifactRevisions": [{
+    "revisionId": COMMIT_ID,
+    "revisionSummary": json.dumps({"ProviderType": "GitHub", "CommitMessage": "initial commit " * 20}),
+    "revisionUrl": COMMIT_URL,
+}]}}
+
+
+class _CodePipeline:
+    """ GetPipelineExecution answered in-process, the benchmarks time the parsing alone"""
+
+    def get_pipeline_execution(self, pipelineName, pipelineExecutionId):
+        return EXECUTION
+
+
+@pytest.fixture()
+def slack():
+    return notifier.SlackNotifier(
+        "us-west-2", PIPELINE, EXECUTION_ID, COMMIT_URL, "initial commit " * 20, COMMIT_ID,
+        "Source", "SourceAction", "SUCCEEDED", "Source", account_id="570351108046",
+    )
+
+
+@pytest.fixture()
+def session():
+    with requests.Session() as session:
+        yield session
+
+
+@pytest.mark.parametrize("failed", [False, True], ids=["message", "failed"])
+def test_render_message(benchmark, slack, failed):
+
+    message = benchmark(slack.render_message, ":pushpin:", "#34bb13", failed)
+
+    assert message["attachments"][0]["fields"][0]["value"].startswith("Commit Message: _initial commit")
+
+
+def test_parse_repository_details(benchmark):
+
+    assert benchmark(notifier.parse_repository_details, COMMIT_URL) == ("cloud303-kloucks", "documentdb-example")
+
+
+def test_revision_summary(benchmark):
+
+    revisions = cache.RevisionCache(_CodePipeline())
+
+    revision = benchmark(revisions.get, PIPELINE, EXECUTION_ID, refresh=True)
+
+    assert revision["commit_id"] == COMMIT_ID
+    assert revision["repo"] == "documentdb-example"
+
+
+def test_revision_cache_hit(benchmark):
+
+    revisions = cache.RevisionCache(_CodePipeline())
+    revisions.get(PIPELINE, EXECUTION_ID)
+
+    assert benchmark(revisions.get, PIPELINE, EXECUTION_ID)["commit_id"] == COMMIT_ID
+
+
+def test_route_resolve(benchmark):
+
+    table = routes.load_routes({PIPELINE: {"Build:FAILED": {"channel": "#build-failures"}}})
+
+    assert benchmark(routes.resolve, table, PIPELINE, "Build", "FAILED").channel == "#build-failures"
+
+
+def test_post(benchmark, webhook, session, slack):
+
+    message = slack.render_message(":pushpin:", "#34bb13")
+
+    response = benchmark(delivery.post, f"{webhook.url}/hook", message, session)
+
+    assert response.status_code == 200
+    assert webhook.connections == 1
+
+
+def test_send_to_every_webhook(benchmark, webhook, session, slack):
+
+    message = slack.render_message(":pushpin:", "#34bb13")
+    urls = [f"{webhook.url}/{i}" for i in range(4)]
+
+    responses = benchmark(delivery.send, message, urls, session=session)
+
+    assert [response.status_code for response in responses] == [200] * 4
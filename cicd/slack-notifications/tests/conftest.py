@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+
+# Neither the handler (slack-notifier/) nor the notifier layer (layers/slacknotifier/) is a package, Lambda imports
+# them from the task root and /opt/python
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "layers", "slacknotifier"))
+sys.path.insert(0, os.path.join(ROOT, "slack-notifier"))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ.setdefault("AWS_REGION", "us-west-2")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("SLACK_CHANNEL", "#deployments")
+os.environ.setdefault("SLACK_WEBHOOK_URL", "http://127.0.0.1:1/webhook")
+
+
+@pytest.fixture()
+def aws():
+    moto = pytest.importorskip("moto")
+    with moto.mock_aws():
+        yield
+
+
+@pytest.fixture()
+def webhook():
+    from tests.webhook_server import WebhookServer
+
+    with WebhookServer() as server:
+        yield server
@@ -0,0 +1,129 @@
+import json
+
+import boto3
+import pytest
+
+import cache
+
+
+PIPELINE = "s3-pipeline-test"
+EXECUTION_ID = "097432b6-3b5e-4e53-ae25-456cd1024587"
+COMMIT_ID = "ddbe7ef257512f9455e9b74a5ebe8ef831e615b7"
+COMMIT_URL = (
+    "https://us-west-2.console.aws.amazon.com/codesuite/settings/connections/redirect?connectionArn=arn"
+    "&referenceType=COMMIT&FullRepositoryId=cloud303-kloucks/documentdb-example&Commit=" + COMMIT_ID
+)
+
+
+class _CodePipeline:
+    """ GetPipelineExecution with no revisions until source_succeeded is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.source_succeeded = True
+
+    def get_pipeline_execution(self, pipelineName, pipelineExecutionId):
+        self.calls += 1
+        revisions = [{
+            "revisionId": COMMIT_ID,
+            "revisionSummary": json.dumps({"ProviderType": "GitHub", "CommitMessage": "initial commit"}),
+            "revisionUrl": COMMIT_URL,
+        }] if self.source_succeeded else []
+        return {"pipelineExecution": {"pipelineName": pipelineName, "artifactRevisions": revisions}}
+
+
+@pytest.fixture()
+def codepipeline():
+    return _CodePipeline()
+
+
+@pytest.fixture()
+def cache_table(aws):
+    table = boto3.resource("dynamodb").create_table(
+        TableName="revision-cache-test",
+        BillingMode="PAY_PER_REQUEST",
+        AttributeDefinitions=[{"AttributeName": "executionKey", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "executionKey", "KeyType": "HASH"}],
+    )
+    return table.name
+
+
+def test_fetches_once_per_execution(codepipeline):
+
+    revisions = cache.RevisionCache(codepipeline)
+
+    for _ in range(10):
+        revision = revisions.get(PIPELINE, EXECUTION_ID)
+
+    assert codepipeline.calls == 1
+    assert revision == {
+        "commit_id": COMMIT_ID,
+        "commit_message": "initial commit",
+        "commit_url": COMMIT_URL,
+        "repo_owner": "cloud303-kloucks",
+        "repo": "documentdb-example",
+    }
+
+
+def test_executions_without_revisions_are_not_cached(codepipeline):
+
+    revisions = cache.RevisionCache(codepipeline)
+    codepipeline.source_succeeded = False
+
+    assert revisions.get(PIPELINE, EXECUTION_ID)["commit_id"] is None
+    codepipeline.source_succeeded = True
+    assert revisions.get(PIPELINE, EXECUTION_ID)["commit_id"] == COMMIT_ID
+    assert codepipeline.calls == 2
+
+
+def test_refresh_bypasses_the_cache(codepipeline):
+
+    revisions = cache.RevisionCache(codepipeline)
+
+    revisions.get(PIPELINE, EXECUTION_ID)
+    revisions.get(PIPELINE, EXECUTION_ID, refresh=True)
+
+    assert codepipeline.calls == 2
+
+
+def test_entries_expire_and_are_evicted(codepipeline, monkeypatch):
+
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    revisions = cache.RevisionCache(codepipeline, ttl=60, max_entries=2)
+
+    for execution_id in ("a", "b", "a", "c"):
+        revisions.get(PIPELINE, execution_id)
+    # "b" was the least recently used
+    assert codepipeline.calls == 3
+    revisions.get(PIPELINE, "a")
+    assert codepipeline.calls == 3
+    revisions.get(PIPELINE, "b")
+    assert codepipeline.calls == 4
+
+    now[0] += 61
+    revisions.get(PIPELINE, "b")
+    assert codepipeline.calls == 5
+
+
+def test_shared_table_serves_other_containers(codepipeline, cache_table):
+
+    cache.RevisionCache(codepipeline, table_name=cache_table).get(PIPELINE, EXECUTION_ID)
+    revision = cache.RevisionCache(codepipeline, table_name=cache_table).get(PIPELINE, EXECUTION_ID)
+
+    assert codepipeline.calls == 1
+    assert revision["repo"] == "documentdb-example"
+    item = boto3.resource("dynamodb").Table(cache_table).get_item(
+        Key={"executionKey": f"{PIPELINE}#{EXECUTION_ID}"}
+    )["Item"]
+    assert item["expiresAt"] > 0
+
+
+def test_shared_item_with_only_a_thread_is_a_miss(codepipeline, cache_table):
+
+    cache.ThreadStore(cache_table).claim(PIPELINE, EXECUTION_ID, "C0DEPLOYS", "1.000100")
+    revision = cache.RevisionCache(codepipeline, table_name=cache_table).get(PIPELINE, EXECUTION_ID)
+
+    assert codepipeline.calls == 1
+    assert revision["commit_id"] == COMMIT_ID
+    assert cache.ThreadStore(cache_table).get(PIPELINE, EXECUTION_ID) == ("C0DEPLOYS", "1.000100")
@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+import app
+import cache
+
+
+EVENTS = os.path.join(os.path.dirname(__file__), "..", "..", "events")
+
+
+def _event(action, state, time="2023-10-07T20:19:16Z", execution_id="097432b6"):
+    with open(os.path.join(EVENTS, "source-action-succeeded.json")) as f:
+        event = json.load(f)
+    event["id"] = f"{action}-{state}-{time}"
+    event["time"] = time
+    event["detail"].update({"action": action, "state": state, "execution-id": execution_id})
+    return event
+
+
+def _batch(*events):
+    return {
+        "Records": [
+            {"messageId": f"msg-{i}", "body": json.dumps(event), "eventSource": "aws:sqs"}
+            for i, event in enumerate(events)
+        ]
+    }
+
+
+@pytest.fixture()
+def notified(monkeypatch):
+    """ The (action, state) of the events the batch handler notifies"""
+    notified = []
+    monkeypatch.setattr(app, "handler", lambda event, context: notified.append(
+        (event["detail"]["action"], event["detail"]["state"])
+    ))
+    return notified
+
+
+def test_transitions_of_an_action_collapse_to_the_latest(notified):
+
+    ret = app.batch_handler(_batch(
+        _event("Build", "SUCCEEDED"),
+        _event("Build", "STARTED"),
+        _event("Deploy", "STARTED", time="2023-10-07T20:19:17Z"),
+        _event("Test", "STARTED"),
+        _event("Test", "SUCCEEDED", time="2023-10-07T20:19:18Z"),
+    ), None)
+
+    assert ret == {"batchItemFailures": []}
+    assert notified == [("Build", "SUCCEEDED"), ("Deploy", "STARTED"), ("Test", "SUCCEEDED")]
+
+
+def test_executions_are_not_collapsed_together(notified):
+
+    app.batch_handler(_batch(
+        _event("Build", "STARTED", execution_id="a"),
+        _event("Build", "STARTED", execution_id="b"),
+    ), None)
+
+    assert notified == [("Build", "STARTED"), ("Build", "STARTED")]
+
+
+def test_failed_notification_retries_every_collapsed_message(monkeypatch):
+
+    def handler(event, context):
+        if event["detail"]["action"] == "Build":
+            raise RuntimeError("Slack is down")
+
+    monkeypatch.setattr(app, "handler", handler)
+
+    ret = app.batch_handler(_batch(
+        _event("Build", "STARTED"),
+        _event("Deploy", "STARTED"),
+        _event("Build", "SUCCEEDED"),
+    ), None)
+
+    assert sorted(failure["itemIdentifier"] for failure in ret["batchItemFailures"]) == ["msg-0", "msg-2"]
+
+
+def test_handler_dispatches_sqs_batches(monkeypatch):
+
+    monkeypatch.setattr(app, "batch_handler", lambda event, context: "batch")
+
+    assert app.handler(_batch(_event("Build", "STARTED")), None) == "batch"
+
+
+@pytest.mark.parametrize("slack_mode", ["api", "webhook"])
+def test_states_older_than_the_notified_one_are_dropped(monkeypatch, slack_mode):
+
+    notified = []
+
+    class Notifier:
+        def __init__(self, *args, threads=None, **kwargs):
+            self.state = args[8]
+            # webhooks post a message per event, only the Web API threads them
+            assert (threads is None) == (slack_mode == "webhook")
+
+        def notify(self, route, execution_result):
+            notified.append(self.state)
+
+    monkeypatch.setattr(app, "SLACK_MODE", slack_mode)
+    monkeypatch.setattr(app, "threads", cache.ThreadStore())
+    monkeypatch.setattr(app, "SlackNotifier", Notifier)
+    monkeypatch.setattr(app.revisions, "get", lambda *args, **kwargs: {
+        "commit_message": "initial commit", "commit_id": "ddbe7ef", "commit_url": None
+    })
+
+    # the failure is delivered directly, the STARTED before it waited in the queue
+    app.handler(_event("Build", "FAILED", time="2023-10-07T20:19:18Z"), None)
+    ret = app.batch_handler(_batch(_event("Build", "STARTED")), None)
+
+    assert ret == {"batchItemFailures": []}
+    assert notified == ["FAILED"]
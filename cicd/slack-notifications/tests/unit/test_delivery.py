@@ -0,0 +1,73 @@
+import pytest
+import requests
+
+import delivery
+
+
+@pytest.fixture()
+def session():
+    """ A session of the test's own, the module one outlives the stand-in servers"""
+    with requests.Session() as session:
+        yield session
+
+
+def test_post_reuses_the_connection(webhook, session):
+
+    for i in range(5):
+        assert delivery.post(f"{webhook.url}/hook", {"text": i}, session).status_code == 200
+
+    assert webhook.messages == [("/hook", {"text": i}) for i in range(5)]
+    assert webhook.connections == 1
+
+
+def test_post_retries_after_rate_limit(webhook, session, monkeypatch):
+
+    sleeps = []
+    monkeypatch.setattr(delivery.time, "sleep", sleeps.append)
+    webhook.rate_limit = (2, 3)
+
+    response = delivery.post(webhook.url, {"text": "deployed"}, session)
+
+    assert response.status_code == 200
+    assert sleeps == [3, 3]
+    assert webhook.messages == [("/", {"text": "deployed"})]
+
+
+def test_post_gives_up_on_long_retry_after(webhook, session, monkeypatch):
+
+    monkeypatch.setattr(delivery.time, "sleep", pytest.fail)
+    webhook.rate_limit = (1, delivery.MAX_RETRY_AFTER + 1)
+
+    assert delivery.post(webhook.url, {"text": "deployed"}, session).status_code == 429
+    assert webhook.messages == []
+
+
+def test_post_times_out(session, monkeypatch):
+    from tests.webhook_server import WebhookServer
+
+    monkeypatch.setattr(delivery, "READ_TIMEOUT", 0.1)
+
+    with WebhookServer(response_delay=1) as slow:
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            delivery.post(slow.url, {"text": "deployed"}, session)
+
+
+def test_send_to_every_webhook_and_channel(webhook, session):
+
+    responses = delivery.send(
+        {"channel": "#a", "text": "deployed"},
+        [f"{webhook.url}/1", f"{webhook.url}/2"],
+        channels=["#a", "#b"],
+        session=session,
+    )
+
+    assert [response.status_code for response in responses] == [200] * 4
+    assert sorted((path, message["channel"]) for path, message in webhook.messages) == [
+        ("/1", "#a"), ("/1", "#b"), ("/2", "#a"), ("/2", "#b"),
+    ]
+
+
+def test_split_env():
+
+    assert delivery.split_env(" https://a, ,https://b ") == ["https://a", "https://b"]
+    assert delivery.split_env(None) == []
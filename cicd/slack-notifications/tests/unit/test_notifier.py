@@ -0,0 +1,75 @@
+import boto3
+import pytest
+
+import notifier
+
+
+COMMIT_ID = "ddbe7ef257512f9455e9b74a5ebe8ef831e615b7"
+COMMIT_URL = "https://console.aws.amazon.com/redirect?referenceType=COMMIT&FullRepositoryId=cloud303-kloucks/documentdb-example"
+
+
+@pytest.fixture(autouse=True)
+def account_id(monkeypatch):
+    """ Every test starts from a cold container"""
+    monkeypatch.setattr(notifier, "_account_id", None)
+
+
+def _notifier(commit_message="initial commit", account_id="570351108046", **kwargs):
+    return notifier.SlackNotifier(
+        "us-west-2", "s3-pipeline-test", "097432b6", COMMIT_URL, commit_message, COMMIT_ID,
+        "Source", "SourceAction", "SUCCEEDED", "Source", account_id=account_id, **kwargs
+    )
+
+
+def test_account_id_from_event_skips_sts(monkeypatch):
+
+    monkeypatch.setattr(notifier.boto3, "client", pytest.fail)
+
+    assert _notifier().account_id == "570351108046"
+    # later events of the container without 'account' reuse it
+    assert _notifier(account_id=None).account_id == "570351108046"
+
+
+def test_account_id_falls_back_to_sts(aws):
+
+    assert _notifier(account_id=None).account_id == boto3.client("sts").get_caller_identity()["Account"]
+
+
+def test_render_message():
+
+    message = _notifier().render_message(":pushpin:", "#34bb13")
+
+    attachment = message["attachments"][0]
+    assert message["channel"] == "#deployments"
+    assert attachment["pretext"] == (
+        ":pushpin: *<https://us-west-2.console.aws.amazon.com/codesuite/codepipeline/pipelines/s3-pipeline-test/view"
+        "?region=us-west-2|AWS CodePipeline | s3-pipeline-test | us-west-2 | 570351108046 >*"
+    )
+    assert attachment["fields"][0] == {
+        "title": "Pipeline Source Action SUCCEEDED",
+        "value": "Commit Message: _initial commit_\nCommit: <https://github.com/cloud303-kloucks/documentdb-example"
+                 f"/commit/{COMMIT_ID}|*ddbe7ef*>",
+    }
+    assert [field["title"] for field in attachment["fields"][1:]] == ["Stage", "Action"]
+    assert attachment["footer"].endswith("|097432b6 >*")
+
+
+def test_render_failed_message():
+
+    slack = _notifier()
+    slack.error_code = "JobFailed"
+    slack.execution_summary = "access denied"
+
+    fields = slack.render_message(":x:", "#D00000", failed=True)["attachments"][0]["fields"]
+
+    assert fields[1] == {"title": "Failure Reason: JobFailed", "value": "```\naccess denied\n```"}
+    assert [field["title"] for field in fields[2:]] == ["Stage", "Action"]
+
+
+def test_render_message_truncates_and_allows_missing_commit():
+
+    long_message = _notifier(commit_message="x" * 200).render_message(":pushpin:", "#34bb13")
+    no_commit = _notifier(commit_message=None).render_message(":pushpin:", "#34bb13")
+
+    assert "_" + "x" * 119 + "..._" in long_message["attachments"][0]["fields"][0]["value"]
+    assert "_None_" in no_commit["attachments"][0]["fields"][0]["value"]
@@ -0,0 +1,129 @@
+import json
+import os
+
+import pytest
+
+import app
+import notifier
+import routes
+
+
+EVENTS = os.path.join(os.path.dirname(__file__), "..", "..", "events")
+CATEGORIES = ["Source", "Approval", "Build", "Test", "Deploy", "Invoke"]
+STATES = ["STARTED", "SUCCEEDED", "FAILED", "CANCELED"]
+
+
+def _expected(category, state):
+    """ What the four if-blocks of the handler sent, with Test and Invoke notified like Build"""
+    if state == "FAILED":
+        return routes.Route(":x:", "#D00000", "failed")
+    if state == "CANCELED" or (category == "Source" and state == "STARTED"):
+        return None
+    return routes.Route(routes.CATEGORY_ICONS[category], "#34bb13", "message")
+
+
+@pytest.mark.parametrize("category", CATEGORIES)
+@pytest.mark.parametrize("state", STATES)
+def test_default_routes(category, state):
+
+    assert routes.resolve(routes.load_routes({}), "any-pipeline", category, state) == _expected(category, state)
+
+
+def test_overrides():
+
+    table = routes.load_routes({
+        "*": {"Build:FAILED": {"channel": "#build-failures"}},
+        "prod": {
+            "Build:FAILED": {"icon": ":fire:"},
+            "Deploy:SUCCEEDED": {"icon": ":tada:", "webhook_urls": ["https://hooks.example/prod"]},
+            "Build:STARTED": None,
+            "Deploy:CANCELED": {"icon": ":no_entry:", "color": "#999999", "template": "message"},
+        },
+    })
+
+    assert routes.resolve(table, "dev", "Build", "FAILED") == routes.Route(":x:", "#D00000", "failed", "#build-failures")
+    assert routes.resolve(table, "prod", "Build", "FAILED") == routes.Route(":fire:", "#D00000", "failed", "#build-failures")
+    assert routes.resolve(table, "prod", "Deploy", "SUCCEEDED").webhook_urls == ["https://hooks.example/prod"]
+    assert routes.resolve(table, "prod", "Build", "STARTED") is None
+    assert routes.resolve(table, "dev", "Build", "STARTED") is not None
+    assert routes.resolve(table, "prod", "Deploy", "CANCELED").icon == ":no_entry:"
+    assert routes.resolve(table, "dev", "Deploy", "CANCELED") is None
+
+
+def test_table_is_flat():
+
+    table = routes.load_routes({"prod": {"Build:STARTED": None}})
+
+    # the overridden pipeline has every route under its own name
+    assert {key[1:] for key in table if key[0] == "prod"} == {key[1:] for key in table if key[0] is None}
+    assert routes.resolve(table, "dev", "Build", "STARTED") == table[("dev", "Build", "STARTED")]
+    assert ("dev", "Build", "STARTED") in table
+
+
+def test_overrides_from_env(monkeypatch, tmp_path):
+
+    monkeypatch.setenv("NOTIFIER_ROUTES", json.dumps({"*": {"Source:SUCCEEDED": None}}))
+    assert routes.resolve(routes.load_routes(), "p", "Source", "SUCCEEDED") is None
+
+    config = tmp_path / "routes.json"
+    config.write_text(json.dumps({"*": {"Source:STARTED": {"icon": ":eyes:", "color": "#cccccc", "template": "message"}}}))
+    monkeypatch.delenv("NOTIFIER_ROUTES")
+    monkeypatch.setenv("NOTIFIER_ROUTES_FILE", str(config))
+    assert routes.resolve(routes.load_routes(), "p", "Source", "STARTED").icon == ":eyes:"
+
+
+class _Notifier(notifier.SlackNotifier):
+    """ Records what the handler asks SlackNotifier to send"""
+    sent = []
+
+    def __init__(self, *args, **kwargs):
+        self.slack_channel = "#deployments"
+        self.webhook_urls = ["https://hooks.example/default"]
+
+    def send_message(self, status_icon, color):
+        self.sent.append(("message", status_icon, color, self.slack_channel, self.webhook_urls))
+
+    def send_failed_message(self, status_icon, color):
+        self.sent.append(("failed", status_icon, color, self.slack_channel, self.error_code))
+
+
+@pytest.fixture()
+def sent(monkeypatch):
+    _Notifier.sent = []
+    monkeypatch.setattr(app, "SlackNotifier", _Notifier)
+    monkeypatch.setattr(app.revisions, "get", lambda *args, **kwargs: {
+        "commit_message": None, "commit_id": None, "commit_url": None,
+    })
+    return _Notifier.sent
+
+
+def _event(category, state):
+    with open(os.path.join(EVENTS, "source-action-succeeded.json")) as f:
+        event = json.load(f)
+    event["detail"]["type"]["category"] = category
+    event["detail"]["state"] = state
+    event["detail"]["execution-result"]["error-code"] = "JobFailed"
+    return event
+
+
+def test_handler_follows_the_route(sent, monkeypatch):
+
+    monkeypatch.setattr(app, "ROUTES", routes.load_routes({"*": {"Deploy:FAILED": {"channel": "#alerts"}}}))
+
+    app.handler(_event("Build", "STARTED"), None)
+    app.handler(_event("Deploy", "FAILED"), None)
+    app.handler(_event("Source", "STARTED"), None)
+
+    assert sent == [
+        ("message", ":hammer_and_wrench:", "#34bb13", "#deployments", ["https://hooks.example/default"]),
+        ("failed", ":x:", "#D00000", "#alerts", "JobFailed"),
+    ]
+
+
+def test_unrouted_events_skip_the_revision_lookup(sent, monkeypatch):
+
+    monkeypatch.setattr(app.revisions, "get", pytest.fail)
+
+    app.handler(_event("Deploy", "CANCELED"), None)
+
+    assert sent == []
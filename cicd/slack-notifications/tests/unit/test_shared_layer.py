@@ -0,0 +1,54 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+import notifier
+
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..")
+MADISONREED_INDEX = os.path.join(ROOT, "client-specific", "madisonreed", "slack-notifications-codepipeline", "lambda_src", "index.py")
+EVENTS = os.path.join(os.path.dirname(__file__), "..", "..", "events")
+
+
+@pytest.fixture()
+def index(monkeypatch):
+    """ The madisonreed handler, importing the notifier layer like it does from /opt/python"""
+    spec = importlib.util.spec_from_file_location("madisonreed_index", MADISONREED_INDEX)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module.revisions, "get", lambda *args, **kwargs: {
+        "commit_message": "initial commit", "commit_id": "ddbe7ef257512f9455e9b74a5ebe8ef831e615b7", "commit_url": None,
+    })
+    return module
+
+
+def _event(category, state):
+    with open(os.path.join(EVENTS, "source-action-succeeded.json")) as f:
+        event = json.load(f)
+    event["detail"]["type"]["category"] = category
+    event["detail"]["state"] = state
+    event["detail"]["execution-result"]["error-code"] = "JobFailed"
+    return event
+
+
+def test_both_stacks_use_the_layer(index):
+
+    assert index.SlackNotifier is notifier.SlackNotifier
+    assert not os.path.exists(os.path.join(os.path.dirname(MADISONREED_INDEX), "notifier.py"))
+
+
+def test_madisonreed_handler_sends_through_the_layer(index, monkeypatch):
+
+    sent = []
+    monkeypatch.setattr(notifier.delivery, "send", lambda message, webhook_urls, channels=None: sent.append(message))
+
+    index.handler(_event("Build", "FAILED"), None)
+    index.handler(_event("Source", "STARTED"), None)
+
+    [message] = sent
+    fields = message["attachments"][0]["fields"]
+    assert message["attachments"][0]["color"] == "#D00000"
+    assert fields[0]["value"].startswith("Commit Message: _initial commit_")
+    assert fields[1]["title"] == "Failure Reason: JobFailed"
@@ -0,0 +1,112 @@
+import boto3
+import pytest
+
+import cache
+import delivery
+import notifier
+
+
+@pytest.fixture()
+def slack_api(webhook, monkeypatch):
+    monkeypatch.setattr(delivery, "SLACK_API_URL", f"{webhook.url}/api")
+    monkeypatch.setattr(delivery, "_session", None)
+    monkeypatch.setenv("SLACK_BOT_TOKEN", "xoxb-test")
+    return webhook
+
+
+def _notify(threads, state="SUCCEEDED", action="SourceAction", failed=False):
+    slack = notifier.SlackNotifier(
+        "us-west-2", "s3-pipeline-test", "097432b6", None, "initial commit", "ddbe7ef",
+        "Source", action, state, "Source", account_id="570351108046", threads=threads,
+    )
+    if failed:
+        slack.send_failed_message(status_icon=":x:", color="#D00000")
+    else:
+        slack.send_message(status_icon=":pushpin:", color="#34bb13")
+
+
+def _calls(webhook):
+    return [(path[5:], message.get("ts"), message.get("thread_ts")) for path, message in webhook.messages]
+
+
+def test_one_message_per_execution(slack_api):
+
+    threads = cache.ThreadStore()
+    for state in ("STARTED", "SUCCEEDED", "STARTED", "SUCCEEDED"):
+        _notify(threads, state)
+
+    assert _calls(slack_api) == [("chat.postMessage", None, None)] + [("chat.update", "0.000100", None)] * 3
+    assert slack_api.messages[-1][1]["attachments"][0]["fields"][0]["title"] == "Pipeline Source Action SUCCEEDED"
+    assert threads.get("s3-pipeline-test", "097432b6") == ("C0DEPLOYS", "0.000100")
+
+
+def test_failures_are_replied_in_the_thread(slack_api):
+
+    threads = cache.ThreadStore()
+    _notify(threads, "STARTED")
+    _notify(threads, "FAILED", failed=True)
+
+    assert _calls(slack_api)[1:] == [("chat.update", "0.000100", None), ("chat.postMessage", None, "0.000100")]
+    assert slack_api.messages[-1][1]["reply_broadcast"] is True
+
+
+def test_deleted_message_is_posted_again(slack_api):
+
+    threads = cache.ThreadStore()
+    _notify(threads, "STARTED")
+    slack_api.deleted.add("0.000100")
+    _notify(threads, "SUCCEEDED")
+
+    assert _calls(slack_api)[1:] == [("chat.update", "0.000100", None), ("chat.postMessage", None, None)]
+    assert threads.get("s3-pipeline-test", "097432b6") == ("C0DEPLOYS", "2.000100")
+
+
+def test_containers_share_the_message(slack_api, aws, monkeypatch):
+
+    table = boto3.resource("dynamodb").create_table(
+        TableName="revision-cache-test",
+        BillingMode="PAY_PER_REQUEST",
+        AttributeDefinitions=[{"AttributeName": "executionKey", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "executionKey", "KeyType": "HASH"}],
+    )
+    first, second = cache.ThreadStore(table.name), cache.ThreadStore(table.name)
+
+    # the second container looked the execution up before the first one stored its message
+    monkeypatch.setattr(second, "get", lambda *args: None)
+    _notify(first, "STARTED")
+    _notify(second, "STARTED", action="OtherAction")
+
+    assert _calls(slack_api) == [
+        ("chat.postMessage", None, None),
+        ("chat.postMessage", None, None),
+        ("chat.delete", "1.000100", None),
+        ("chat.postMessage", None, "0.000100"),
+    ]
+    monkeypatch.undo()
+    assert cache.ThreadStore(table.name).get("s3-pipeline-test", "097432b6") == ("C0DEPLOYS", "0.000100")
+
+
+def test_older_states_of_an_action_are_stale():
+
+    threads = cache.ThreadStore()
+
+    assert threads.advance("s3-pipeline-test", "097432b6", "Build#CodeBuild", "2023-10-07T20:19:18Z#2")
+    # the STARTED that waited in the coalescing queue, and the failure again when it's retried
+    assert not threads.advance("s3-pipeline-test", "097432b6", "Build#CodeBuild", "2023-10-07T20:19:16Z#0")
+    assert threads.advance("s3-pipeline-test", "097432b6", "Build#CodeBuild", "2023-10-07T20:19:18Z#2")
+    assert threads.advance("s3-pipeline-test", "097432b6", "Deploy#CodeDeploy", "2023-10-07T20:19:16Z#0")
+
+
+def test_containers_share_the_notified_states(aws):
+
+    table = boto3.resource("dynamodb").create_table(
+        TableName="revision-cache-test",
+        BillingMode="PAY_PER_REQUEST",
+        AttributeDefinitions=[{"AttributeName": "executionKey", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "executionKey", "KeyType": "HASH"}],
+    )
+    first, second = cache.ThreadStore(table.name), cache.ThreadStore(table.name)
+
+    assert first.advance("s3-pipeline-test", "097432b6", "Build#CodeBuild", "2023-10-07T20:19:18Z#2")
+    assert not second.advance("s3-pipeline-test", "097432b6", "Build#CodeBuild", "2023-10-07T20:19:16Z#0")
+    assert second.advance("s3-pipeline-test", "097432b6", "Build#CodeBuild", "2023-10-07T20:19:20Z#0")
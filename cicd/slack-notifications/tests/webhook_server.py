@@ -0,0 +1,91 @@
+"""A local stand-in for a Slack incoming webhook, used by the unit tests and benchmarks.
+
+It speaks HTTP/1.1 with keep-alive like hooks.slack.com, records every message it gets,
+and can add a handshake delay to each new connection (the DNS/TCP/TLS setup a pooled
+session skips) and answer with 429s. Posts to /api/<method> get the JSON answer of the
+Slack Web API chat.postMessage, chat.update and chat.delete.
+"""
+import http.server
+import json
+import threading
+import time
+
+
+class WebhookServer:
+
+    def __init__(self, handshake_delay=0, response_delay=0):
+        self.handshake_delay = handshake_delay
+        self.response_delay = response_delay
+        self.messages = []
+        self.connections = 0
+        # ts of the messages deleted through /api/chat.delete
+        self.deleted = set()
+        # (count, retry_after) of 429s to answer before accepting messages
+        self.rate_limit = (0, 0)
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Slack answers in one packet, don't let Nagle hold back the body
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                if server.handshake_delay:
+                    time.sleep(server.handshake_delay)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if server.response_delay:
+                    time.sleep(server.response_delay)
+
+                with server._lock:
+                    limited, retry_after = server.rate_limit
+                    if limited:
+                        server.rate_limit = (limited - 1, retry_after)
+                    else:
+                        server.messages.append((self.path, json.loads(body)))
+
+                if limited:
+                    self._reply(429, b"rate_limited", {"Retry-After": str(retry_after)})
+                elif self.path.startswith("/api/"):
+                    self._reply(200, json.dumps(server.api_response(self.path[5:], json.loads(body))).encode())
+                else:
+                    self._reply(200, b"ok")
+
+            def _reply(self, status, body, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def api_response(self, method, payload):
+        with self._lock:
+            if method == "chat.delete":
+                self.deleted.add(payload["ts"])
+            elif method == "chat.update" and payload["ts"] in self.deleted:
+                return {"ok": False, "error": "message_not_found"}
+            # the index of the message, it has been recorded already
+            ts = f"{len(self.messages) - 1}.000100"
+        return {"ok": True, "channel": "C0DEPLOYS", "ts": payload.get("ts", ts)}
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,17 +1,20 @@
 import os
 import boto3
 import json
+from cache import RevisionCache
 from notifier import SlackNotifier
+import routes
 
 
 client = boto3.client('codepipeline')
 
+# notifier.py, cache.py, delivery.py and routes.py come from the notifier layer (cicd/slack-notifications/layers/slacknotifier)
+revisions = RevisionCache(client)
+
 REGION = os.environ['AWS_REGION']
 
-SOURCE_ICON = os.environ.get('SOURCE_ICON', '')
-APPROVAL_ICON = os.environ.get('APPROVAL_ICON', '')
-BUILD_ICON = os.environ.get('BUILD_ICON', '')
-DEPLOY_ICON = os.environ.get('DEPLOY_ICON', '')
+# (pipeline, category, state) -> routes.Route, from the defaults and NOTIFIER_ROUTES
+ROUTES = routes.load_routes()
 
 def handler(event, context):
     print(json.dumps(event))
@@ -25,82 +28,33 @@ def handler(event, context):
     stage = event['detail']['stage']
     action = event['detail']['action']
 
+    route = routes.resolve(ROUTES, pipeline_name, category, state)
+    if route is None:
+        print(f"No route for {category} {state}, not notifying")
+        return
 
 
-    response = client.get_pipeline_execution(
-        pipelineName=pipeline_name,
-        pipelineExecutionId=execution_id
+    # Revision summary isn't included until the Source stage Succeeds, which refreshes it
+    revision = revisions.get(
+        pipeline_name,
+        execution_id,
+        refresh=(category == "Source" and state == "SUCCEEDED")
     )
 
-    print(f"Pipeline Execution {json.dumps(response)}")
-
-    commit_message = None
-    commit_id = None
-    commit_url = None
-
-
-    # Revision summary isn't included until the Source stage Succeeds
-    artifact_revisions = response['pipelineExecution']['artifactRevisions']
-    if len(artifact_revisions) > 0:
-        revision_summary_str = artifact_revisions[0]['revisionSummary']
-        revision_summary = json.loads(revision_summary_str)
-        commit_message = revision_summary['CommitMessage']
-        commit_id = artifact_revisions[0]['revisionId']
-        commit_url = artifact_revisions[0]['revisionUrl']
-
 
     slack = SlackNotifier(
         REGION,
         pipeline_name,
         execution_id,
-        commit_url,
-        commit_message,
-        commit_id,
+        revision['commit_url'],
+        revision['commit_message'],
+        revision['commit_id'],
         stage,
         action,
         state,
-        category
+        category,
+        account_id=event.get('account')
     )
 
 
-    if category == "Source":
-        if state == "SUCCEEDED":
-            slack.send_message(status_icon=SOURCE_ICON, color="#34bb13")
-        elif state == "FAILED":
-            slack.execution_summary = event['detail']['execution-result']['external-execution-summary']
-            slack.error_code = event['detail']['execution-result']['error-code']
-
-            slack.send_failed_message(status_icon=":x:", color="#D00000")
-
-
-    if category == "Approval":
-        if state == "STARTED":
-            slack.send_message(status_icon=APPROVAL_ICON, color="#34bb13")
-        elif state == "SUCCEEDED":
-            slack.send_message(status_icon=APPROVAL_ICON, color="#34bb13")
-        elif state == "FAILED":
-            slack.execution_summary = event['detail']['execution-result']['external-execution-summary']
-            slack.error_code = event['detail']['execution-result']['error-code']
-            slack.send_failed_message(status_icon=":x:", color="#D00000")
-
-    if category == "Build":
-        if state == "STARTED":
-            slack.send_message(status_icon=BUILD_ICON, color="#34bb13")
-        elif state == "SUCCEEDED":
-            slack.send_message(status_icon=BUILD_ICON, color="#34bb13")
-        elif state == "FAILED":
-            slack.execution_summary = event['detail']['execution-result']['external-execution-summary']
-            slack.error_code = event['detail']['execution-result']['error-code']
-
-            slack.send_failed_message(status_icon=":x:", color="#D00000")
-
-    if category == "Deploy":
-        if state == "STARTED":
-            slack.send_message(status_icon=DEPLOY_ICON, color="#34bb13")
-        elif state == "SUCCEEDED":
-            slack.send_message(status_icon=DEPLOY_ICON, color="#34bb13")
-        elif state == "FAILED":
-            slack.execution_summary = event['detail']['execution-result']['external-execution-summary']
-            slack.error_code = event['detail']['execution-result']['error-code']
-
-            slack.send_failed_message(status_icon=":x:", color="#D00000")
\ No newline at end of file
+    slack.notify(route, event['detail'].get('execution-result'))
@@ -1,7 +1,13 @@
 import json
+import time
+import heapq
+import queue
+import datetime
+import threading
 import cfnresponse
 import boto3
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
 
@@ -10,6 +16,43 @@ logger.setLevel(logging.INFO)
 
 cloudtrail = boto3.client("cloudtrail")
 dynamodb = boto3.resource("dynamodb")
+lambda_client = boto3.client("lambda")
+
+CREATE_EVENT = "CreateCapacityReservation"
+CANCEL_EVENT = "CancelCapacityReservation"
+
+# reservationState buckets of the byState index
+OPEN = "open"
+CLOSED = "closed"
+
+# Concurrent update_item calls writing the items of a page. Throttled calls are retried
+# by botocore
+WRITE_MAX_WORKERS = 10
+
+# LookupEvents only reaches back 90 days and is throttled at 2 TPS per account/region.
+# The range is split into windows that are paged concurrently, for both event names,
+# under one shared limiter
+LOOKBACK_DAYS = 90
+LOOKUP_WINDOW = datetime.timedelta(days=7)
+LOOKUP_MAX_WORKERS = 8
+LOOKUP_RATE_PER_SECOND = 2
+# Pages fetched ahead of processing, shared out between the windows in flight. Together
+# with the one page each worker holds they bound the backfill's memory, whatever the
+# length of the history
+LOOKUP_MAX_BUFFERED_PAGES = 16
+
+# Marks the end of one window's pages on its page queue
+_WINDOW_DONE = object()
+
+# The backfill's high-water marks live in the ODCR table under this key
+CHECKPOINT_ID = "checkpoint#cloudtrail-backfill"
+# CloudTrail can take up to 15 minutes to make an event available to LookupEvents, so
+# the high-water mark stays that far behind the current time
+CLOUDTRAIL_DELIVERY_DELAY = datetime.timedelta(minutes=15)
+# Stop paging and checkpoint once the invocation has less than this left
+STOP_MARGIN_MS = 30_000
+# The event of the asynchronous invocations that carry on a backfill that stopped early
+RESUME_KEY = "resumeBackfill"
 
 def lambda_handler(event, context):
     """Lambda function
@@ -23,66 +66,321 @@ def lambda_handler(event, context):
 
         Context doc: https://docs.aws.amazon.com/lambda/latest/dg/python-context-object.html
     """
+    logger.info("Received event: %s" % json.dumps(event))
+
+    # A run that stopped early invoked this function again to carry on, there is no
+    # CloudFormation request to answer. Errors are raised so Lambda retries the invocation
+    if RESUME_KEY in event:
+        run_backfill(event[RESUME_KEY]["DynamoDBTableName"], context)
+        return
+
     try:
-        logger.info("Received event: %s" % json.dumps(event))
+        # Nothing to backfill when the stack is being deleted
+        if event.get("RequestType") == "Delete":
+            cfnresponse.send(event, context, cfnresponse.SUCCESS, {})
+            return
 
         # grab dynamodb table from template.yaml
-        table = dynamodb.Table(event['ResourceProperties']['DynamoDBTableName'])
-
-        create_events = get_all_events_by_name("CreateCapacityReservation")
-        cancel_events = get_all_events_by_name("CancelCapacityReservation")
-
-        # Create a new list, called history, that has the combined create and cancel info
-        history = []
-        for create_event in create_events:
-            # Check if the create event actually resulted in a OCDR. If not, do nothing.
-            if "errorMessage" in create_event:
-                continue
-
-            # Get the portion of the create event that contains the info we want
-            create_info = create_event["responseElements"][
-                "CreateCapacityReservationResponse"
-            ]["capacityReservation"]
-
-            
-                
-
-            # Get the cancel date using the cancel event associated with this capacity
-            # reservation ID
-            cancel_date = get_odcr_cancel_date(
-                create_info["capacityReservationId"], cancel_events
-            )
-
-            # Combine all of the info we want into a single dictionary
-            ocdr_info = {
-                "user_arn": create_event["userIdentity"]["arn"],
-                **create_info
-            }
-
-            # If the reservation created wasn't a 'limited' endDateType, set the endDate to the time it was cancelled
-            if "endDate" not in create_info:
-                ocdr_info["endDate"] = cancel_date
-
-            # Add it to our history list
-            history.append(ocdr_info)
-        
-            # Batch write the items from the 'history' list to DynamoDB
-            with table.batch_writer() as batch:
-                for item in history:
-                    batch.put_item(Item=item)
-                    # print(f"Put item in database: \n {item}")
-            result = cfnresponse.SUCCESS
-    except ClientError as e:
-        logger.error('Error: %s', e)
+        write_report = run_backfill(event['ResourceProperties']['DynamoDBTableName'], context)
+        result = cfnresponse.SUCCESS
+    except Exception as e:
+        # Whatever went wrong, CloudFormation must get a response or the stack hangs
+        # until the custom resource times out
+        logger.exception('Error: %s', e)
         result = cfnresponse.FAILED
-    
+        write_report = {}
+
     # send the success or failed response back to cloudformation
-    cfnresponse.send(event, context, result, {})
+    cfnresponse.send(event, context, result, write_report)
+
+
+def run_backfill(table_name, context):
+    """Runs the backfill within the invocation's time, and if it stops early invokes
+    the function again asynchronously to carry on from the checkpoint"""
+    write_report = backfill(
+        dynamodb.Table(table_name),
+        time_remaining=getattr(context, "get_remaining_time_in_millis", None),
+    )
+    logger.info("Write report: %s" % json.dumps(write_report))
+
+    if not write_report["complete"]:
+        try:
+            lambda_client.invoke(
+                FunctionName=context.invoked_function_arn,
+                InvocationType="Event",
+                Payload=json.dumps({RESUME_KEY: {"DynamoDBTableName": table_name}}),
+            )
+        except Exception as e:
+            # The progress is checkpointed, whichever run comes next carries on from it
+            logger.exception("Couldn't invoke the function to resume the backfill: %s", e)
+    return write_report
+
+
+def backfill(table, end_time=None, time_remaining=None, **lookup_kwargs):
+    """Writes the OCDR history found in CloudTrail to DynamoDB, picking up from the
+    checkpoint left by the previous run.
+
+    The create and cancel events are paged concurrently, under one rate limiter, and
+    streamed page -> parse -> filter -> project -> merge, so only a few pages of
+    history are ever held in memory. Their pages are merged by window: the pages of a
+    cancel window come after those of every create window starting before it ends, so
+    a cancel always finds the item of the reservation it closes. Within a window the
+    pages stay newest first, like CloudTrail returns them.
+
+    Each event name's high-water mark is checkpointed after every page, and if
+    time_remaining() drops under STOP_MARGIN_MS the run stops early with
+    complete=False. The next run resumes from the checkpoint.
+    """
+    checkpoint = load_checkpoint(table)
+    end_time = end_time or (
+        datetime.datetime.now(datetime.timezone.utc) - CLOUDTRAIL_DELIVERY_DELAY
+    )
+    report = {
+        "items": 0,
+        "consumedWCU": 0,
+        "cancelUpdates": 0,
+        "complete": False,
+    }
+
+    # A reservation repeated by a window boundary or a resumed page is merged again,
+    # which changes nothing, so nothing is kept across pages to dedupe them
+    def write_creates(page):
+        add_report(report, write_history(table, build_history(parse_events([page]))))
+
+    def apply_cancels(page):
+        report["cancelUpdates"] += apply_cancel_dates(
+            table, index_cancel_events(parse_events([page]))
+        )
+
+    process_page = {CREATE_EVENT: write_creates, CANCEL_EVENT: apply_cancels}
+    lookup_kwargs["limiter"] = lookup_kwargs.get("limiter") or TokenBucket(LOOKUP_RATE_PER_SECOND)
+    pages = {}
+    for event_name in process_page:
+        windows, exclusive_start, next_token = get_checkpoint_windows(
+            checkpoint.get(event_name), end_time
+        )
+        pages[event_name] = iter_event_pages(
+            event_name,
+            windows,
+            exclusive_start=exclusive_start,
+            next_token=next_token,
+            **lookup_kwargs,
+        )
+
+    # Create pages sort on their window's start, cancel pages on their window's end,
+    # creates first on a tie
+    creates = (((window[0], 0), CREATE_EVENT, window, page) for window, page in pages[CREATE_EVENT])
+    cancels = (((window[1], 1), CANCEL_EVENT, window, page) for window, page in pages[CANCEL_EVENT])
+    try:
+        for _, event_name, window, page in heapq.merge(creates, cancels, key=lambda p: p[0]):
+            process_page[event_name](page)
+
+            # Everything of this event name up to and including this page is in
+            # DynamoDB now
+            state = get_page_checkpoint(window, page)
+            save_checkpoint(table, event_name, state)
+
+            if time_remaining and time_remaining() < STOP_MARGIN_MS:
+                logger.warning(
+                    "Stopping the backfill early, the next run resumes %s from %s" % (event_name, state)
+                )
+                return report
+    finally:
+        for event_pages in pages.values():
+            event_pages.close()
+
+    # No events at all since the last run still moves the high-water marks
+    for event_name in process_page:
+        save_checkpoint(table, event_name, {"eventTime": end_time.isoformat()})
+
+    report["complete"] = True
+    return report
+
+
+def get_page_checkpoint(window, page):
+    """The checkpoint state of an event name once the page of the window is processed"""
+    window_start, window_end = window
+    if "NextToken" in page:
+        return {
+            "eventTime": window_start.isoformat(),
+            "window": {
+                "startTime": window_start.isoformat(),
+                "endTime": window_end.isoformat(),
+                "nextToken": page["NextToken"],
+            },
+        }
+    return {"eventTime": window_end.isoformat()}
+
+
+def load_checkpoint(table):
+    """Gets the per event name high-water marks saved by the previous runs"""
+    response = table.get_item(Key={"capacityReservationId": CHECKPOINT_ID})
+    return response.get("Item", {})
+
+
+def save_checkpoint(table, event_name, state):
+    """Saves the high-water mark for one event name without touching the other"""
+    table.update_item(
+        Key={"capacityReservationId": CHECKPOINT_ID},
+        UpdateExpression="SET #name = :state",
+        ExpressionAttributeNames={"#name": event_name},
+        ExpressionAttributeValues={":state": state},
+    )
+
+
+def get_checkpoint_windows(state, end_time):
+    """Works out the lookup windows left to process for one event name from its
+    checkpoint state. Returns (windows, exclusive_start, next_token)"""
+    if not state:
+        # First run, look back as far as CloudTrail allows
+        start_time = end_time - datetime.timedelta(days=LOOKBACK_DAYS)
+        return get_lookup_windows(start_time, end_time, LOOKUP_WINDOW), False, None
+
+    # Events at the high-water mark itself were processed by the previous run
+    if "window" not in state:
+        start_time = datetime.datetime.fromisoformat(state["eventTime"])
+        return get_lookup_windows(start_time, end_time, LOOKUP_WINDOW), True, None
+
+    # Resume the interrupted window with its NextToken, which is only valid for the
+    # exact same StartTime/EndTime
+    window_start = datetime.datetime.fromisoformat(state["window"]["startTime"])
+    window_end = datetime.datetime.fromisoformat(state["window"]["endTime"])
+    windows = [(window_start, window_end)] + get_lookup_windows(
+        window_end, end_time, LOOKUP_WINDOW
+    )
+    return windows, True, state["window"]["nextToken"]
+
+
+def add_report(report, write_report):
+    for key, value in write_report.items():
+        report[key] += value
+
+
+class TokenBucket:
+    """Thread-safe token bucket, each acquire() blocks until a token is available.
+    capacity is the burst size, the default of 1 spaces calls evenly at rate/second"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def iter_event_pages(
+    event_name,
+    windows,
+    client=None,
+    max_workers=LOOKUP_MAX_WORKERS,
+    limiter=None,
+    max_buffered_pages=LOOKUP_MAX_BUFFERED_PAGES,
+    exclusive_start=False,
+    next_token=None,
+):
+    """Yields ((StartTime, EndTime), page) for one EventName, page being a LookupEvents
+    response.
 
+    The windows are yielded in order, and the pages of a window newest first like
+    CloudTrail returns them. While one window is being processed the following ones
+    are already paged concurrently into small bounded queues. All requests share a
+    single token bucket so together they stay under the LookupEvents rate limit.
+    next_token resumes the first window from an earlier run.
+    """
+    client = client or cloudtrail
+    limiter = limiter or TokenBucket(LOOKUP_RATE_PER_SECOND)
+
+    pages = [
+        queue.Queue(maxsize=max(1, max_buffered_pages // max_workers)) for _ in windows
+    ]
+    stop = threading.Event()
+
+    def fetch_window(i, window_start, window_end):
+        try:
+            for page in lookup_pages_in_window(
+                client,
+                limiter,
+                event_name,
+                window_start,
+                window_end,
+                stop,
+                next_token if i == 0 else None,
+            ):
+                # StartTime/EndTime are inclusive, an event on a window boundary
+                # belongs to the earlier window
+                if i or exclusive_start:
+                    page = {
+                        **page,
+                        "Events": [
+                            e for e in page["Events"] if e["EventTime"] != window_start
+                        ],
+                    }
+                if not _put_until_stopped(pages[i], page, stop):
+                    return
+        except Exception as e:
+            _put_until_stopped(pages[i], e, stop)
+        else:
+            _put_until_stopped(pages[i], _WINDOW_DONE, stop)
+
+    # The windows are submitted in order, so the one being consumed is always running
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for i, (window_start, window_end) in enumerate(windows):
+            executor.submit(fetch_window, i, window_start, window_end)
+
+        for i, window in enumerate(windows):
+            while True:
+                page = pages[i].get()
+                if page is _WINDOW_DONE:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                yield window, page
+    finally:
+        # Unblock the workers if the consumer stopped early or a window failed
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
 
 
-def get_all_events_by_name(event_name):
-    """Gets all of the CloudTrail event payloads by EventName"""
+def _put_until_stopped(q, item, stop):
+    """Blocking put that gives up once stop is set. Returns whether the item was queued"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def get_lookup_windows(start_time, end_time, window):
+    """Splits [start_time, end_time] into consecutive (StartTime, EndTime) windows"""
+    windows = []
+    while start_time < end_time:
+        windows.append((start_time, min(start_time + window, end_time)))
+        start_time += window
+    return windows
+
+
+def lookup_pages_in_window(
+    client, limiter, event_name, start_time, end_time, stop=None, next_token=None
+):
+    """Pages through LookupEvents for one EventName and time window, yielding each
+    response. CloudTrail returns the events newest first"""
 
     # args must be the same with each call to lookup_events, so just define it once
     # and reuse with each call
@@ -93,61 +391,233 @@ def get_all_events_by_name(event_name):
                 "AttributeValue": event_name,
             },
         ],
+        "StartTime": start_time,
+        "EndTime": end_time,
         "MaxResults": 50,
     }
 
-    # Get first page of results
-    response = cloudtrail.lookup_events(**lookup_events_kwargs)
-    events = response["Events"]
+    # Get first page of results, or the page a previous run stopped at
+    limiter.acquire()
+    try:
+        if next_token:
+            response = client.lookup_events(**lookup_events_kwargs, NextToken=next_token)
+        else:
+            response = client.lookup_events(**lookup_events_kwargs)
+    except ClientError as e:
+        if not next_token or e.response["Error"]["Code"] != "InvalidNextTokenException":
+            raise
+        # The saved token has expired, redo the whole window. Rewriting items is harmless
+        logger.warning("NextToken for %s %s expired, restarting the window" % (event_name, start_time))
+        limiter.acquire()
+        response = client.lookup_events(**lookup_events_kwargs)
+    yield response
 
-    # While there are more results, continue to fetch them and add to events list
-    while "NextToken" in response:
-        response = cloudtrail.lookup_events(
+    # While there are more results, continue to fetch them
+    while "NextToken" in response and not (stop and stop.is_set()):
+        limiter.acquire()
+        response = client.lookup_events(
             **lookup_events_kwargs, NextToken=response["NextToken"]
         )
-        events += response["Events"]
+        yield response
+
 
-    cloudtrail_events = [json.loads(e["CloudTrailEvent"]) for e in events]
+def parse_events(pages):
+    """Yields the CloudTrail event payload of every event in the LookupEvents pages"""
+    for page in pages:
+        for e in page["Events"]:
+            yield json.loads(e["CloudTrailEvent"])
 
-    return cloudtrail_events
 
+def skip_failed_events(events):
+    """Drops the events whose API call failed, e.g. a create that didn't result in a
+    OCDR"""
+    return (e for e in events if "errorMessage" not in e)
 
-def get_odcr_cancel_date(capacity_reservation_id, cancel_events):
-    """Gets the time that the OCDR was cancelled using the cancel events we found in
-    CloudTrail"""
 
-    # Filter out the unnsuccessful cancel events
-    successful_cancel_events = [
-        e
-        for e in cancel_events
-        if e["responseElements"]
-        and (
-            e["responseElements"]["CancelCapacityReservationResponse"]["return"] is True
+def write_history(table, history):
+    """Merges the history items (any iterable) into DynamoDB, up to WRITE_MAX_WORKERS
+    update_item calls at once. Returns a report of the items written and consumed WCU.
+
+    Each item is merged like odcrEventsToDynamoFunction's merge_reservation does, never
+    overwriting the endDate or reservationState of a reservation the event function
+    already closed. BatchWriteItem can't do that, its puts replace the whole item.
+
+    Only the first item of each reservation in history is written. The backfill calls
+    it once per page, so the ids it keeps to dedupe are bounded by the page size"""
+
+    # The resource's client (de)serializes python types and, unlike the Table, is
+    # thread-safe
+    client = table.meta.client
+    report = {"items": 0, "consumedWCU": 0}
+
+    def write(item):
+        return client.update_item(
+            TableName=table.name,
+            Key={"capacityReservationId": item["capacityReservationId"]},
+            ReturnConsumedCapacity="TOTAL",
+            **merge_item_update(item),
         )
-    ]
 
-    # Find the cancel events that have the capacity reservation id we're looking for
-    cancel_event_matches = [
-        e
-        for e in successful_cancel_events
-        if e["requestParameters"]["CancelCapacityReservationRequest"][
-            "CapacityReservationId"
-        ]
-        == capacity_reservation_id
-    ]
+    with ThreadPoolExecutor(max_workers=WRITE_MAX_WORKERS) as executor:
+        for response in executor.map(write, unique_items(history)):
+            report["items"] += 1
+            report["consumedWCU"] += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+
+    return report
+
+
+def merge_item_update(item):
+    """The update_item arguments that write a create's attributes without overwriting
+    the endDate or reservationState already stored by a cancel. Keep in step with
+    merge_reservation in odcrEventsToDynamoFunction/app.py"""
+    names = {}
+    values = {}
+    updates = []
+    for i, (key, value) in enumerate(item.items()):
+        if key == "capacityReservationId":
+            continue
+        # names go through placeholders, 'state' is a DynamoDB reserved word
+        names[f"#a{i}"] = key
+        values[f":a{i}"] = value
+        if key in ("endDate", "reservationState"):
+            updates.append(f"#a{i} = if_not_exists(#a{i}, :a{i})")
+        else:
+            updates.append(f"#a{i} = :a{i}")
+    return {
+        "UpdateExpression": "SET " + ", ".join(updates),
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+
+
+def unique_items(history):
+    """Drops the items whose capacityReservationId came up earlier in history"""
+    seen = set()
+    for item in history:
+        if item["capacityReservationId"] in seen:
+            continue
+        seen.add(item["capacityReservationId"])
+        yield item
+
 
-    if len(cancel_event_matches) == 0:
-        # No cancel event found. The OCDR is still running, and hasn't been cancelled
-        # yet
-        return None
-    elif len(cancel_event_matches) > 1:
-        # This should never happen. Let's fail the script so we can investigate
-        raise RuntimeError(
-            f"Multiple cancel events found for {capacity_reservation_id}"
+def apply_cancel_dates(table, cancel_index):
+    """Sets the endDate of reservations already in DynamoDB from an index of cancel
+    events. Returns the number of items updated"""
+    updated = 0
+    for capacity_reservation_id, cancel_date in cancel_index.items():
+        key = {"capacityReservationId": capacity_reservation_id}
+        # Never create a stub item. A cancelled 'limited' reservation is closed too, but
+        # keeps the endDate it was created with, so it takes a second update
+        if _update_if(
+            table,
+            Key=key,
+            UpdateExpression="SET endDate = :dateVal, reservationState = :closed",
+            ConditionExpression="attribute_exists(capacityReservationId) AND endDateType <> :limited",
+            ExpressionAttributeValues={":dateVal": cancel_date, ":limited": "limited", ":closed": CLOSED},
+        ) or _update_if(
+            table,
+            Key=key,
+            UpdateExpression="SET reservationState = :closed",
+            ConditionExpression="attribute_exists(capacityReservationId)",
+            ExpressionAttributeValues={":closed": CLOSED},
+        ):
+            updated += 1
+    return updated
+
+
+def _update_if(table, **kwargs):
+    """update_item with a ConditionExpression, returning whether the condition held"""
+    try:
+        table.update_item(**kwargs)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+
+
+def build_history(create_events, cancel_index=None):
+    """Combines the create CloudTrail events with the index of cancel events into the
+    items stored in DynamoDB, yielding one item per successfully created OCDR.
+
+    Matched cancels are popped from cancel_index, so what is left afterwards are the
+    cancels of reservations created before these create events. Without one the items
+    are left open, for apply_cancel_dates to close.
+    """
+    cancel_index = {} if cancel_index is None else cancel_index
+
+    # Skip the create events that didn't actually result in a OCDR
+    for create_event in skip_failed_events(create_events):
+        # Get the portion of the create event that contains the info we want
+        create_info = create_event["responseElements"][
+            "CreateCapacityReservationResponse"
+        ]["capacityReservation"]
+
+        # Get the cancel date using the cancel event associated with this capacity
+        # reservation ID
+        cancel_date = get_odcr_cancel_date(
+            create_info["capacityReservationId"], cancel_index
         )
-    else:
-        # Return the event time of the matching event
-        return cancel_event_matches[0]["eventTime"]
-    
-    
 
+        # Combine all of the info we want into a single dictionary
+        ocdr_info = {
+            "user_arn": create_event["userIdentity"]["arn"],
+            **create_info
+        }
+
+        # If the reservation created wasn't a 'limited' endDateType, set the endDate to the time it was cancelled
+        if "endDate" not in create_info:
+            ocdr_info["endDate"] = cancel_date
+
+        yield add_derived_keys(ocdr_info, cancelled=cancel_date is not None)
+
+
+def add_derived_keys(item, cancelled):
+    """Adds the GSI keys the ODCR reports query by. Keep in step with
+    odcrEventsToDynamoFunction/app.py"""
+    item["userKey"] = normalize_user_arn(item["user_arn"])
+    item["placementKey"] = f"{item['availabilityZone']}#{item['instanceType']}"
+    item["reservationState"] = CLOSED if cancelled else OPEN
+    return item
+
+
+def normalize_user_arn(user_arn):
+    """IAM names are case-insensitive and CloudTrail doesn't always agree on the case,
+    so the byUser index is keyed on the lowercased ARN"""
+    return user_arn.strip().lower()
+
+
+def index_cancel_events(cancel_events):
+    """Builds a lookup of CapacityReservationId -> cancel eventTime in a single pass
+    over the cancel events we found in CloudTrail. Only the id and time are kept, not
+    the whole event.
+
+    A reservation can only be cancelled once, so the same id twice is the same cancel
+    again, from a resumed page or a window boundary. Applying it again sets the same
+    endDate, so it isn't checked for, here or across the pages of a run"""
+
+    cancel_index = {}
+    for e in cancel_events:
+        # Skip the unnsuccessful cancel events
+        if not (
+            e["responseElements"]
+            and e["responseElements"]["CancelCapacityReservationResponse"]["return"]
+            is True
+        ):
+            continue
+
+        capacity_reservation_id = e["requestParameters"][
+            "CancelCapacityReservationRequest"
+        ]["CapacityReservationId"]
+
+        cancel_index[capacity_reservation_id] = e["eventTime"]
+
+    return cancel_index
+
+
+def get_odcr_cancel_date(capacity_reservation_id, cancel_index):
+    """Gets the time that the OCDR was cancelled from the index of cancel events built
+    by index_cancel_events, taking it out of the index. None if it hasn't been
+    cancelled yet"""
+
+    return cancel_index.pop(capacity_reservation_id, None)
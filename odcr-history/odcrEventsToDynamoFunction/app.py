@@ -1,10 +1,51 @@
 import json
+import time
 import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import ClientError
 
 
 # sam local invoke dynamoCRUDFunction --event events/CreateCapacityReservation-manualend.json
 
+# 'resource' writes through boto3's Table resource, 'client' through the low-level
+# DynamoDB client with the AttributeValues built by hand, skipping the resource layer's
+# type serialisation
+DYNAMO_API = os.environ.get('DYNAMO_API', 'resource')
+
+# reservationState buckets of the byState index
+OPEN = 'open'
+CLOSED = 'closed'
+
+# BatchWriteItem accepts at most 25 put/delete requests per call
+BATCH_WRITE_LIMIT = 25
+# UnprocessedItems are retried with exponential backoff: 0.05s, 0.1s, 0.2s ... capped at 1s
+MAX_WRITE_ATTEMPTS = 5
+WRITE_BACKOFF_BASE = 0.05
+WRITE_BACKOFF_CAP = 1
+# Concurrent update_item calls for the cancels of a batch
+UPDATE_MAX_WORKERS = 10
+
+# Created on first use and reused by every warm invocation of the container, so only
+# the cold start pays for the session, credentials and endpoint resolution
+_table = None
+_client = None
+
+
+def get_table():
+    global _table
+    if _table is None:
+        _table = boto3.resource('dynamodb').Table(os.environ['dynamoTableName'])
+    return _table
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = boto3.client('dynamodb')
+    return _client
+
+
 def lambda_handler(event, context):
     """Lambda function
 
@@ -19,76 +60,32 @@ def lambda_handler(event, context):
 
     Returns
     ------
-    Response from DynamoDB put/update_item: dict
+    Response from DynamoDB update_item: dict
     """
 
-    
-    dynamodb = boto3.resource('dynamodb')
-    table_name = os.environ['dynamoTableName']
-    table = dynamodb.Table(table_name)
-
-
-    
     # if a Reservation was created:
     if "CreateCapacityReservationResponse" in event['detail']['responseElements']:
         print("CREATE CapacityReservation Triggered!")
 
-        event_results = event['detail']['responseElements']['CreateCapacityReservationResponse']['capacityReservation']
-
-        item = {
-            'capacityReservationId': event_results['capacityReservationId'],
-            'startDate': event_results['startDate'],
-            'user_arn': event['detail']['userIdentity']['arn'],
-            'availabilityZone': event_results['availabilityZone'],
-            'createDate': event_results['createDate'],
-            'endDateType': event_results['endDateType'],
-            'endDate': None,
-            'ownerId': event_results['ownerId'],
-            'capacityReservationArn': event_results['capacityReservationArn'],
-            'totalInstanceCount': event_results['totalInstanceCount'],
-            'instancePlatform': event_results['instancePlatform'],
-            'ebsOptimized': event_results['ebsOptimized'],
-            'tenancy': event_results['tenancy'],
-            'instanceMatchCriteria': event_results['instanceMatchCriteria'],
-            'availableInstanceCount': event_results['availableInstanceCount'],
-            'instanceType': event_results['instanceType'],
-            'ephemeralStorage': event_results['ephemeralStorage'],
-            'state': event_results['state']
-        }
-
-        # if the reservation created ends at a 'Specific time', include the endDate attribute in the put_item operation
-        if "endDate" in event_results:
-            item['endDate'] = str(event_results['endDate'])
-
-            print(item)
+        item = build_item(event)
 
-        response = table.put_item(
-            Item=item
-        )
+        response = merge_reservation(item)
 
         return {
             "statusCode": 200,
             "body": json.dumps(response),
         }
-    
-        
-    
+
+
+
     # if a Reservation was cancelled:
     if "CancelCapacityReservationResponse" in event['detail']['responseElements']:
         print("CANCEL CapacityReservation Triggered!")
-        reservation_id = event['detail']['requestParameters']['CancelCapacityReservationRequest']['CapacityReservationId']
-        cancel_date= event['detail']['eventTime']
+        reservation_id, cancel_date = get_cancel_date(event)
 
-        # update the item in DynamoDB. If no item exists, a new one will be created with the attributes specified in the update
-        response = table.update_item(
-            Key={
-                'capacityReservationId': reservation_id
-            },
-            UpdateExpression="SET endDate = :dateVal",
-            ExpressionAttributeValues={
-                ':dateVal': cancel_date
-            }
-        )
+        # update the item in DynamoDB. If the create hasn't arrived yet a new one is created with just the endDate,
+        # the create fills in the rest without touching it
+        response = set_end_date(reservation_id, cancel_date)
 
         return {
             "statusCode": 200,
@@ -99,6 +96,299 @@ def lambda_handler(event, context):
         "statusCode": 400,
         "body": "event parameter didn't match the requirements of the Lambda function code...",
     }
-    
-    
 
+
+def batch_handler(event, context):
+    """Lambda function for a batch of CreateCapacityReservation/CancelCapacityReservation
+    events, either an SQS batch of EventBridge events or a plain list of them.
+
+    The create and cancel events of the same reservation are coalesced in memory
+    first. Reservations with both are complete and written with BatchWriteItem, the
+    others are merged in with parallel update_item calls.
+
+    A record that can't be read is reported on its own, the rest of the batch is
+    still written.
+
+    Returns
+    ------
+    batchItemFailures: the SQS messageIds (or EventBridge event ids) to retry
+    """
+    unreadable = []
+    if isinstance(event, list):
+        messages = [(e['id'], e) for e in event]
+    else:
+        messages = []
+        for record in event['Records']:
+            try:
+                messages.append((record['messageId'], json.loads(record['body'])))
+            except ValueError as e:
+                print(f"Couldn't parse message {record['messageId']}: {e}")
+                unreadable.append(record['messageId'])
+
+    reservations, malformed = coalesce_events(messages)
+    unreadable += malformed
+    print(f"Coalesced {len(messages)} events into {len(reservations)} reservations")
+
+    failed = write_reservations(reservations)
+
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id}
+            for message_id in unreadable
+        ] + [
+            {"itemIdentifier": message_id}
+            for reservation_id in failed
+            for message_id in reservations[reservation_id]['messageIds']
+        ]
+    }
+
+
+def build_item(event):
+    """Builds the DynamoDB item for a CreateCapacityReservation event"""
+    event_results = event['detail']['responseElements']['CreateCapacityReservationResponse']['capacityReservation']
+
+    item = {
+        'capacityReservationId': event_results['capacityReservationId'],
+        'startDate': event_results['startDate'],
+        'user_arn': event['detail']['userIdentity']['arn'],
+        'availabilityZone': event_results['availabilityZone'],
+        'createDate': event_results['createDate'],
+        'endDateType': event_results['endDateType'],
+        'endDate': None,
+        'ownerId': event_results['ownerId'],
+        'capacityReservationArn': event_results['capacityReservationArn'],
+        'totalInstanceCount': event_results['totalInstanceCount'],
+        'instancePlatform': event_results['instancePlatform'],
+        'ebsOptimized': event_results['ebsOptimized'],
+        'tenancy': event_results['tenancy'],
+        'instanceMatchCriteria': event_results['instanceMatchCriteria'],
+        'availableInstanceCount': event_results['availableInstanceCount'],
+        'instanceType': event_results['instanceType'],
+        'ephemeralStorage': event_results['ephemeralStorage'],
+        'state': event_results['state']
+    }
+
+    # if the reservation created ends at a 'Specific time', include the endDate attribute in the put_item operation
+    if "endDate" in event_results:
+        item['endDate'] = str(event_results['endDate'])
+
+        print(item)
+
+    return add_derived_keys(item)
+
+
+def add_derived_keys(item):
+    """Adds the GSI keys the ODCR reports query by. Keep in step with
+    cloudtrailToDynamoFunction/app.py"""
+    item['userKey'] = normalize_user_arn(item['user_arn'])
+    item['placementKey'] = f"{item['availabilityZone']}#{item['instanceType']}"
+    item['reservationState'] = OPEN
+    return item
+
+
+def normalize_user_arn(user_arn):
+    """IAM names are case-insensitive and CloudTrail doesn't always agree on the case,
+    so the byUser index is keyed on the lowercased ARN"""
+    return user_arn.strip().lower()
+
+
+def get_cancel_date(event):
+    """Gets (capacityReservationId, cancel date) from a CancelCapacityReservation event"""
+    reservation_id = event['detail']['requestParameters']['CancelCapacityReservationRequest']['CapacityReservationId']
+    cancel_date = event['detail']['eventTime']
+    return reservation_id, cancel_date
+
+
+def coalesce_events(messages):
+    """Groups (message id, EventBridge event) pairs by capacityReservationId into
+    {'item': create item or None, 'endDate': cancel date or None, 'messageIds': [...]}.
+    Returns (reservations, ids of the messages whose event is missing fields)"""
+    reservations = {}
+    malformed = []
+    for message_id, event in messages:
+        try:
+            response_elements = event['detail']['responseElements'] or {}
+
+            if "CreateCapacityReservationResponse" in response_elements:
+                item = build_item(event)
+                reservation_id = item['capacityReservationId']
+            elif "CancelCapacityReservationResponse" in response_elements:
+                reservation_id, cancel_date = get_cancel_date(event)
+                item = None
+            else:
+                print(f"Skipping event {message_id}, it isn't a successful create or cancel")
+                continue
+        except (KeyError, TypeError) as e:
+            print(f"Couldn't read event {message_id}: {e!r}")
+            malformed.append(message_id)
+            continue
+
+        reservation = reservations.setdefault(
+            reservation_id, {'item': None, 'endDate': None, 'messageIds': []}
+        )
+        reservation['messageIds'].append(message_id)
+        if item:
+            reservation['item'] = item
+        else:
+            reservation['endDate'] = cancel_date
+
+    return reservations, malformed
+
+
+def write_reservations(reservations):
+    """Writes the coalesced reservations, returning the ids whose write failed"""
+    # A create and its cancel in the same batch make the final item, whatever is already
+    # stored, so it can be put. A lone create or cancel has to be merged with the other half
+    items = []
+    updates = {}
+    for reservation_id, reservation in reservations.items():
+        if reservation['item'] and reservation['endDate']:
+            items.append({**reservation['item'], 'endDate': reservation['endDate'], 'reservationState': CLOSED})
+        elif reservation['item']:
+            updates[reservation_id] = (merge_reservation, reservation['item'])
+        else:
+            updates[reservation_id] = (set_end_date, reservation_id, reservation['endDate'])
+
+    failed = batch_put_reservations(items)
+
+    # Each update is its own request, so send them concurrently. The low-level clients
+    # are thread-safe, the Table resource isn't
+    with ThreadPoolExecutor(max_workers=UPDATE_MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(*update): reservation_id
+            for reservation_id, update in updates.items()
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except ClientError as e:
+                print(f"Couldn't update {futures[future]}: {e}")
+                failed.append(futures[future])
+
+    return failed
+
+
+def batch_put_reservations(items):
+    """Puts the items in BatchWriteItem chunks, retrying UnprocessedItems with backoff.
+    Returns the ids of the items that still couldn't be written"""
+    client, serialize = get_batch_client()
+    table_name = os.environ['dynamoTableName']
+    failed = []
+
+    for i in range(0, len(items), BATCH_WRITE_LIMIT):
+        request_items = {
+            table_name: [
+                {'PutRequest': {'Item': serialize(item)}}
+                for item in items[i:i + BATCH_WRITE_LIMIT]
+            ]
+        }
+
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            if attempt:
+                time.sleep(min(WRITE_BACKOFF_BASE * 2 ** (attempt - 1), WRITE_BACKOFF_CAP))
+            try:
+                response = client.batch_write_item(RequestItems=request_items)
+            except ClientError as e:
+                print(f"BatchWriteItem failed: {e}")
+                break
+            request_items = response.get('UnprocessedItems')
+            if not request_items:
+                break
+
+        for request in (request_items or {}).get(table_name, []):
+            reservation_id = request['PutRequest']['Item']['capacityReservationId']
+            failed.append(reservation_id['S'] if isinstance(reservation_id, dict) else reservation_id)
+
+    return failed
+
+
+def merge_reservation(item):
+    """Writes a create event's attributes without overwriting an endDate or
+    reservationState that is already stored: the ones of a cancel event that overtook
+    the create, or the same create's when it is redelivered. Together with set_end_date
+    this makes the writes idempotent and independent of the order the events arrive in."""
+    names = {}
+    values = {}
+    updates = []
+    for i, (key, value) in enumerate(item.items()):
+        if key == 'capacityReservationId':
+            continue
+        # names go through placeholders, 'state' is a DynamoDB reserved word
+        names[f'#a{i}'] = key
+        values[f':a{i}'] = value
+        if key in ('endDate', 'reservationState'):
+            updates.append(f"#a{i} = if_not_exists(#a{i}, :a{i})")
+        else:
+            updates.append(f"#a{i} = :a{i}")
+
+    if DYNAMO_API == 'client':
+        return get_client().update_item(
+            TableName=os.environ['dynamoTableName'],
+            Key={
+                'capacityReservationId': {'S': item['capacityReservationId']}
+            },
+            UpdateExpression="SET " + ", ".join(updates),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={key: to_attribute_value(value) for key, value in values.items()}
+        )
+
+    return get_table().meta.client.update_item(
+        TableName=os.environ['dynamoTableName'],
+        Key={
+            'capacityReservationId': item['capacityReservationId']
+        },
+        UpdateExpression="SET " + ", ".join(updates),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+def set_end_date(reservation_id, cancel_date):
+    """Sets the cancel date as the endDate and closes the reservation. Both always win
+    over the create's, see merge_reservation"""
+    if DYNAMO_API == 'client':
+        return get_client().update_item(
+            TableName=os.environ['dynamoTableName'],
+            Key={
+                'capacityReservationId': {'S': reservation_id}
+            },
+            UpdateExpression="SET endDate = :dateVal, reservationState = :closed",
+            ExpressionAttributeValues={
+                ':dateVal': {'S': cancel_date},
+                ':closed': {'S': CLOSED}
+            }
+        )
+
+    # The resource's client (de)serializes python types and, unlike the Table, is
+    # thread-safe
+    return get_table().meta.client.update_item(
+        TableName=os.environ['dynamoTableName'],
+        Key={
+            'capacityReservationId': reservation_id
+        },
+        UpdateExpression="SET endDate = :dateVal, reservationState = :closed",
+        ExpressionAttributeValues={
+            ':dateVal': cancel_date,
+            ':closed': CLOSED
+        }
+    )
+
+
+def get_batch_client():
+    """Gets the client for BatchWriteItem with the function that serializes an item for it"""
+    if DYNAMO_API == 'client':
+        return get_client(), lambda item: {key: to_attribute_value(value) for key, value in item.items()}
+    return get_table().meta.client, lambda item: item
+
+
+def to_attribute_value(value):
+    """Builds the DynamoDB AttributeValue for the scalar types found in a
+    CapacityReservation item"""
+    if value is None:
+        return {'NULL': True}
+    # bool first, it is a subclass of int
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float)):
+        return {'N': str(value)}
+    return {'S': str(value)}
@@ -0,0 +1,241 @@
+"""Exports the ODCR history table to Parquet for the cost reports, so they read
+columnar files instead of Scanning the table the event functions write to.
+
+    # straight from the table, a parallel Scan
+    python -m odcrExport.export --table odcr-history-us-west-2 --dest s3://bucket/odcr-history/
+
+    # from a DynamoDB export to S3 (ExportTableToPointInTime, DYNAMODB_JSON), which
+    # uses no read capacity at all
+    python -m odcrExport.export --export-manifest s3://bucket/AWSDynamoDB/<export-id>/manifest-files.json \\
+        --dest s3://bucket/odcr-history/
+
+The items are streamed in record batches of BATCH_SIZE and written as zstd Parquet,
+hive-partitioned by the month the reservation started (startMonth=2023-01). The
+duration of each reservation is computed on the whole batch with pyarrow.compute.
+"""
+import argparse
+import datetime
+import gzip
+import json
+import queue
+import threading
+from urllib.parse import urlparse
+
+import boto3
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs
+from boto3.dynamodb.types import TypeDeserializer
+
+
+BATCH_SIZE = 10_000
+SCAN_SEGMENTS = 4
+# Pages buffered per Scan segment before the segment waits for the writer
+SCAN_MAX_BUFFERED_PAGES = 2
+_SEGMENT_DONE = object()
+
+# CloudTrail writes these with and without milliseconds, both are parsed once the
+# fraction is dropped
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+STRING_COLUMNS = [
+    "capacityReservationId", "capacityReservationArn", "ownerId", "user_arn", "userKey",
+    "availabilityZone", "instanceType", "placementKey", "instancePlatform", "tenancy",
+    "instanceMatchCriteria", "endDateType", "state", "reservationState",
+]
+INT_COLUMNS = ["totalInstanceCount", "availableInstanceCount"]
+BOOL_COLUMNS = ["ebsOptimized", "ephemeralStorage"]
+DATE_COLUMNS = ["startDate", "createDate", "endDate"]
+
+SCHEMA = pa.schema(
+    [pa.field(name, pa.string()) for name in STRING_COLUMNS]
+    + [pa.field(name, pa.int64()) for name in INT_COLUMNS]
+    + [pa.field(name, pa.bool_()) for name in BOOL_COLUMNS]
+    + [pa.field(name, pa.timestamp("s", tz="UTC")) for name in DATE_COLUMNS]
+    + [
+        # Hours between startDate and endDate, or the export time if it hasn't ended
+        pa.field("durationHours", pa.float64()),
+        pa.field("instanceHours", pa.float64()),
+        pa.field("startMonth", pa.string()),
+    ]
+)
+
+
+def export(items, dest, exported_at=None, batch_size=BATCH_SIZE):
+    """Writes the items as Parquet under dest, a local directory or s3:// URI.
+    Returns the number of rows written"""
+    exported_at = exported_at or datetime.datetime.now(datetime.timezone.utc)
+    filesystem, path = pyarrow.fs.FileSystem.from_uri(dest) if "://" in dest else (None, dest)
+
+    rows = 0
+
+    def record_batches():
+        nonlocal rows
+        for chunk in batched(reservation_items(items), batch_size):
+            batch = to_record_batch(chunk, exported_at)
+            rows += batch.num_rows
+            yield batch
+
+    ds.write_dataset(
+        record_batches(),
+        path,
+        schema=SCHEMA,
+        filesystem=filesystem,
+        format="parquet",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        partitioning=ds.partitioning(pa.schema([pa.field("startMonth", pa.string())]), flavor="hive"),
+        # A rerun replaces the months it writes
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+    return rows
+
+
+def to_record_batch(items, exported_at):
+    """Builds the record batch of a chunk of items, adding the computed columns"""
+    columns = {name: [item.get(name) for item in items] for name in STRING_COLUMNS + INT_COLUMNS + BOOL_COLUMNS}
+    # DynamoDB numbers come back as Decimal
+    for name in INT_COLUMNS:
+        columns[name] = [None if value is None else int(value) for value in columns[name]]
+    # ownerId is a number in the create event but an account id, not a quantity
+    columns["ownerId"] = [None if value is None else str(value) for value in columns["ownerId"]]
+    arrays = {
+        name: pa.array(values, type=SCHEMA.field(name).type)
+        for name, values in columns.items()
+    }
+
+    for name in DATE_COLUMNS:
+        arrays[name] = parse_timestamps(pa.array([item.get(name) for item in items], pa.string()))
+
+    now = pa.scalar(exported_at.replace(microsecond=0), type=pa.timestamp("s", tz="UTC"))
+    end = pc.fill_null(arrays["endDate"], now)
+    # A 'limited' reservation whose endDate is still ahead has only run until now
+    end = pc.if_else(pc.greater(end, now), now, end)
+    seconds = pc.cast(pc.subtract(end, arrays["startDate"]), pa.int64())
+    arrays["durationHours"] = pc.divide(pc.cast(seconds, pa.float64()), 3600.0)
+    arrays["instanceHours"] = pc.multiply(arrays["durationHours"], pc.cast(arrays["totalInstanceCount"], pa.float64()))
+    arrays["startMonth"] = pc.strftime(arrays["startDate"], format="%Y-%m")
+
+    return pa.RecordBatch.from_arrays([arrays[field.name] for field in SCHEMA], schema=SCHEMA)
+
+
+def parse_timestamps(values):
+    """Parses the ISO 8601 strings of a column in one pass, dropping the milliseconds"""
+    values = pc.replace_substring_regex(values, pattern=r"\.\d+Z$", replacement="Z")
+    return pc.strptime(values, format=TIMESTAMP_FORMAT, unit="s", error_is_null=True).cast(
+        pa.timestamp("s", tz="UTC")
+    )
+
+
+def reservation_items(items):
+    """Skips the items that aren't a reservation, the backfill checkpoint, and the ones
+    a cancel created before their create event arrived"""
+    for item in items:
+        if item.get("startDate") and item["capacityReservationId"].startswith("cr-"):
+            yield item
+
+
+def scan_items(table, segments=SCAN_SEGMENTS, page_size=None):
+    """Yields the items of a parallel Scan of the table, reading the segments
+    concurrently but holding only a few pages of each in memory"""
+    pages = queue.Queue(maxsize=segments * SCAN_MAX_BUFFERED_PAGES)
+    stop = threading.Event()
+    errors = []
+
+    def scan_segment(segment):
+        kwargs = {"TableName": table.name, "Segment": segment, "TotalSegments": segments}
+        if page_size:
+            kwargs["Limit"] = page_size
+        try:
+            while not stop.is_set():
+                # The resource's client deserializes the items and is thread-safe
+                response = table.meta.client.scan(**kwargs)
+                pages.put(response["Items"])
+                if "LastEvaluatedKey" not in response:
+                    break
+                kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except Exception as e:
+            errors.append(e)
+        finally:
+            pages.put(_SEGMENT_DONE)
+
+    threads = [threading.Thread(target=scan_segment, args=(i,), daemon=True) for i in range(segments)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        done = 0
+        while done < segments:
+            page = pages.get()
+            if page is _SEGMENT_DONE:
+                done += 1
+                continue
+            yield from page
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        # Unblock the segments waiting on a full queue so they can see stop
+        while any(thread.is_alive() for thread in threads):
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def export_items(manifest_uri, s3=None):
+    """Yields the items of a DynamoDB export to S3 in DYNAMODB_JSON format, one
+    gzipped data file at a time"""
+    s3 = s3 or boto3.client("s3")
+    deserializer = TypeDeserializer()
+    bucket, manifest_key = split_s3_uri(manifest_uri)
+
+    manifest = s3.get_object(Bucket=bucket, Key=manifest_key)["Body"].read().decode()
+    for line in manifest.splitlines():
+        if not line.strip():
+            continue
+        data_key = json.loads(line)["dataFileS3Key"]
+        body = s3.get_object(Bucket=bucket, Key=data_key)["Body"]
+        with gzip.open(body, "rt") as f:
+            for record in f:
+                image = json.loads(record)["Item"]
+                yield {name: deserializer.deserialize(value) for name, value in image.items()}
+
+
+def split_s3_uri(uri):
+    parsed = urlparse(uri)
+    return parsed.netloc, parsed.path.lstrip("/")
+
+
+def batched(items, size):
+    """Yields lists of up to size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--table", help="DynamoDB table to Scan")
+    source.add_argument("--export-manifest", help="s3:// URI of the manifest-files.json of a DynamoDB export")
+    parser.add_argument("--dest", required=True, help="local directory or s3:// URI to write the Parquet files to")
+    parser.add_argument("--segments", type=int, default=SCAN_SEGMENTS, help="parallel Scan segments")
+    args = parser.parse_args()
+
+    if args.table:
+        items = scan_items(boto3.resource("dynamodb").Table(args.table), args.segments)
+    else:
+        items = export_items(args.export_manifest)
+
+    print(f"Exported {export(items, args.dest)} reservations to {args.dest}")
+
+
+if __name__ == "__main__":
+    main()
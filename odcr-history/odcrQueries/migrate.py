@@ -0,0 +1,90 @@
+"""Fills in the derived GSI keys (userKey, placementKey, reservationState) of the items
+written before the functions added them, so the reports of queries.py see them too.
+
+The backfill only rewrites the reservations of the last 90 days CloudTrail still
+returns, the older ones stay out of every index until this runs once:
+
+    python -m odcrQueries.migrate --table odcr-history-us-west-2
+
+It only sets the keys an item is missing, so it can be run again safely, and while the
+functions are writing.
+"""
+import argparse
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+from odcrEventsToDynamoFunction.app import CLOSED, OPEN, normalize_user_arn
+
+
+DERIVED_KEYS = ("userKey", "placementKey", "reservationState")
+# What the keys are derived from
+SOURCE_ATTRIBUTES = ("capacityReservationId", "user_arn", "availabilityZone", "instanceType", "endDate", "endDateType")
+
+
+def migrate(table, page_size=None):
+    """Adds the missing derived keys to every item of a reservation. Returns the number
+    of items updated"""
+    kwargs = {
+        "FilterExpression": Attr(DERIVED_KEYS[0]).not_exists()
+        | Attr(DERIVED_KEYS[1]).not_exists()
+        | Attr(DERIVED_KEYS[2]).not_exists(),
+        "ProjectionExpression": ", ".join(SOURCE_ATTRIBUTES),
+    }
+    if page_size:
+        kwargs["Limit"] = page_size
+
+    updated = 0
+    while True:
+        response = table.scan(**kwargs)
+        for item in response["Items"]:
+            # The backfill checkpoint, and the stub a cancel writes before its create
+            # arrives, have nothing to derive the keys from
+            if "user_arn" not in item:
+                continue
+            if add_derived_keys(table, item):
+                updated += 1
+        if "LastEvaluatedKey" not in response:
+            return updated
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def add_derived_keys(table, item):
+    """Sets the derived keys of item that aren't stored yet. A reservation is closed once
+    it has the endDate of a cancel, like the functions' add_derived_keys decide it.
+    Returns False if the item was deleted since the Scan"""
+    closed = item.get("endDate") is not None and item.get("endDateType") != "limited"
+    try:
+        table.update_item(
+            Key={"capacityReservationId": item["capacityReservationId"]},
+            UpdateExpression=(
+                "SET userKey = if_not_exists(userKey, :userKey), "
+                "placementKey = if_not_exists(placementKey, :placementKey), "
+                "reservationState = if_not_exists(reservationState, :reservationState)"
+            ),
+            # Never recreate an item
+            ConditionExpression="attribute_exists(capacityReservationId)",
+            ExpressionAttributeValues={
+                ":userKey": normalize_user_arn(item["user_arn"]),
+                ":placementKey": f"{item['availabilityZone']}#{item['instanceType']}",
+                ":reservationState": CLOSED if closed else OPEN,
+            },
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--table", required=True, help="the ODCR history table")
+    args = parser.parse_args()
+
+    print(f"Added the derived keys to {migrate(boto3.resource('dynamodb').Table(args.table))} reservations")
+
+
+if __name__ == "__main__":
+    main()
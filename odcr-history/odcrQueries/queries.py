@@ -0,0 +1,85 @@
+"""Reports over the ODCR history table served from its GSIs, so each one is a Query
+whose cost follows the number of reservations returned rather than the table size.
+
+    python -c "import boto3; from odcrQueries import queries; \
+print(list(queries.open_reservations(boto3.resource('dynamodb').Table('odcr-history-us-west-2'))))"
+
+Dates are the ISO 8601 strings stored in the items and compared as strings, like
+DynamoDB does.
+"""
+import datetime
+
+from boto3.dynamodb.conditions import Attr, Key
+
+from odcrEventsToDynamoFunction.app import CLOSED, OPEN, normalize_user_arn
+
+
+def reservations_by_user(table, user_arn, start=None, end=None, page_size=None):
+    """Reservations created by user_arn, in any case, oldest first"""
+    return query_index(
+        table, "byUser",
+        key_condition("userKey", normalize_user_arn(user_arn), start, end),
+        page_size=page_size,
+    )
+
+
+def reservations_by_placement(table, availability_zone, instance_type, start=None, end=None, page_size=None):
+    """Reservations of instance_type in availability_zone, oldest first"""
+    return query_index(
+        table, "byPlacement",
+        key_condition("placementKey", f"{availability_zone}#{instance_type}", start, end),
+        page_size=page_size,
+    )
+
+
+def reservations_by_state(table, state, start=None, end=None, page_size=None, **kwargs):
+    """Reservations that are OPEN (not cancelled) or CLOSED, oldest first"""
+    if state not in (OPEN, CLOSED):
+        raise ValueError(f"state must be {OPEN!r} or {CLOSED!r}, not {state!r}")
+    return query_index(
+        table, "byState",
+        key_condition("reservationState", state, start, end),
+        page_size=page_size,
+        **kwargs,
+    )
+
+
+def open_reservations(table, now=None, start=None, end=None, page_size=None):
+    """Reservations still holding capacity: not cancelled, and either 'unlimited' or
+    'limited' with an endDate that hasn't passed yet"""
+    now = now or datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    # An expired 'limited' reservation is never cancelled, so it stays in the 'open'
+    # bucket. There are few of them, filtering them out costs little
+    return reservations_by_state(
+        table, OPEN, start, end, page_size,
+        FilterExpression=Attr("endDate").attribute_type("NULL") | Attr("endDate").gt(now),
+    )
+
+
+def key_condition(partition_key, value, start=None, end=None):
+    """The index key condition for one partition and a startDate range, either bound
+    optional"""
+    condition = Key(partition_key).eq(value)
+    if start and end:
+        return condition & Key("startDate").between(start, end)
+    if start:
+        return condition & Key("startDate").gte(start)
+    if end:
+        return condition & Key("startDate").lte(end)
+    return condition
+
+
+def query_index(table, index_name, key_condition, page_size=None, **kwargs):
+    """Yields the items of a Query on index_name, fetching the next page only when
+    the previous one has been consumed"""
+    kwargs = {"IndexName": index_name, "KeyConditionExpression": key_condition, **kwargs}
+    if page_size:
+        kwargs["Limit"] = page_size
+
+    while True:
+        response = table.query(**kwargs)
+        yield from response["Items"]
+
+        if "LastEvaluatedKey" not in response:
+            return
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
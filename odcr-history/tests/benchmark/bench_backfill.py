@@ -0,0 +1,48 @@
+"""Times app.backfill(), the page-by-page CloudTrail -> DynamoDB run of the custom
+resource, on synthetic event sets.
+
+Pages come from a synthetic LookupEvents client without rate limiting and the DynamoDB
+writes are discarded, so only the backfill's own work is timed.
+
+run from odcr-history/:
+    python -m tests.benchmark.bench_backfill
+"""
+import datetime
+import os
+import time
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from cloudtrailToDynamoFunction import app  # noqa: E402
+from tests.synthetic_events import BASE_TIME, NoLimit, NullTable, SyntheticLookupClient  # noqa: E402
+
+
+SIZES = (10_000, 100_000)
+# 100k reservations a minute apart fit in the 90 days LookupEvents reaches back
+SPACING = 60
+
+
+def time_backfill(n, repeat=3):
+    end_time = BASE_TIME + datetime.timedelta(seconds=n * SPACING)
+    best = float("inf")
+    for _ in range(repeat):
+        client = SyntheticLookupClient(n, spacing=SPACING)
+        start = time.perf_counter()
+        report = app.backfill(NullTable(), end_time=end_time, client=client, limiter=NoLimit())
+        best = min(best, time.perf_counter() - start)
+    assert report["complete"] and report["items"] == n
+    return best
+
+
+def main():
+    results = {n: time_backfill(n) for n in SIZES}
+    for n, seconds in results.items():
+        print(f"{n:>8} creates: {seconds * 1000:9.1f} ms  ({seconds / n * 1e6:.2f} us/event)")
+
+    small, large = SIZES
+    ratio = results[large] / results[small]
+    print(f"scaling {small} -> {large}: x{ratio:.1f} (linear ~ x{large // small})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Cold vs warm latency of odcrEventsToDynamoFunction against a moto DynamoDB table.
+
+"cold" is the first invocation after the cached clients are dropped, so it pays for the
+boto3 session, credentials and endpoint resolution. "per-invocation setup" rebuilds the
+clients on every call, like the handler used to. moto answers in-process, so the numbers
+are client-side overhead only, without the network round trip.
+
+run from odcr-history/ (needs moto):
+    python -m tests.benchmark.bench_event_handler
+"""
+import contextlib
+import io
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ["dynamoTableName"] = "odcr-history-bench"
+
+import boto3  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from odcrEventsToDynamoFunction import app  # noqa: E402
+
+
+EVENTS = os.path.join(os.path.dirname(__file__), "..", "..", "events")
+WARM_INVOCATIONS = 200
+
+
+def load_event(name):
+    with open(os.path.join(EVENTS, name)) as f:
+        return json.load(f)
+
+
+def reset_clients():
+    app._table = None
+    app._client = None
+
+
+def invoke(event):
+    # the handler prints every event it handles
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        ret = app.lambda_handler(event, None)
+        elapsed = time.perf_counter() - start
+    assert ret["statusCode"] == 200
+    return elapsed * 1000
+
+
+def measure(dynamo_api, event):
+    app.DYNAMO_API = dynamo_api
+
+    reset_clients()
+    cold = invoke(event)
+    warm = [invoke(event) for _ in range(WARM_INVOCATIONS)]
+
+    per_invocation = []
+    for _ in range(WARM_INVOCATIONS // 10):
+        reset_clients()
+        per_invocation.append(invoke(event))
+
+    return cold, statistics.median(warm), statistics.median(per_invocation)
+
+
+def main():
+    create = load_event("CreateCapacityReservation-manualend.json")
+    cancel = load_event("CancelCapacityReservation-manualend.json")
+
+    with mock_aws():
+        boto3.client("dynamodb").create_table(
+            TableName=os.environ["dynamoTableName"],
+            BillingMode="PAY_PER_REQUEST",
+            AttributeDefinitions=[{"AttributeName": "capacityReservationId", "AttributeType": "S"}],
+            KeySchema=[{"AttributeName": "capacityReservationId", "KeyType": "HASH"}],
+        )
+
+        print(f"{'':16}{'cold':>10}{'warm p50':>12}{'per-invocation setup p50':>28}")
+        for name, event in (("create", create), ("cancel", cancel)):
+            for dynamo_api in ("resource", "client"):
+                cold, warm, per_invocation = measure(dynamo_api, event)
+                print(f"{name:>6} {dynamo_api:<9}{cold:8.1f}ms{warm:10.2f}ms{per_invocation:26.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compares serial LookupEvents paging against the windowed concurrent fetcher.
+
+CloudTrail is simulated by an in-memory client that sleeps LATENCY seconds per call.
+Time is scaled 10x (100ms calls under a 20 TPS limit stand in for 1s calls under the
+real 2 TPS limit), so the run finishes in a few seconds.
+
+run from odcr-history/:
+    python -m tests.benchmark.bench_lookup
+"""
+import datetime
+import os
+import time
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from cloudtrailToDynamoFunction import app  # noqa: E402
+from tests.synthetic_events import (  # noqa: E402
+    BASE_TIME,
+    WindowedLookupClient,
+    cancel_event,
+    create_event,
+    lookup_event,
+)
+
+
+LATENCY = 0.1
+RATE_PER_SECOND = 20
+DAYS = 90
+PAGE_SIZE = 50
+
+
+class _SlowClient(WindowedLookupClient):
+    def __init__(self, events):
+        super().__init__(events, page_size=PAGE_SIZE)
+        self.calls = 0
+
+    def lookup_events(self, **kwargs):
+        self.calls += 1
+        time.sleep(LATENCY)
+        return super().lookup_events(**kwargs)
+
+
+def synthetic_history():
+    # one reservation every 2 hours for 90 days, half of them cancelled
+    creates = [create_event(i * 7200) for i in range(DAYS * 12)]
+    cancels = [cancel_event(i * 7200) for i in range(0, DAYS * 12, 2)]
+    return [lookup_event(e) for e in creates + cancels]
+
+
+EVENT_NAMES = ("CreateCapacityReservation", "CancelCapacityReservation")
+
+
+def serial(client, start_time, end_time):
+    """The original fetch: one name at a time, one page at a time, no windows"""
+    limiter = app.TokenBucket(RATE_PER_SECOND)
+    return {
+        name: list(app.parse_events(
+            app.lookup_pages_in_window(client, limiter, name, start_time, end_time)
+        ))
+        for name in EVENT_NAMES
+    }
+
+
+def windowed(client, start_time, end_time):
+    limiter = app.TokenBucket(RATE_PER_SECOND)
+    return {
+        name: list(app.parse_events(
+            page for _, page in app.iter_event_pages(
+                name,
+                app.get_lookup_windows(start_time, end_time, app.LOOKUP_WINDOW),
+                client=client,
+                limiter=limiter,
+            )
+        ))
+        for name in EVENT_NAMES
+    }
+
+
+def main():
+    events = synthetic_history()
+    start_time, end_time = BASE_TIME, BASE_TIME + datetime.timedelta(days=DAYS)
+
+    results = {}
+    for name, fetch in (("serial", serial), ("windowed", windowed)):
+        client = _SlowClient(events)
+        start = time.perf_counter()
+        fetched = fetch(client, start_time, end_time)
+        elapsed = time.perf_counter() - start
+        results[name] = fetched
+        total = sum(len(v) for v in fetched.values())
+        print(
+            f"{name:>9}: {elapsed:6.2f}s  {client.calls:4} calls  "
+            f"{client.calls / elapsed:5.1f} calls/s  {total / elapsed:8.0f} events/s"
+        )
+
+    for name in EVENT_NAMES:
+        by_time = lambda e: e["eventTime"]  # noqa: E731
+        assert sorted(results["serial"][name], key=by_time) == sorted(
+            results["windowed"][name], key=by_time
+        )
+
+
+if __name__ == "__main__":
+    main()
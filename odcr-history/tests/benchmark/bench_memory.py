@@ -0,0 +1,78 @@
+"""Peak memory of the backfill, materialised lists vs app.backfill().
+
+Pages come from a synthetic LookupEvents client that generates them on the fly and the
+DynamoDB writes are discarded, so tracemalloc only sees what the pipeline itself holds.
+
+run from odcr-history/:
+    python -m tests.benchmark.bench_memory
+"""
+import datetime
+import os
+import tracemalloc
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from cloudtrailToDynamoFunction import app  # noqa: E402
+from tests.synthetic_events import BASE_TIME, NoLimit, NullTable, SyntheticLookupClient  # noqa: E402
+
+
+SIZES = (10_000, 50_000)
+SPACING = 60
+
+
+def end_time(n):
+    return BASE_TIME + datetime.timedelta(seconds=n * SPACING)
+
+
+def pages(client, event_name, n):
+    windows = app.get_lookup_windows(BASE_TIME, end_time(n), app.LOOKUP_WINDOW)
+    return (
+        page for _, page in app.iter_event_pages(
+            event_name, windows, client=client, limiter=NoLimit()
+        )
+    )
+
+
+def materialised(n):
+    """The original shape: every raw page in one list, every parsed event in a second
+    list, then the whole history list"""
+    client = SyntheticLookupClient(n, spacing=SPACING)
+    raw_cancels = [e for page in pages(client, "CancelCapacityReservation", n) for e in page["Events"]]
+    raw_creates = [e for page in pages(client, "CreateCapacityReservation", n) for e in page["Events"]]
+    cancel_events = list(app.parse_events([{"Events": raw_cancels}]))
+    create_events = list(app.parse_events([{"Events": raw_creates}]))
+    cancel_index = app.index_cancel_events(cancel_events)
+    history = list(app.build_history(create_events, cancel_index))
+    return app.write_history(NullTable(), history)
+
+
+def backfill(n):
+    """What the custom resource runs, page by page"""
+    client = SyntheticLookupClient(n, spacing=SPACING)
+    return app.backfill(NullTable(), end_time=end_time(n), client=client, limiter=NoLimit())
+
+
+def peak_mib(run, n):
+    tracemalloc.start()
+    report = run(n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert report["items"] == n
+    return peak / 2 ** 20
+
+
+def main():
+    for n in SIZES:
+        print(
+            f"{n:>8} reservations: materialised {peak_mib(materialised, n):8.1f} MiB"
+            f"   backfill {peak_mib(backfill, n):6.1f} MiB"
+        )
+    print(
+        "backfill only holds the pages in flight, a few for each of the windows being "
+        f"paged: it grows with the windows up to {app.LOOKUP_MAX_WORKERS} of them, not "
+        "with the reservations"
+    )
+
+
+if __name__ == "__main__":
+    main()
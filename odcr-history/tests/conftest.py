@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+
+# The Lambda modules create their boto3 clients at import time, so give them a region
+# and dummy credentials before any test imports them
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+
+# The GSIs of dynamoDBTable in template.yaml, index name -> partition key
+INDEXES = {"byUser": "userKey", "byPlacement": "placementKey", "byState": "reservationState"}
+
+
+@pytest.fixture()
+def odcr_table():
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+
+    with moto.mock_aws():
+        table = boto3.resource("dynamodb").create_table(
+            TableName="odcr-history-test",
+            BillingMode="PAY_PER_REQUEST",
+            AttributeDefinitions=[
+                {"AttributeName": name, "AttributeType": "S"}
+                for name in ("capacityReservationId", "startDate", *INDEXES.values())
+            ],
+            KeySchema=[{"AttributeName": "capacityReservationId", "KeyType": "HASH"}],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": index_name,
+                    "KeySchema": [
+                        {"AttributeName": key, "KeyType": "HASH"},
+                        {"AttributeName": "startDate", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+                for index_name, key in INDEXES.items()
+            ],
+        )
+        yield table
@@ -0,0 +1,179 @@
+"""Synthetic CloudTrail CreateCapacityReservation / CancelCapacityReservation events
+shaped like the ones in events/, used by the benchmarks and unit tests."""
+import datetime
+import json
+import math
+
+
+BASE_TIME = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+USER_ARN = "arn:aws:sts::570351108046:assumed-role/cloud303-rnd/kloucks"
+
+
+def reservation_id(i):
+    return f"cr-{i:017x}"
+
+
+def event_time(i):
+    return (BASE_TIME + datetime.timedelta(seconds=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def create_event(i, instance_type="t2.micro", availability_zone="us-west-2a", end_date=None):
+    cr_id = reservation_id(i)
+    event = {
+        "eventTime": event_time(i),
+        "eventName": "CreateCapacityReservation",
+        "userIdentity": {"arn": USER_ARN},
+        "responseElements": {
+            "CreateCapacityReservationResponse": {
+                "capacityReservation": {
+                    "capacityReservationId": cr_id,
+                    "capacityReservationArn": f"arn:aws:ec2:us-west-2:570351108046:capacity-reservation/{cr_id}",
+                    "availabilityZone": availability_zone,
+                    "instanceType": instance_type,
+                    "instancePlatform": "Linux/UNIX",
+                    "tenancy": "default",
+                    "ebsOptimized": False,
+                    "ephemeralStorage": False,
+                    "instanceMatchCriteria": "open",
+                    "totalInstanceCount": 1,
+                    "availableInstanceCount": 1,
+                    "ownerId": 570351108046,
+                    "endDateType": "unlimited",
+                    "state": "active",
+                    "startDate": event_time(i),
+                    "createDate": event_time(i),
+                }
+            }
+        },
+    }
+    if end_date:
+        reservation = event["responseElements"]["CreateCapacityReservationResponse"]["capacityReservation"]
+        reservation["endDateType"] = "limited"
+        reservation["endDate"] = end_date
+    return event
+
+
+def cancel_event(i, offset=3600):
+    return {
+        "eventTime": event_time(i + offset),
+        "eventName": "CancelCapacityReservation",
+        "userIdentity": {"arn": USER_ARN},
+        "requestParameters": {
+            "CancelCapacityReservationRequest": {"CapacityReservationId": reservation_id(i)}
+        },
+        "responseElements": {"CancelCapacityReservationResponse": {"return": True}},
+    }
+
+
+def event_sets(n, cancelled_ratio=0.5):
+    """Returns (create_events, cancel_events) with n reservations, a share of which
+    have been cancelled"""
+    create_events = [create_event(i) for i in range(n)]
+    cancel_events = [cancel_event(i) for i in range(int(n * cancelled_ratio))]
+    return create_events, cancel_events
+
+
+def eventbridge_event(cloudtrail_event, event_id):
+    """Wraps a CloudTrail event payload the way EventBridge delivers it to
+    odcrEventsToDynamoFunction"""
+    return {
+        "version": "0",
+        "id": event_id,
+        "detail-type": "AWS API Call via CloudTrail",
+        "source": "aws.ec2",
+        "detail": cloudtrail_event,
+    }
+
+
+def lookup_event(cloudtrail_event, event_id=None):
+    """Wraps a CloudTrail event payload the way LookupEvents returns it"""
+    return {
+        "EventId": event_id or f"{cloudtrail_event['eventName']}-{cloudtrail_event['eventTime']}",
+        "EventName": cloudtrail_event["eventName"],
+        "EventTime": datetime.datetime.strptime(
+            cloudtrail_event["eventTime"], "%Y-%m-%dT%H:%M:%SZ"
+        ).replace(tzinfo=datetime.timezone.utc),
+        "CloudTrailEvent": json.dumps(cloudtrail_event),
+    }
+
+
+class NullTable:
+    """An ODCR table stub without a checkpoint, accepting every GetItem/UpdateItem call
+    and dropping the items, so the benchmarks only measure the backfill itself"""
+    name = "odcr-history-bench"
+
+    def __init__(self):
+        self.meta = type("meta", (), {"client": self})
+
+    def get_item(self, **kwargs):
+        return {}
+
+    def update_item(self, **kwargs):
+        return {}
+
+
+class NoLimit:
+    """A LookupEvents rate limiter that never waits, for the stub clients below"""
+
+    def acquire(self):
+        pass
+
+
+class WindowedLookupClient:
+    """Serves LookupEvents from an in-memory event list, filtered like CloudTrail does
+    (inclusive StartTime/EndTime, newest first)"""
+
+    def __init__(self, events, page_size=2):
+        self.events = events
+        self.page_size = page_size
+
+    def lookup_events(self, LookupAttributes, StartTime, EndTime, MaxResults, NextToken=None):
+        event_name = LookupAttributes[0]["AttributeValue"]
+        matches = sorted(
+            (
+                e for e in self.events
+                if e["EventName"] == event_name and StartTime <= e["EventTime"] <= EndTime
+            ),
+            key=lambda e: e["EventTime"],
+            reverse=True,
+        )
+        offset = int(NextToken or 0)
+        response = {"Events": matches[offset:offset + self.page_size]}
+        if offset + self.page_size < len(matches):
+            response["NextToken"] = str(offset + self.page_size)
+        return response
+
+
+class SyntheticLookupClient:
+    """Generates LookupEvents pages on the fly, so the history itself never sits in
+    memory. Reservation i is created at BASE_TIME + i * spacing seconds and every
+    other reservation is cancelled half a spacing later"""
+
+    def __init__(self, n, spacing=60):
+        self.n = n
+        self.spacing = spacing
+        self.calls = 0
+
+    def lookup_events(self, LookupAttributes, StartTime, EndTime, MaxResults, NextToken=None):
+        self.calls += 1
+        event_name = LookupAttributes[0]["AttributeValue"]
+        offset, step = (0, 1) if event_name == "CreateCapacityReservation" else (self.spacing // 2, 2)
+
+        # reservations whose event falls inside [StartTime, EndTime], newest first
+        lo = math.ceil(((StartTime - BASE_TIME).total_seconds() - offset) / self.spacing)
+        hi = math.floor(((EndTime - BASE_TIME).total_seconds() - offset) / self.spacing)
+        lo, hi = max(lo, 0), min(hi, self.n - 1)
+        top = hi - hi % step
+        indexes = range(top, lo - 1, -step)
+
+        start = int(NextToken or 0)
+        page = indexes[start:start + MaxResults]
+        if event_name == "CreateCapacityReservation":
+            events = [create_event(i * self.spacing) for i in page]
+        else:
+            events = [cancel_event(i * self.spacing, offset=offset) for i in page]
+
+        response = {"Events": [lookup_event(e) for e in events]}
+        if start + MaxResults < len(indexes):
+            response["NextToken"] = str(start + MaxResults)
+        return response
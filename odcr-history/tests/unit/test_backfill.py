@@ -0,0 +1,106 @@
+from cloudtrailToDynamoFunction import app
+from tests.synthetic_events import cancel_event, create_event, event_sets
+
+
+# run this unit test:
+# python -m pytest tests/unit -v
+
+
+def test_build_history_matches_cancel_dates():
+    create_events, cancel_events = event_sets(10)
+
+    history = list(app.build_history(create_events, app.index_cancel_events(cancel_events)))
+
+    assert len(history) == 10
+    for i, item in enumerate(history):
+        expected = cancel_events[i]["eventTime"] if i < 5 else None
+        assert item["endDate"] == expected
+        assert item["user_arn"] == create_events[i]["userIdentity"]["arn"]
+
+
+def test_build_history_skips_errored_creates():
+    failed = create_event(1)
+    failed["errorMessage"] = "Insufficient capacity."
+
+    history = list(app.build_history([create_event(0), failed], {}))
+
+    assert [item["capacityReservationId"] for item in history] == [
+        create_event(0)["responseElements"]["CreateCapacityReservationResponse"][
+            "capacityReservation"
+        ]["capacityReservationId"]
+    ]
+
+
+def test_build_history_keeps_limited_end_date():
+    limited = create_event(0)
+    info = limited["responseElements"]["CreateCapacityReservationResponse"][
+        "capacityReservation"
+    ]
+    info["endDateType"] = "limited"
+    info["endDate"] = "2023-02-01T00:00:00.000Z"
+
+    history = list(app.build_history([limited], app.index_cancel_events([cancel_event(0)])))
+
+    assert history[0]["endDate"] == "2023-02-01T00:00:00.000Z"
+
+
+def test_index_cancel_events_ignores_unsuccessful_cancels():
+    unsuccessful = cancel_event(0)
+    unsuccessful["responseElements"]["CancelCapacityReservationResponse"]["return"] = False
+    errored = cancel_event(1)
+    errored["responseElements"] = None
+
+    cancel_index = app.index_cancel_events([unsuccessful, errored, cancel_event(2)])
+
+    assert list(cancel_index) == [cancel_event(2)["requestParameters"][
+        "CancelCapacityReservationRequest"
+    ]["CapacityReservationId"]]
+
+
+def test_build_history_leaves_unmatched_cancels_in_index():
+    cancel_index = app.index_cancel_events([cancel_event(0), cancel_event(1)])
+
+    list(app.build_history([create_event(1)], cancel_index))
+
+    assert cancel_index == {cancel_event(0)["requestParameters"][
+        "CancelCapacityReservationRequest"
+    ]["CapacityReservationId"]: cancel_event(0)["eventTime"]}
+
+
+def test_index_cancel_events_takes_a_repeated_cancel():
+    cancel_index = app.index_cancel_events([cancel_event(0), cancel_event(0)])
+
+    assert cancel_index == {cancel_event(0)["requestParameters"][
+        "CancelCapacityReservationRequest"
+    ]["CapacityReservationId"]: cancel_event(0)["eventTime"]}
+
+
+def test_write_history_dedupes(odcr_table):
+    create_events, cancel_events = event_sets(60)
+    history = list(app.build_history(create_events, app.index_cancel_events(cancel_events)))
+
+    # duplicates as a rerun of the backfill would produce
+    report = app.write_history(odcr_table, history[:10] + history[:50] + history)
+
+    assert report["items"] == 60
+    assert odcr_table.scan(Select="COUNT")["Count"] == 60
+
+
+def test_write_history_keeps_a_closed_reservation(odcr_table):
+    create = create_event(0)
+    reservation_id = create["responseElements"]["CreateCapacityReservationResponse"][
+        "capacityReservation"
+    ]["capacityReservationId"]
+    # the event function closed the reservation, with a cancel the backfill hasn't seen
+    odcr_table.update_item(
+        Key={"capacityReservationId": reservation_id},
+        UpdateExpression="SET endDate = :dateVal, reservationState = :closed",
+        ExpressionAttributeValues={":dateVal": cancel_event(0)["eventTime"], ":closed": app.CLOSED},
+    )
+
+    app.write_history(odcr_table, app.build_history([create]))
+
+    item = odcr_table.get_item(Key={"capacityReservationId": reservation_id})["Item"]
+    assert item["endDate"] == cancel_event(0)["eventTime"]
+    assert item["reservationState"] == app.CLOSED
+    assert item["user_arn"] == create["userIdentity"]["arn"]
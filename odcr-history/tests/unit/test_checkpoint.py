@@ -0,0 +1,274 @@
+import datetime
+import json
+
+import pytest
+from botocore.exceptions import EndpointConnectionError
+
+from cloudtrailToDynamoFunction import app
+from tests.synthetic_events import (
+    BASE_TIME,
+    NoLimit,
+    WindowedLookupClient,
+    cancel_event,
+    create_event,
+    event_time,
+    lookup_event,
+    reservation_id,
+)
+
+
+# run this unit test:
+# python -m pytest tests/unit -v
+
+DAY = datetime.timedelta(days=1)
+
+
+class _CountingClient(WindowedLookupClient):
+    def __init__(self, events):
+        super().__init__(events, page_size=50)
+        self.requests = []
+
+    def lookup_events(self, **kwargs):
+        self.requests.append(kwargs)
+        return super().lookup_events(**kwargs)
+
+
+def _backfill(table, client, end_time, **kwargs):
+    return app.backfill(table, end_time=end_time, client=client, limiter=NoLimit(), **kwargs)
+
+
+def _items(table):
+    items = table.scan()["Items"]
+    return {i["capacityReservationId"]: i for i in items if i["capacityReservationId"] != app.CHECKPOINT_ID}
+
+
+def test_first_run_backfills_and_checkpoints(odcr_table):
+    events = [create_event(i * 3600) for i in range(10)] + [cancel_event(0)]
+    end_time = BASE_TIME + 10 * DAY
+
+    report = _backfill(odcr_table, _CountingClient([lookup_event(e) for e in events]), end_time)
+
+    assert report["complete"] is True
+    assert report["items"] == 10
+    assert _items(odcr_table)[reservation_id(0)]["endDate"] == cancel_event(0)["eventTime"]
+    checkpoint = app.load_checkpoint(odcr_table)
+    assert checkpoint[app.CREATE_EVENT] == {"eventTime": end_time.isoformat()}
+    assert checkpoint[app.CANCEL_EVENT] == {"eventTime": end_time.isoformat()}
+
+
+def test_next_run_only_reads_new_range(odcr_table):
+    old = [create_event(i * 3600) for i in range(10)]
+    first_end = BASE_TIME + 10 * DAY
+    _backfill(odcr_table, _CountingClient([lookup_event(e) for e in old]), first_end)
+
+    # a new reservation, and a cancel for one created before the first run finished
+    new = [create_event(11 * 86400), cancel_event(3600, offset=11 * 86400)]
+    client = _CountingClient([lookup_event(e) for e in old + new])
+    report = _backfill(odcr_table, client, first_end + 2 * DAY)
+
+    assert {r["StartTime"] for r in client.requests} == {first_end}
+    assert report["items"] == 1
+    assert report["cancelUpdates"] == 1
+    items = _items(odcr_table)
+    assert len(items) == 11
+    assert items[reservation_id(3600)]["endDate"] == new[1]["eventTime"]
+
+
+def test_cancel_never_creates_a_stub_item(odcr_table):
+    _backfill(odcr_table, _CountingClient([]), BASE_TIME + DAY)
+
+    # the create is older than anything CloudTrail still returns
+    client = _CountingClient([lookup_event(cancel_event(0, offset=2 * 86400))])
+    report = _backfill(odcr_table, client, BASE_TIME + 3 * DAY)
+
+    assert report["cancelUpdates"] == 0
+    assert _items(odcr_table) == {}
+
+
+def test_cancel_closes_limited_reservations(odcr_table):
+    limited_end = event_time(86400 * 30)
+    creates = [create_event(0, end_date=limited_end), create_event(60)]
+    _backfill(odcr_table, _CountingClient([lookup_event(e) for e in creates]), BASE_TIME + DAY)
+
+    cancels = [cancel_event(0, offset=2 * 86400), cancel_event(60, offset=2 * 86400)]
+    report = _backfill(odcr_table, _CountingClient([lookup_event(e) for e in creates + cancels]), BASE_TIME + 3 * DAY)
+
+    assert report["cancelUpdates"] == 2
+    items = _items(odcr_table)
+    assert items[reservation_id(0)]["reservationState"] == app.CLOSED
+    assert items[reservation_id(0)]["endDate"] == limited_end
+    assert items[reservation_id(60)]["reservationState"] == app.CLOSED
+    assert items[reservation_id(60)]["endDate"] == cancels[1]["eventTime"]
+
+
+def test_cancels_wait_for_the_creates_of_their_window(odcr_table):
+    # the event names were checkpointed at different times, so their windows don't line up
+    app.save_checkpoint(odcr_table, app.CREATE_EVENT, {"eventTime": (BASE_TIME + 3 * DAY).isoformat()})
+    app.save_checkpoint(odcr_table, app.CANCEL_EVENT, {"eventTime": BASE_TIME.isoformat()})
+    events = [create_event(5 * 86400), cancel_event(5 * 86400, offset=86400)]
+
+    report = _backfill(odcr_table, _CountingClient([lookup_event(e) for e in events]), BASE_TIME + 20 * DAY)
+
+    assert report["cancelUpdates"] == 1
+    assert _items(odcr_table)[reservation_id(5 * 86400)]["reservationState"] == app.CLOSED
+
+
+def test_cancel_repeated_on_another_page(odcr_table):
+    # a resumed page or a window boundary returns the same cancel again
+    events = [lookup_event(create_event(0))] + [
+        lookup_event(cancel_event(0), event_id=f"cancel-{i}") for i in range(2)
+    ]
+
+    report = _backfill(odcr_table, WindowedLookupClient(events, page_size=1), BASE_TIME + DAY)
+
+    assert report["complete"] is True
+    assert report["cancelUpdates"] == 2
+    assert _items(odcr_table)[reservation_id(0)]["endDate"] == cancel_event(0)["eventTime"]
+
+
+def test_backfill_keeps_reservations_closed_by_the_event_function(odcr_table):
+    # the cancel came in after end_time, so only the event function has seen it
+    odcr_table.update_item(
+        Key={"capacityReservationId": reservation_id(0)},
+        UpdateExpression="SET endDate = :dateVal, reservationState = :closed",
+        ExpressionAttributeValues={":dateVal": cancel_event(0, offset=2 * 86400)["eventTime"], ":closed": app.CLOSED},
+    )
+
+    _backfill(odcr_table, _CountingClient([lookup_event(create_event(0))]), BASE_TIME + DAY)
+
+    item = _items(odcr_table)[reservation_id(0)]
+    assert item["reservationState"] == app.CLOSED
+    assert item["endDate"] == cancel_event(0, offset=2 * 86400)["eventTime"]
+    assert item["placementKey"] == "us-west-2a#t2.micro"
+
+
+def test_interrupted_run_resumes_from_next_token(odcr_table):
+    # 120 creates in one window, so it takes 3 pages of 50
+    events = [create_event(i * 60) for i in range(120)] + [cancel_event(0)]
+    end_time = BASE_TIME + DAY
+
+    def time_remaining():
+        # run out of time in the middle of the window with the events
+        in_window = "window" in app.load_checkpoint(odcr_table)[app.CREATE_EVENT]
+        return 0 if in_window else 900_000
+
+    report = _backfill(
+        odcr_table,
+        _CountingClient([lookup_event(e) for e in events]),
+        end_time,
+        time_remaining=time_remaining,
+    )
+
+    assert report["complete"] is False
+    assert report["items"] == 50
+    checkpoint = app.load_checkpoint(odcr_table)
+    assert checkpoint[app.CREATE_EVENT]["window"]["nextToken"] == "50"
+    # the cancels are only checkpointed up to the windows ending before the creates'
+    assert checkpoint[app.CANCEL_EVENT]["eventTime"] <= checkpoint[app.CREATE_EVENT]["window"]["startTime"]
+
+    client = _CountingClient([lookup_event(e) for e in events])
+    report = _backfill(odcr_table, client, end_time)
+
+    create_requests = [
+        r for r in client.requests if r["LookupAttributes"][0]["AttributeValue"] == app.CREATE_EVENT
+    ]
+    assert create_requests[0]["NextToken"] == "50"
+    assert report["complete"] is True
+    assert report["items"] == 70
+    items = _items(odcr_table)
+    assert len(items) == 120
+    assert items[reservation_id(0)]["endDate"] == cancel_event(0)["eventTime"]
+
+
+def test_interrupted_cancels_resume_from_next_token(odcr_table):
+    # 120 cancels in one window, so they take 3 pages of 50
+    creates = [create_event(i * 60) for i in range(120)]
+    cancels = [cancel_event(i * 60, offset=3600) for i in range(120)]
+    events = [lookup_event(e) for e in creates + cancels]
+    end_time = BASE_TIME + DAY
+
+    def time_remaining():
+        # run out of time in the middle of the cancels, long after the creates
+        in_window = "window" in app.load_checkpoint(odcr_table).get(app.CANCEL_EVENT, {})
+        return 0 if in_window else 900_000
+
+    report = _backfill(odcr_table, _CountingClient(events), end_time, time_remaining=time_remaining)
+
+    assert report["complete"] is False
+    assert (report["items"], report["cancelUpdates"]) == (120, 50)
+    assert app.load_checkpoint(odcr_table)[app.CREATE_EVENT] == {"eventTime": end_time.isoformat()}
+
+    report = _backfill(odcr_table, _CountingClient(events), end_time)
+
+    assert report["complete"] is True
+    assert (report["items"], report["cancelUpdates"]) == (0, 70)
+    assert {item["reservationState"] for item in _items(odcr_table).values()} == {app.CLOSED}
+
+
+class _Context:
+    invoked_function_arn = "arn:aws:lambda:us-west-2:123456789012:function:odcr-history-cloudtrailDynamoFunction-1A2B3C4D5E6F"
+
+    def get_remaining_time_in_millis(self):
+        return 900_000
+
+
+class _LambdaClient:
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, **kwargs):
+        self.invocations.append(kwargs)
+
+
+@pytest.fixture()
+def handler(monkeypatch):
+    """lambda_handler with the CloudFormation responses and self invocations recorded,
+    and backfill replaced by one reporting `complete`"""
+    responses = []
+    lambda_client = _LambdaClient()
+    monkeypatch.setattr(app.cfnresponse, "send", lambda event, context, status, data: responses.append(status))
+    monkeypatch.setattr(app, "lambda_client", lambda_client)
+    monkeypatch.setattr(app.dynamodb, "Table", lambda name: name)
+
+    def run(event, complete=True, error=None):
+        def backfill(table, time_remaining):
+            if error:
+                raise error
+            return {"items": 1, "complete": complete}
+        monkeypatch.setattr(app, "backfill", backfill)
+        app.lambda_handler(event, _Context())
+        return responses, lambda_client.invocations
+
+    return run
+
+
+CFN_EVENT = {"RequestType": "Create", "ResourceProperties": {"DynamoDBTableName": "odcr-history-test"}}
+
+
+def test_handler_resumes_an_incomplete_backfill(handler):
+    responses, invocations = handler(CFN_EVENT, complete=False)
+
+    assert responses == [app.cfnresponse.SUCCESS]
+    [invocation] = invocations
+    assert invocation["FunctionName"] == _Context.invoked_function_arn
+    assert invocation["InvocationType"] == "Event"
+    assert json.loads(invocation["Payload"]) == {app.RESUME_KEY: {"DynamoDBTableName": "odcr-history-test"}}
+
+
+def test_handler_stops_once_complete(handler):
+    responses, invocations = handler({app.RESUME_KEY: {"DynamoDBTableName": "odcr-history-test"}})
+
+    # a resumed run has no CloudFormation request to answer
+    assert responses == []
+    assert invocations == []
+
+
+@pytest.mark.parametrize("error", [
+    EndpointConnectionError(endpoint_url="https://cloudtrail.us-west-2.amazonaws.com"),
+    KeyError("responseElements"),
+], ids=["botocore", "other"])
+def test_handler_always_answers_cloudformation(handler, error):
+    responses, invocations = handler(CFN_EVENT, error=error)
+
+    assert responses == [app.cfnresponse.FAILED]
+    assert invocations == []
@@ -0,0 +1,184 @@
+import datetime
+import time
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from cloudtrailToDynamoFunction import app
+from tests.synthetic_events import (
+    BASE_TIME,
+    NoLimit,
+    SyntheticLookupClient,
+    WindowedLookupClient,
+    cancel_event,
+    create_event,
+    lookup_event,
+)
+
+
+# run this unit test:
+# python -m pytest tests/unit -v
+
+DAY = datetime.timedelta(days=1)
+HOUR = datetime.timedelta(hours=1)
+
+
+def _lookup_kwargs(event_name, start_time, end_time, **kwargs):
+    return {
+        "LookupAttributes": [{"AttributeKey": "EventName", "AttributeValue": event_name}],
+        "StartTime": start_time,
+        "EndTime": end_time,
+        "MaxResults": 50,
+        **kwargs,
+    }
+
+
+def _fetch(event_name, client, days=2, window=6 * HOUR, **kwargs):
+    windows = app.get_lookup_windows(BASE_TIME, BASE_TIME + days * DAY, window)
+    return list(app.parse_events(
+        page for _, page in app.iter_event_pages(
+            event_name, windows, client=client, limiter=NoLimit(), **kwargs
+        )
+    ))
+
+
+def test_get_lookup_windows_covers_range():
+    windows = app.get_lookup_windows(BASE_TIME, BASE_TIME + 2.5 * DAY, DAY)
+
+    assert windows == [
+        (BASE_TIME, BASE_TIME + DAY),
+        (BASE_TIME + DAY, BASE_TIME + 2 * DAY),
+        (BASE_TIME + 2 * DAY, BASE_TIME + 2.5 * DAY),
+    ]
+
+
+def test_iter_event_pages_pages_each_window():
+    client = boto3.client("cloudtrail")
+    first, second, third = (create_event(i * 86400 + 3600) for i in range(3))
+
+    with Stubber(client) as stubber:
+        # newest first within each window, like CloudTrail
+        stubber.add_response(
+            "lookup_events",
+            {"Events": [lookup_event(second)], "NextToken": "page-2"},
+            _lookup_kwargs("CreateCapacityReservation", BASE_TIME, BASE_TIME + 2 * DAY),
+        )
+        stubber.add_response(
+            "lookup_events",
+            {"Events": [lookup_event(first)]},
+            _lookup_kwargs(
+                "CreateCapacityReservation", BASE_TIME, BASE_TIME + 2 * DAY, NextToken="page-2"
+            ),
+        )
+        stubber.add_response(
+            "lookup_events",
+            {"Events": [lookup_event(third)]},
+            _lookup_kwargs("CreateCapacityReservation", BASE_TIME + 2 * DAY, BASE_TIME + 3 * DAY),
+        )
+
+        events = _fetch(
+            "CreateCapacityReservation", client, days=3, window=2 * DAY, max_workers=1
+        )
+        stubber.assert_no_pending_responses()
+
+    assert events == [second, first, third]
+
+
+def test_iter_event_pages_resumes_from_next_token():
+    client = boto3.client("cloudtrail")
+    event = create_event(3600)
+
+    with Stubber(client) as stubber:
+        stubber.add_response(
+            "lookup_events",
+            {"Events": [lookup_event(event)]},
+            _lookup_kwargs("CreateCapacityReservation", BASE_TIME, BASE_TIME + DAY, NextToken="saved"),
+        )
+
+        events = _fetch("CreateCapacityReservation", client, days=1, window=DAY, next_token="saved")
+        stubber.assert_no_pending_responses()
+
+    assert events == [event]
+
+
+def test_iter_event_pages_restarts_window_on_expired_next_token():
+    client = boto3.client("cloudtrail")
+    event = create_event(3600)
+
+    with Stubber(client) as stubber:
+        stubber.add_client_error(
+            "lookup_events",
+            "InvalidNextTokenException",
+            expected_params=_lookup_kwargs(
+                "CreateCapacityReservation", BASE_TIME, BASE_TIME + DAY, NextToken="expired"
+            ),
+        )
+        stubber.add_response(
+            "lookup_events",
+            {"Events": [lookup_event(event)]},
+            _lookup_kwargs("CreateCapacityReservation", BASE_TIME, BASE_TIME + DAY),
+        )
+
+        events = _fetch("CreateCapacityReservation", client, days=1, window=DAY, next_token="expired")
+        stubber.assert_no_pending_responses()
+
+    assert events == [event]
+
+
+def test_iter_event_pages_yields_windows_in_order():
+    creates = [create_event(i * 3600) for i in range(48)]
+    cancels = [cancel_event(i * 3600, offset=1800) for i in range(0, 48, 2)]
+    client = WindowedLookupClient([lookup_event(e) for e in creates + cancels])
+
+    # events fall on the window boundaries too, they must not be duplicated
+    fetched_creates = _fetch("CreateCapacityReservation", client)
+    fetched_cancels = _fetch("CancelCapacityReservation", client)
+
+    # 6 hour windows in order, newest first inside each window. The event on a
+    # boundary belongs to the earlier window
+    window = lambda i: max(i - 1, 0) // 6  # noqa: E731
+    assert fetched_creates == [
+        creates[i] for i in sorted(range(48), key=lambda i: (window(i), -i))
+    ]
+    assert sorted(fetched_cancels, key=lambda e: e["eventTime"]) == cancels
+
+
+def test_iter_event_pages_raises_window_errors():
+    class _FailingClient(WindowedLookupClient):
+        def lookup_events(self, StartTime, **kwargs):
+            if StartTime > BASE_TIME:
+                raise RuntimeError("throttled")
+            return super().lookup_events(StartTime=StartTime, **kwargs)
+
+    with pytest.raises(RuntimeError, match="throttled"):
+        _fetch("CreateCapacityReservation", _FailingClient([]))
+
+
+def test_iter_event_pages_stops_workers_when_closed():
+    client = SyntheticLookupClient(100_000, spacing=1)
+    pages = app.iter_event_pages(
+        "CreateCapacityReservation",
+        app.get_lookup_windows(BASE_TIME, BASE_TIME + 100_000 * datetime.timedelta(seconds=1), HOUR),
+        client=client,
+        limiter=NoLimit(),
+        max_buffered_pages=2,
+    )
+
+    next(pages)
+    pages.close()
+    calls = client.calls
+
+    # Any worker still paging would keep calling LookupEvents
+    time.sleep(0.2)
+    assert calls < 100_000 // 50
+    assert client.calls == calls
+
+
+def test_token_bucket_limits_rate():
+    limiter = app.TokenBucket(rate=50, capacity=1)
+    start = app.time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+
+    assert app.time.monotonic() - start == pytest.approx(0.2, abs=0.1)
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import HealthCheck, given, settings, strategies as st
+
+from odcrEventsToDynamoFunction import app
+from tests.synthetic_events import cancel_event, create_event, event_time, eventbridge_event, reservation_id
+
+
+# Each reservation is (limited end date, cancelled)
+reservations = st.lists(st.tuples(st.booleans(), st.booleans()), min_size=1, max_size=4)
+
+ordering_settings = settings(
+    max_examples=25,
+    deadline=None,
+    suppress_health_check=[HealthCheck.function_scoped_fixture],
+)
+
+
+def _events(reservations):
+    events = []
+    for i, (limited, cancelled) in enumerate(reservations):
+        events.append(create_event(i, end_date=event_time(i + 86400) if limited else None))
+        if cancelled:
+            events.append(cancel_event(i))
+    return [eventbridge_event(event, f"event-{n}") for n, event in enumerate(events)]
+
+
+def _expected(reservations):
+    """The items after every event has been applied once, creates before cancels"""
+    expected = {}
+    for i, (limited, cancelled) in enumerate(reservations):
+        item = app.build_item(eventbridge_event(create_event(i, end_date=event_time(i + 86400) if limited else None), ""))
+        if cancelled:
+            item["endDate"] = event_time(i + 3600)
+            item["reservationState"] = "closed"
+        expected[reservation_id(i)] = item
+    return expected
+
+
+def _stored(table):
+    return {item["capacityReservationId"]: item for item in table.scan()["Items"]}
+
+
+def _clear(table):
+    with table.batch_writer() as batch:
+        for key in _stored(table):
+            batch.delete_item(Key={"capacityReservationId": key})
+
+
+@pytest.fixture()
+def ordering_table(odcr_table, monkeypatch):
+    monkeypatch.setenv("dynamoTableName", odcr_table.name)
+    monkeypatch.setattr(app, "_table", None)
+    return odcr_table
+
+
+@ordering_settings
+@given(data=st.data(), reservations=reservations)
+def test_lambda_handler_any_order_and_redelivery(ordering_table, data, reservations):
+
+    _clear(ordering_table)
+    events = _events(reservations)
+    redelivered = data.draw(st.lists(st.sampled_from(events), max_size=len(events)))
+    shuffled = data.draw(st.permutations(events + redelivered))
+
+    for event in shuffled:
+        assert app.lambda_handler(event, "")["statusCode"] == 200
+
+    assert _stored(ordering_table) == _expected(reservations)
+
+
+@ordering_settings
+@given(data=st.data(), reservations=reservations)
+def test_batch_handler_any_order_and_batching(ordering_table, data, reservations):
+
+    _clear(ordering_table)
+    events = _events(reservations)
+    redelivered = data.draw(st.lists(st.sampled_from(events), max_size=len(events)))
+    shuffled = data.draw(st.permutations(events + redelivered))
+
+    while shuffled:
+        size = data.draw(st.integers(min_value=1, max_value=len(shuffled)))
+        batch, shuffled = shuffled[:size], shuffled[size:]
+        records = [{"messageId": event["id"], "body": json.dumps(event)} for event in batch]
+        assert app.batch_handler({"Records": records}, "") == {"batchItemFailures": []}
+
+    assert _stored(ordering_table) == _expected(reservations)
@@ -0,0 +1,85 @@
+import datetime
+import gzip
+import json
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset as ds
+
+from boto3.dynamodb.types import TypeSerializer
+
+from cloudtrailToDynamoFunction import app as backfill_app
+from odcrExport import export
+from tests.synthetic_events import BASE_TIME, cancel_event, create_event, event_time
+
+
+EXPORTED_AT = BASE_TIME + datetime.timedelta(days=40)
+
+
+@pytest.fixture()
+def history_items():
+    """ 3 reservations: cancelled after an hour, 'limited' ending next year, still open,
+    the last starting in February"""
+
+    create_events = [create_event(0), create_event(1, end_date="2024-01-01T00:00:00.000Z"), create_event(35 * 86400)]
+    create_events[0]["responseElements"]["CreateCapacityReservationResponse"]["capacityReservation"]["totalInstanceCount"] = 4
+    cancel_index = backfill_app.index_cancel_events([cancel_event(0)])
+    return list(backfill_app.build_history(create_events, cancel_index))
+
+
+def _read(path):
+    table = ds.dataset(path, format="parquet", partitioning="hive").to_table()
+    return {row["capacityReservationId"]: row for row in table.to_pylist()}
+
+
+def test_export_scanned_table(odcr_table, history_items, tmp_path):
+
+    backfill_app.write_history(odcr_table, history_items)
+    backfill_app.save_checkpoint(odcr_table, backfill_app.CREATE_EVENT, {"eventTime": event_time(10)})
+    # a cancel that arrived before its create
+    odcr_table.put_item(Item={"capacityReservationId": "cr-stub", "endDate": event_time(0)})
+
+    rows = export.export(export.scan_items(odcr_table, segments=3, page_size=1), str(tmp_path), EXPORTED_AT)
+
+    assert rows == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["startMonth=2023-01", "startMonth=2023-02"]
+    rows = _read(tmp_path)
+    cancelled, limited, running = (rows[item["capacityReservationId"]] for item in history_items)
+    assert cancelled["durationHours"] == pytest.approx(1)
+    assert cancelled["instanceHours"] == pytest.approx(4)
+    assert cancelled["reservationState"] == "closed"
+    assert cancelled["ownerId"] == "570351108046"
+    assert limited["endDate"] == datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    assert limited["durationHours"] == pytest.approx((EXPORTED_AT - BASE_TIME).total_seconds() / 3600 - 1 / 3600)
+    assert running["endDate"] is None
+    assert running["durationHours"] == pytest.approx(5 * 24)
+    assert running["startMonth"] == "2023-02"
+
+
+def test_export_replaces_rewritten_months(history_items, tmp_path):
+
+    export.export(history_items, str(tmp_path), EXPORTED_AT)
+    export.export(history_items[:1], str(tmp_path), EXPORTED_AT, batch_size=1)
+
+    assert len(_read(tmp_path)) == 2
+
+
+def test_export_items_from_dynamodb_export(odcr_table, history_items):
+    boto3 = pytest.importorskip("boto3")
+
+    serializer = TypeSerializer()
+    s3 = boto3.client("s3")
+    s3.create_bucket(Bucket="exports", CreateBucketConfiguration={"LocationConstraint": "us-west-2"})
+    manifest = []
+    for i, item in enumerate(history_items):
+        key = f"AWSDynamoDB/01/data/{i}.json.gz"
+        line = json.dumps({"Item": {k: serializer.serialize(v) for k, v in item.items()}})
+        s3.put_object(Bucket="exports", Key=key, Body=gzip.compress(line.encode() + b"\n"))
+        manifest.append(json.dumps({"dataFileS3Key": key, "itemCount": 1}))
+    s3.put_object(Bucket="exports", Key="AWSDynamoDB/01/manifest-files.json", Body="\n".join(manifest))
+
+    items = list(export.export_items("s3://exports/AWSDynamoDB/01/manifest-files.json", s3))
+
+    assert [item["capacityReservationId"] for item in items] == [item["capacityReservationId"] for item in history_items]
+    assert items[0]["totalInstanceCount"] == 4
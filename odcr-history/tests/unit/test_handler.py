@@ -2,7 +2,7 @@ import json
 
 import pytest
 
-from dynamoCRUDFunction import app
+from odcrEventsToDynamoFunction import app
 
 
 # run this unit test:
@@ -103,12 +103,175 @@ def cloudtrail_event():
 
 
 
-def test_lambda_handler(cloudtrail_event):
+@pytest.fixture()
+def cancel_event(cloudtrail_event):
+    """ Generates CloudTrail Cancel Reservation Event for the reservation created above"""
+
+    detail = cloudtrail_event["detail"]
+    reservation_id = detail["responseElements"]["CreateCapacityReservationResponse"]["capacityReservation"]["capacityReservationId"]
+    return {
+        **cloudtrail_event,
+        "detail": {
+            **detail,
+            "eventName": "CancelCapacityReservation",
+            "eventTime": "2023-01-29T01:34:46Z",
+            "requestParameters": {
+                "CancelCapacityReservationRequest": {"CapacityReservationId": reservation_id}
+            },
+            "responseElements": {
+                "CancelCapacityReservationResponse": {"return": True}
+            },
+        },
+    }
+
+
+@pytest.fixture(params=["resource", "client"])
+def handler_table(request, odcr_table, monkeypatch):
+    """ Points the handler at the moto table, through the resource or the client API"""
+
+    monkeypatch.setenv("dynamoTableName", odcr_table.name)
+    monkeypatch.setattr(app, "DYNAMO_API", request.param)
+    monkeypatch.setattr(app, "_table", None)
+    monkeypatch.setattr(app, "_client", None)
+    return odcr_table
+
+
+def test_lambda_handler(cloudtrail_event, cancel_event, handler_table):
 
     ret = app.lambda_handler(cloudtrail_event, "")
-    
-    data = json.loads(ret["body"])
 
     assert ret["statusCode"] == 200
-    assert "message" in ret["body"]
-    assert data["message"] == "hello world"
+    item = handler_table.get_item(Key={"capacityReservationId": "cr-0c1589281e48747cf"})["Item"]
+    assert item["endDate"] is None
+    assert item["ownerId"] == 570351108046
+    assert item["ebsOptimized"] is False
+    assert item["user_arn"] == cloudtrail_event["detail"]["userIdentity"]["arn"]
+    assert item["userKey"] == "arn:aws:sts::570351108046:assumed-role/cloud303-rnd/kloucks"
+    assert item["placementKey"] == "us-west-2a#t2.micro"
+    assert item["reservationState"] == "open"
+
+    ret = app.lambda_handler(cancel_event, "")
+
+    assert ret["statusCode"] == 200
+    item = handler_table.get_item(Key={"capacityReservationId": "cr-0c1589281e48747cf"})["Item"]
+    assert item["endDate"] == "2023-01-29T01:34:46Z"
+    assert item["reservationState"] == "closed"
+
+
+def test_lambda_handler_cancel_before_create(cloudtrail_event, cancel_event, handler_table):
+
+    app.lambda_handler(cancel_event, "")
+    app.lambda_handler(cloudtrail_event, "")
+
+    item = handler_table.get_item(Key={"capacityReservationId": "cr-0c1589281e48747cf"})["Item"]
+    assert item["endDate"] == "2023-01-29T01:34:46Z"
+    assert item["state"] == "active"
+
+
+def test_lambda_handler_reuses_clients(cloudtrail_event, handler_table):
+
+    app.lambda_handler(cloudtrail_event, "")
+    clients = (app._table, app._client)
+    app.lambda_handler(cloudtrail_event, "")
+
+    assert clients != (None, None)
+    assert (app._table, app._client) == clients
+
+
+def test_lambda_handler_rejects_other_events(cloudtrail_event):
+
+    cloudtrail_event["detail"]["responseElements"] = {}
+
+    ret = app.lambda_handler(cloudtrail_event, "")
+
+    assert ret["statusCode"] == 400
+
+
+def _with_reservation_id(event, reservation_id):
+    """ Copies a create event for another reservation"""
+
+    event = json.loads(json.dumps(event))
+    event["id"] = reservation_id
+    reservation = event["detail"]["responseElements"]["CreateCapacityReservationResponse"]["capacityReservation"]
+    reservation["capacityReservationId"] = reservation_id
+    return event
+
+
+def _sqs_batch(*events):
+    return {
+        "Records": [
+            {"messageId": f"msg-{i}", "body": json.dumps(event)}
+            for i, event in enumerate(events)
+        ]
+    }
+
+
+def test_batch_handler_coalesces_create_and_cancel(cloudtrail_event, cancel_event, handler_table):
+
+    other = _with_reservation_id(cloudtrail_event, "cr-0000000000000000a")
+
+    ret = app.batch_handler(_sqs_batch(cloudtrail_event, other, cancel_event), "")
+
+    assert ret == {"batchItemFailures": []}
+    item = handler_table.get_item(Key={"capacityReservationId": "cr-0c1589281e48747cf"})["Item"]
+    assert item["endDate"] == "2023-01-29T01:34:46Z"
+    assert item["ownerId"] == 570351108046
+    item = handler_table.get_item(Key={"capacityReservationId": "cr-0000000000000000a"})["Item"]
+    assert item["endDate"] is None
+
+
+def test_batch_handler_cancels_stored_reservation(cloudtrail_event, cancel_event, handler_table):
+
+    app.batch_handler([cloudtrail_event], "")
+    ret = app.batch_handler([cancel_event], "")
+
+    assert ret == {"batchItemFailures": []}
+    item = handler_table.get_item(Key={"capacityReservationId": "cr-0c1589281e48747cf"})["Item"]
+    assert item["endDate"] == "2023-01-29T01:34:46Z"
+    assert item["instanceType"] == "t2.micro"
+
+
+def test_batch_handler_merges_cancel_before_create(cloudtrail_event, cancel_event, handler_table):
+
+    other = _with_reservation_id(cloudtrail_event, "cr-0000000000000000a")
+
+    ret = app.batch_handler(_sqs_batch(other, cancel_event), "")
+    assert ret == {"batchItemFailures": []}
+    ret = app.batch_handler(_sqs_batch(cloudtrail_event), "")
+
+    assert ret == {"batchItemFailures": []}
+    item = handler_table.get_item(Key={"capacityReservationId": "cr-0c1589281e48747cf"})["Item"]
+    assert item["endDate"] == "2023-01-29T01:34:46Z"
+    assert item["instanceType"] == "t2.micro"
+
+
+def test_batch_handler_reports_unprocessed_items(cloudtrail_event, cancel_event, handler_table, monkeypatch):
+
+    class _UnprocessedClient:
+        def batch_write_item(self, RequestItems):
+            return {"UnprocessedItems": RequestItems}
+
+    monkeypatch.setattr(app, "get_batch_client", lambda: (_UnprocessedClient(), lambda item: item))
+    monkeypatch.setattr(app, "WRITE_BACKOFF_BASE", 0)
+
+    ret = app.batch_handler(_sqs_batch(cloudtrail_event, cancel_event), "")
+
+    assert ret == {"batchItemFailures": [{"itemIdentifier": "msg-0"}, {"itemIdentifier": "msg-1"}]}
+
+
+def test_batch_handler_reports_unreadable_records(cloudtrail_event, cancel_event, handler_table):
+
+    other = _with_reservation_id(cloudtrail_event, "cr-0000000000000000a")
+    missing_field = json.loads(json.dumps(other))
+    del missing_field["detail"]["responseElements"]["CreateCapacityReservationResponse"]["capacityReservation"]["instanceType"]
+    batch = _sqs_batch(cloudtrail_event, missing_field, cancel_event)
+    batch["Records"].append({"messageId": "msg-3", "body": "{not json"})
+
+    ret = app.batch_handler(batch, "")
+
+    assert sorted(ret["batchItemFailures"], key=lambda f: f["itemIdentifier"]) == [
+        {"itemIdentifier": "msg-1"}, {"itemIdentifier": "msg-3"},
+    ]
+    item = handler_table.get_item(Key={"capacityReservationId": "cr-0c1589281e48747cf"})["Item"]
+    assert item["endDate"] == "2023-01-29T01:34:46Z"
+    assert "Item" not in handler_table.get_item(Key={"capacityReservationId": "cr-0000000000000000a"})
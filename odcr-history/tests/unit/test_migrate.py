@@ -0,0 +1,49 @@
+from cloudtrailToDynamoFunction import app as backfill_app
+from odcrQueries import migrate, queries
+from tests.synthetic_events import USER_ARN, cancel_event, create_event, reservation_id
+
+
+# run this unit test:
+# python -m pytest tests/unit -v
+
+
+def _old_item(i, **attributes):
+    """An item as the functions wrote it before the derived keys"""
+    return {
+        "capacityReservationId": reservation_id(i),
+        "user_arn": create_event(i)["userIdentity"]["arn"],
+        "availabilityZone": "us-west-2a",
+        "instanceType": "t2.micro",
+        "startDate": create_event(i)["eventTime"],
+        "endDate": None,
+        "endDateType": "unlimited",
+        **attributes,
+    }
+
+
+def test_migrate_makes_old_items_queryable(odcr_table):
+    odcr_table.put_item(Item=_old_item(0))
+    odcr_table.put_item(Item=_old_item(1, endDate=cancel_event(1)["eventTime"]))
+    odcr_table.put_item(Item=_old_item(2, endDate=cancel_event(2)["eventTime"], endDateType="limited"))
+
+    assert migrate.migrate(odcr_table, page_size=2) == 3
+
+    assert len(list(queries.reservations_by_user(odcr_table, USER_ARN))) == 3
+    assert len(list(queries.reservations_by_placement(odcr_table, "us-west-2a", "t2.micro"))) == 3
+    states = {i["capacityReservationId"]: i["reservationState"] for i in odcr_table.scan()["Items"]}
+    assert states == {reservation_id(0): "open", reservation_id(1): "closed", reservation_id(2): "open"}
+
+
+def test_migrate_keeps_stored_keys_and_skips_the_checkpoint(odcr_table):
+    odcr_table.put_item(Item=_old_item(0, reservationState="closed"))
+    backfill_app.save_checkpoint(odcr_table, backfill_app.CREATE_EVENT, {"eventTime": cancel_event(0)["eventTime"]})
+    checkpoint = odcr_table.get_item(Key={"capacityReservationId": backfill_app.CHECKPOINT_ID})["Item"]
+
+    assert migrate.migrate(odcr_table) == 1
+    # nothing is left to fill in
+    assert migrate.migrate(odcr_table) == 0
+
+    item = odcr_table.get_item(Key={"capacityReservationId": reservation_id(0)})["Item"]
+    assert item["reservationState"] == "closed"
+    assert item["placementKey"] == "us-west-2a#t2.micro"
+    assert odcr_table.get_item(Key={"capacityReservationId": backfill_app.CHECKPOINT_ID})["Item"] == checkpoint
@@ -0,0 +1,78 @@
+import pytest
+
+from cloudtrailToDynamoFunction import app as backfill_app
+from odcrQueries import queries
+from tests.synthetic_events import USER_ARN, cancel_event, create_event, event_time, reservation_id
+
+
+@pytest.fixture()
+def history_table(odcr_table):
+    """ 6 reservations across 2 placements and 2 users, the first 2 cancelled and the
+    last one 'limited' and already expired"""
+
+    create_events = [
+        create_event(i, instance_type="t2.micro" if i % 2 else "m5.large")
+        for i in range(5)
+    ]
+    create_events.append(create_event(5, end_date=event_time(7200)))
+    create_events[4]["userIdentity"]["arn"] = "arn:aws:sts::570351108046:assumed-role/Other/someone"
+    cancel_index = backfill_app.index_cancel_events([cancel_event(0), cancel_event(1)])
+
+    backfill_app.write_history(odcr_table, backfill_app.build_history(create_events, cancel_index))
+    backfill_app.save_checkpoint(odcr_table, backfill_app.CREATE_EVENT, {"eventTime": event_time(10)})
+    return odcr_table
+
+
+def _ids(items):
+    return [item["capacityReservationId"] for item in items]
+
+
+def test_reservations_by_user_ignores_case(history_table):
+
+    items = queries.reservations_by_user(history_table, USER_ARN.upper())
+
+    assert _ids(items) == [reservation_id(i) for i in (0, 1, 2, 3, 5)]
+
+
+def test_reservations_by_placement(history_table):
+
+    items = queries.reservations_by_placement(history_table, "us-west-2a", "t2.micro")
+
+    assert _ids(items) == [reservation_id(i) for i in (1, 3, 5)]
+
+
+def test_reservations_by_state_and_start_date(history_table):
+
+    closed = queries.reservations_by_state(history_table, queries.CLOSED)
+    open_ = queries.reservations_by_state(history_table, queries.OPEN, start=event_time(3), end=event_time(4))
+
+    assert _ids(closed) == [reservation_id(0), reservation_id(1)]
+    assert _ids(open_) == [reservation_id(3), reservation_id(4)]
+
+
+def test_open_reservations_skip_expired_limited(history_table):
+
+    items = queries.open_reservations(history_table, now=event_time(86400))
+
+    assert _ids(items) == [reservation_id(i) for i in (2, 3, 4)]
+
+
+def test_query_index_pages_lazily(history_table, monkeypatch):
+
+    calls = []
+    query = history_table.query
+    monkeypatch.setattr(history_table, "query", lambda **kwargs: calls.append(kwargs) or query(**kwargs))
+
+    items = queries.reservations_by_user(history_table, USER_ARN, page_size=2)
+    assert _ids([next(items), next(items)]) == [reservation_id(0), reservation_id(1)]
+    assert len(calls) == 1
+
+    assert len(list(items)) == 3
+    assert all(call["IndexName"] == "byUser" and call["Limit"] == 2 for call in calls)
+    assert "ExclusiveStartKey" in calls[-1]
+
+
+def test_reservations_by_state_rejects_unknown_state(history_table):
+
+    with pytest.raises(ValueError):
+        queries.reservations_by_state(history_table, "active")
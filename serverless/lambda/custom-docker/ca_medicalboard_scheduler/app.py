@@ -1,26 +1,76 @@
 import ftplib
-import re
+import hashlib
+import json
 import datetime
+import tempfile
+import zlib
 from pathlib import Path
 import zipfile
 import os
 import shutil
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import logging
+from s3_stream import MultipartUploadWriter, open_s3_object, DEFAULT_PART_SIZE, MIN_PART_SIZE
+from providers import load_providers
 
 dynamodb = boto3.client('dynamodb')
 table_name = os.environ['DATASET_INFO_TABLE']
 bucket_name = os.environ['DATA_BUCKET']
-ftp_pass_key_param = os.environ['FTP_PASS_KEY_PARAM']
-ftp_address = os.environ['FTP_ADDRESS']
-FTP_USER = "PoLYviEW3"
+
+# The medical boards a run ingests (see providers.py), up to PROVIDER_WORKERS of them at once, each over its own FTP
+# connection and in its own /tmp/<provider>/ directory. The helpers below default to the first provider
+PROVIDERS = load_providers()
+DEFAULT_PROVIDER = PROVIDERS[0]
+PROVIDER_WORKERS = int(os.environ.get('PROVIDER_WORKERS', 0)) or min(len(PROVIDERS), 4)
+
+# 'tmp' downloads the zip to /tmp before extracting it. 's3' streams it into the provider's ARCHIVE_FOLDER in the
+# bucket as it downloads and extracts it from there, so /tmp only holds the extracted dataset
+ARCHIVE_MODE = os.environ.get('ARCHIVE_MODE', 'tmp')
+ARCHIVE_PART_SIZE = int(os.environ.get('ARCHIVE_PART_SIZE', DEFAULT_PART_SIZE))
+ARCHIVE_FOLDER = "Archive/"
+
+# CSV files uploaded at once, each of them in multipart chunks of UPLOAD_CHUNK_SIZE over up to UPLOAD_CONCURRENCY
+# connections once it is bigger than UPLOAD_THRESHOLD
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 8))
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=int(os.environ.get('UPLOAD_THRESHOLD', 16 * 1024 * 1024)),
+    multipart_chunksize=int(os.environ.get('UPLOAD_CHUNK_SIZE', 16 * 1024 * 1024)),
+    max_concurrency=int(os.environ.get('UPLOAD_CONCURRENCY', 4)),
+)
+
+# Shared by every upload of every provider, with a connection for each of their threads
+s3 = boto3.client('s3', config=Config(max_pool_connections=PROVIDER_WORKERS * UPLOAD_WORKERS * TRANSFER_CONFIG.max_concurrency))
+
+# mdb-export processes run at once, one per CPU unless EXPORT_WORKERS is set
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 0)) or os.cpu_count() or 1
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
+# 'csv' exports the tables to CSV files in /tmp and uploads them. 'stream' pipes each mdb-export straight into a
+# multipart upload, compressed with OUTPUT_COMPRESSION ('none', 'gzip' or 'zstd'), so the tables never touch the disk.
+# A table of the previous dataset is exported once more first, to hash it and only upload it if it changed
+OUTPUT_MODE = os.environ.get('OUTPUT_MODE', 'csv')
+OUTPUT_COMPRESSION = os.environ.get('OUTPUT_COMPRESSION', 'none')
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+# Each streamed table buffers up to 3 parts, times EXPORT_WORKERS tables
+STREAM_PART_SIZE = int(os.environ.get('STREAM_PART_SIZE', MIN_PART_SIZE))
+
+# 'csv', 'parquet' or 'both': what OUTPUT_MODE csv uploads. Parquet (zstd) goes to the provider's PARQUET_FOLDER<table>/
+# datasetDate=YYYY-MM-DD/, a full snapshot of every table per dataset date for Athena and Glue
+OUTPUT_FORMAT = os.environ.get('OUTPUT_FORMAT', 'csv')
+PARQUET_FOLDER = "Parquet/"
+
+# The manifest of each dataset: the SHA-256 of every table and which of them changed since the previous dataset
+MANIFEST_FOLDER = "Manifests/"
 
 
 ssm_client = boto3.client('ssm')
-response = ssm_client.get_parameter(Name=ftp_pass_key_param, WithDecryption=True)
-FTP_PASS = response['Parameter']['Value']
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
@@ -28,15 +78,57 @@ logger.setLevel(logging.INFO)
 
 
 def handler(event, context):
-    directory = 'MBC'
     local_save_path = '/tmp/'
-    dataset_updated = download_latest_zip(ftp_address, directory, local_save_path)
+    dataset_updated = ingest_providers(PROVIDERS, local_save_path)
     return {
         'statusCode': 200,
         'body': 'Success',
         'datasetUpdated': dataset_updated
     }
 
+
+class IngestError(Exception):
+    """
+    Raised once every provider was attempted when some of them failed to ingest
+    """
+
+    def __init__(self, failures, results):
+        self.failures = failures
+        self.results = results
+        super().__init__(f"{len(failures)} provider(s) failed to ingest: " + "; ".join(f"'{name}': {reason}" for name, reason in failures.items()))
+
+
+def ingest_providers(providers, local_save_path, workers=None):
+    """
+    Downloads and publishes the latest dataset of every provider, up to workers (PROVIDER_WORKERS)
+    at once, each in <local_save_path>/<provider>/. A provider failing doesn't stop the others.
+    Returns {provider: what download_latest_zip returned}, or raises IngestError once every provider was attempted
+    """
+    start = time.perf_counter()
+    failures = {}
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers or PROVIDER_WORKERS) as executor:
+        futures = {executor.submit(download_latest_zip, provider, os.path.join(local_save_path, provider.name)): provider for provider in providers}
+        for future in as_completed(futures):
+            provider = futures[future]
+            try:
+                results[provider.name] = future.result()
+            except Exception as e:
+                logger.exception(f"{provider.name}: couldn't ingest the dataset")
+                failures[provider.name] = f"{type(e).__name__}: {e}"
+
+    logger.info(f"Ingested {len(results)}/{len(providers)} providers in {time.perf_counter() - start:.2f}s: {results}")
+    if failures:
+        raise IngestError(failures, results)
+    return results
+
+
+@lru_cache(maxsize=None)
+def get_ftp_password(param):
+    response = ssm_client.get_parameter(Name=param, WithDecryption=True)
+    return response['Parameter']['Value']
+
+
 def check_ftp_file_exists(ftp, filename):
     """
     Check if a file exists in the FTP server.
@@ -47,81 +139,274 @@ def check_ftp_file_exists(ftp, filename):
     except ftplib.error_perm:
         return False
     
-def generate_filename(date):
-    return f"MBCPhysicianAndSurgeonInformation-PUBLIC-{date.strftime('%Y%m%d')}.zip"
+def generate_filename(date, provider=None):
+    return (provider or DEFAULT_PROVIDER).generate_filename(date)
+
+
+def list_directory(ftp):
+    """
+    Names of the files in the FTP working directory, from MLSD or else NLST.
+    Returns None when the server refuses both.
+    """
+    try:
+        return [name for name, facts in ftp.mlsd(facts=['type']) if facts.get('type', 'file') == 'file']
+    except ftplib.error_perm as e:
+        logger.info(f"MLSD refused ({e}), trying NLST")
+    try:
+        return ftp.nlst()
+    except ftplib.error_perm as e:
+        logger.info(f"NLST refused ({e}), probing each day instead")
+        return None
+
+
+def find_latest_file(ftp, days_limit=30, last_downloaded_file="", provider=None):
+    """
+    Name of the provider's newest dataset zip of the last days_limit days, None if there's none.
+    One directory listing when the server allows it, otherwise a SIZE per day going back
+    from today, stopping at last_downloaded_file.
+    """
+    provider = provider or DEFAULT_PROVIDER
+    names = list_directory(ftp)
+    if names is None:
+        return probe_latest_file(ftp, days_limit, last_downloaded_file, provider)
+
+    oldest = (datetime.date.today() - datetime.timedelta(days=days_limit)).strftime('%Y%m%d')
+    latest_date, latest = oldest, None
+    for name in names:
+        dataset_date = provider.dataset_date(name)
+        if dataset_date and dataset_date >= latest_date:
+            latest_date, latest = dataset_date, name
+    return latest
+
+
+def probe_latest_file(ftp, days_limit=30, last_downloaded_file="", provider=None):
+    # Servers may refuse SIZE in ASCII mode
+    ftp.voidcmd('TYPE I')
+
+    date = datetime.date.today()
+    end_date = date - datetime.timedelta(days=days_limit)
+
+    while date >= end_date:
+        filename = generate_filename(date, provider)
+        # Nothing older than the file we downloaded previously is needed
+        if filename == last_downloaded_file or check_ftp_file_exists(ftp, filename):
+            return filename
+        date -= datetime.timedelta(days=1)
+    return None
+
+
+def is_downloaded(filename, last_downloaded_file, provider=None):
+    """
+    Whether filename is the file downloaded previously, or older than it
+    """
+    provider = provider or DEFAULT_PROVIDER
+    last = provider.dataset_date(last_downloaded_file)
+    return filename == last_downloaded_file or (last is not None and provider.dataset_date(filename) < last)
 
 
-def download_latest_zip(ftp_address, directory, local_save_path, days_limit=30):
+def download_latest_zip(provider, local_save_path):
+    """
+    Downloads the provider's latest dataset to local_save_path and publishes its tables, over a
+    connection of its own. Returns None without a dataset in the provider's days_limit, False when
+    it was already downloaded, True once published
+    """
     # Check DynamoDB for the last file that was downloaded
-    item = get_last_downloaded_file(provider="California")
+    item = get_last_downloaded_file(provider=provider.name)
     last_downloaded_file = ""
     if item:
         last_downloaded_file = item['file']['S']
-    
-    with ftplib.FTP(ftp_address) as ftp:
-        ftp.login(user=FTP_USER, passwd=FTP_PASS)
-        ftp.cwd(directory)
-
-        date = datetime.date.today()
-        end_date = date - datetime.timedelta(days=days_limit)
-
-        while date >= end_date:
-            filename = generate_filename(date)
-
-            # Check if the filename matches the most recent file we downloaded previously
-            if filename == last_downloaded_file:
-                logger.info("The most recent data has already been downloaded. S3 contains the lastest data!")
-                return False
-
-            if check_ftp_file_exists(ftp, filename):
-                logger.info(f"Found the latest data: {filename}")
-                tmp_file_path = Path(local_save_path) / filename
-                with open(tmp_file_path, 'wb') as f:
-                    ftp.retrbinary(f'RETR {filename}', f.write)
-                logger.info(f"Downloaded {filename} to {tmp_file_path}")
-
-                # Unzip the Dataset
-                extracted_path = Path(tmp_file_path.parent, "extracted")
-                with zipfile.ZipFile(tmp_file_path, 'r') as zip_ref:
-                    zip_ref.extractall(extracted_path)
-                    logger.info(f"Extracted dataset zip file to: {extracted_path}")
-
-                # Export the accdb file to .csv files
-                accdb_file_path = find_accdb_file(extracted_path)
-                if accdb_file_path:
-                    logger.info(f".accdb file found in path: {accdb_file_path}")
-                    accdb_convert_to_csv(accdb_file_path)
-                else:
-                    raise FileNotFoundError("No .accdb file found in the extracted data.")
-
-                # Upload the CSV files to S3
-                output_dir = Path(accdb_file_path).parent / (Path(accdb_file_path).stem + '_csv')
-                for csv_file in os.listdir(output_dir):
-                    if csv_file.startswith("REF_"):
-                        # Upload the REF_ files to the REFS folder 
-                        upload_to_s3(bucket_name, f"MedicalBoards/California/REFS/{csv_file}", str(output_dir / csv_file))
-                        logger.info(f"Uploaded REF file: {csv_file} to S3 path: {bucket_name}/MedicalBoards/California/REFS/{csv_file}")
-                    else:
-                        # Upload the non REF_ files to the Dataset folder
-                        upload_to_s3(bucket_name, f"MedicalBoards/California/Dataset/{csv_file}", str(output_dir / csv_file))
-                        logger.info(f"Uploaded Dataset file: {csv_file} to S3 path: {bucket_name}/MedicalBoards/California/Dataset/{csv_file}")
-
-                # Write to DynamoDB the latest file that was downloaded
-                update_last_downloaded_file(provider="California", filename=filename)
-                
-                # Remove /tmp/extracted and /tmp/MBCPhysicianAndSurgeonInformation-PUBLIC-<date>.zip
-                shutil.rmtree(extracted_path)
-                os.remove(tmp_file_path)
-
-                return True
-            date -= datetime.timedelta(days=1)
-
-        logger.info("No ZIP files found within the specified date range.")
+
+    with provider.connect(get_ftp_password(provider.ftp_pass_param)) as ftp:
+        filename = find_latest_file(ftp, provider.days_limit, last_downloaded_file, provider)
+        if filename is None:
+            logger.info(f"{provider.name}: No ZIP files found within the specified date range.")
+            return None
+
+        # Check if the filename matches the most recent file we downloaded previously
+        if is_downloaded(filename, last_downloaded_file, provider):
+            logger.info(f"{provider.name}: The most recent data has already been downloaded. S3 contains the lastest data!")
+            return False
+
+        logger.info(f"{provider.name}: Found the latest data: {filename}")
+        os.makedirs(local_save_path, exist_ok=True)
+        extracted_path = Path(local_save_path, "extracted")
+        if ARCHIVE_MODE == 's3':
+            archive_key = provider.key(f"{ARCHIVE_FOLDER}{filename}")
+            stream_to_s3(ftp, filename, s3, bucket_name, archive_key)
+            archive = open_s3_object(s3, bucket_name, archive_key)
+            tmp_file_path = None
+        else:
+            tmp_file_path = Path(local_save_path) / filename
+            with open(tmp_file_path, 'wb') as f:
+                ftp.retrbinary(f'RETR {filename}', f.write)
+            logger.info(f"{provider.name}: Downloaded {filename} to {tmp_file_path}")
+            archive = tmp_file_path
+
+        # Unzip the Dataset
+        with zipfile.ZipFile(archive, 'r') as zip_ref:
+            zip_ref.extractall(extracted_path)
+            logger.info(f"{provider.name}: Extracted dataset zip file to: {extracted_path}")
+
+        # Export the accdb file to .csv files
+        accdb_file_path = find_accdb_file(extracted_path)
+        if accdb_file_path:
+            logger.info(f"{provider.name}: .accdb file found in path: {accdb_file_path}")
+        else:
+            raise FileNotFoundError(f"{provider.name}: No .accdb file found in the extracted data.")
+
+        if OUTPUT_MODE == 'stream':
+            if OUTPUT_FORMAT != 'csv':
+                logger.warning(f"OUTPUT_FORMAT {OUTPUT_FORMAT} needs OUTPUT_MODE csv, streaming CSV only")
+            # A table is only unchanged if it was streamed to the same key, with the same compression
+            previous_hashes = get_table_hashes(item, lambda table: stream_s3_key(table, OUTPUT_COMPRESSION, provider))
+            hashes, keys = accdb_stream_to_s3(accdb_file_path, previous_hashes, OUTPUT_COMPRESSION, provider=provider)
+            write_manifest(filename, hashes, previous_hashes, keys, provider=provider)
+        else:
+            parquet_dir = None
+            if OUTPUT_FORMAT != 'csv':
+                parquet_dir = Path(accdb_file_path).parent / (Path(accdb_file_path).stem + '_parquet')
+            # Parquet is uploaded whole for every dataset date, the CSV files only when they changed
+            previous_hashes = get_table_hashes(item, None if OUTPUT_FORMAT == 'parquet' else lambda table: csv_s3_key(f"{table}.csv", provider))
+            output_dir, hashes = accdb_convert_to_csv(accdb_file_path, parquet_dir=parquet_dir)
+            # Upload the files of the tables that changed to S3
+            manifest = publish_dataset(filename, output_dir, hashes, previous_hashes, OUTPUT_FORMAT, parquet_dir, provider)
+            keys = {table: entry['key'] for table, entry in manifest['tables'].items() if 'key' in entry}
+
+        # Write to DynamoDB the latest file that was downloaded, and the object each table's CSV is in
+        update_last_downloaded_file(provider=provider.name, filename=filename, table_hashes=hashes, table_keys=keys)
+
+        # Remove /tmp/<provider>/extracted and /tmp/<provider>/<dataset>.zip
+        shutil.rmtree(extracted_path)
+        if tmp_file_path is not None:
+            os.remove(tmp_file_path)
+
+        return True
+
+
+def stream_to_s3(ftp, filename, s3, bucket, key, part_size=None):
+    """
+    Downloads filename from the FTP server straight into an S3 multipart upload, holding
+    a few parts in memory at most. Returns the SHA-256 hex digest of the file.
+    """
+    with MultipartUploadWriter(s3, bucket, key, part_size or ARCHIVE_PART_SIZE) as writer:
+        ftp.retrbinary(f'RETR {filename}', writer.write, blocksize=64 * 1024)
+        return writer.close()
 
 
 def upload_to_s3(bucket_name, s3_path, local_file):
-    s3 = boto3.client('s3')
-    s3.upload_file(local_file, bucket_name, s3_path)
+    s3.upload_file(local_file, bucket_name, s3_path, Config=TRANSFER_CONFIG)
+
+
+def csv_s3_key(csv_file, provider=None):
+    provider = provider or DEFAULT_PROVIDER
+    # The REF_ files go to the REFS folder, the others to the Dataset folder
+    if csv_file.startswith("REF_"):
+        return provider.key(f"REFS/{csv_file}")
+    return provider.key(f"Dataset/{csv_file}")
+
+
+def stream_s3_key(table, compression='none', provider=None):
+    return csv_s3_key(f"{table}.csv", provider) + COMPRESSION_SUFFIXES[compression]
+
+
+def publish_dataset(filename, output_dir, hashes, previous_hashes, output_format='csv', parquet_dir=None, provider=None):
+    """
+    Uploads the CSV files of the tables whose hash differs from previous_hashes and/or, for
+    output_format 'parquet' or 'both', the Parquet files of every table to the partition of
+    the dataset date. Writes the dataset's manifest and returns it
+    """
+    provider = provider or DEFAULT_PROVIDER
+    changed = changed_tables(hashes, previous_hashes)
+    logger.info(f"{provider.name}: {len(changed)}/{len(hashes)} tables changed since the previous dataset: {changed}")
+
+    keys = {}
+    if output_format in ('csv', 'both'):
+        upload_csv_files(output_dir, [f"{table}.csv" for table in changed], provider=provider)
+        keys = {table: csv_s3_key(f"{table}.csv", provider) for table in hashes}
+
+    parquet_keys = {}
+    if output_format in ('parquet', 'both'):
+        dataset_date = datetime.datetime.strptime(provider.dataset_date(filename), '%Y%m%d').date()
+        parquet_keys = {table: parquet_s3_key(table, dataset_date, provider) for table in hashes}
+        upload_files({os.path.join(parquet_dir, f"{table}.parquet"): key for table, key in parquet_keys.items()})
+
+    return write_manifest(filename, hashes, previous_hashes, keys, parquet_keys, provider)
+
+
+def parquet_s3_key(table, dataset_date, provider=None):
+    return (provider or DEFAULT_PROVIDER).key(f"{PARQUET_FOLDER}{table}/datasetDate={dataset_date.isoformat()}/{table}.parquet")
+
+
+def changed_tables(hashes, previous_hashes):
+    """
+    The tables whose hash isn't the one in previous_hashes, a previous hash of None being a table to upload again
+    """
+    return sorted(table for table, sha256 in hashes.items() if previous_hashes.get(table) != sha256)
+
+
+def write_manifest(filename, hashes, previous_hashes, keys, parquet_keys=None, provider=None):
+    """
+    Writes the manifest of the dataset to the provider's MANIFEST_FOLDER: every table's hash and S3 keys,
+    and the tables changed or removed since the previous dataset. Returns the manifest
+    """
+    changed = changed_tables(hashes, previous_hashes)
+    parquet_keys = parquet_keys or {}
+    tables = {}
+    for table, sha256 in sorted(hashes.items()):
+        tables[table] = {'sha256': sha256, 'changed': table in changed}
+        if table in keys:
+            tables[table]['key'] = keys[table]
+        if table in parquet_keys:
+            tables[table]['parquetKey'] = parquet_keys[table]
+    manifest = {
+        'dataset': filename,
+        'changedTables': changed,
+        'removedTables': sorted(set(previous_hashes) - set(hashes)),
+        'tables': tables,
+    }
+    manifest_key = (provider or DEFAULT_PROVIDER).key(f"{MANIFEST_FOLDER}{Path(filename).stem}.json")
+    s3.put_object(Bucket=bucket_name, Key=manifest_key, Body=json.dumps(manifest, indent=2).encode(), ContentType='application/json')
+    logger.info(f"Wrote the dataset manifest to S3 path: {bucket_name}/{manifest_key}")
+    return manifest
+
+
+def upload_csv_files(output_dir, csv_files=None, workers=None, provider=None):
+    """
+    Uploads csv_files (every CSV file) of output_dir to the provider's folders of the bucket, up to
+    workers (UPLOAD_WORKERS) at once. Returns {s3 key: seconds the upload took}
+    """
+    if csv_files is None:
+        csv_files = os.listdir(output_dir)
+    return upload_files({os.path.join(output_dir, csv_file): csv_s3_key(csv_file, provider) for csv_file in csv_files}, workers)
+
+
+def upload_files(files, workers=None):
+    """
+    Uploads {local file: s3 key} to the bucket, up to workers (UPLOAD_WORKERS) at once.
+    Returns {s3 key: seconds the upload took}
+    """
+    start = time.perf_counter()
+    timings = {}
+    total_bytes = 0
+
+    def upload(local_file, key):
+        file_start = time.perf_counter()
+        upload_to_s3(bucket_name, key, local_file)
+        return os.path.getsize(local_file), time.perf_counter() - file_start
+
+    with ThreadPoolExecutor(max_workers=workers or UPLOAD_WORKERS) as executor:
+        futures = {executor.submit(upload, local_file, key): key for local_file, key in files.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            size, seconds = future.result()
+            timings[key] = seconds
+            total_bytes += size
+            logger.info(f"Uploaded {size} bytes to S3 path: {bucket_name}/{key} in {seconds:.2f}s ({size / 1024 / 1024 / max(seconds, 1e-6):.1f} MiB/s)")
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Uploaded {len(timings)} files, {total_bytes} bytes in {elapsed:.2f}s ({total_bytes / 1024 / 1024 / max(elapsed, 1e-6):.1f} MiB/s)")
+    return timings
+
 
 def find_accdb_file(directory):
     for root, dirs, files in os.walk(directory):
@@ -131,7 +416,23 @@ def find_accdb_file(directory):
     return None
 
 
-def accdb_convert_to_csv(accdb_file_path):
+class ExportError(Exception):
+    """
+    Raised once every table was attempted when some of them failed to export
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(f"{len(failures)} table(s) failed to export: " + "; ".join(f"'{table}': {reason}" for table, reason in failures.items()))
+
+
+def accdb_convert_to_csv(accdb_file_path, workers=None, parquet_dir=None):
+    """
+    Exports every table of the Access database to <database>_csv/<table>.csv, running up to
+    workers (EXPORT_WORKERS) mdb-export processes at once. With parquet_dir, each table is also
+    converted to <parquet_dir>/<table>.parquet once exported.
+    Returns (output directory, {table: SHA-256 hex digest of its CSV})
+    """
     # Extract file name and directory from the provided path
     file_name = os.path.basename(accdb_file_path)
     file_path = os.path.dirname(accdb_file_path)
@@ -142,17 +443,152 @@ def accdb_convert_to_csv(accdb_file_path):
     # Create the output directory
     os.makedirs(output_dir, exist_ok=True)
     
-    # Get the list of table names
-    result = subprocess.run(["mdb-tables", "-1", accdb_file_path], capture_output=True, text=True)
-    tables = result.stdout.splitlines()
-    
-    # Loop through each table and export it to CSV
-    for table in tables:
-        logger.info(f"Extracting Microsoft Access Table: '{table}' to CSV")
-        csv_file_path = os.path.join(output_dir, f"{table}.csv")
-        
-        with open(csv_file_path, "w") as csv_file:
-            subprocess.run(["mdb-export", accdb_file_path, table], stdout=csv_file)
+    if parquet_dir is not None:
+        # Imported when used, pyarrow makes the cold start of the CSV modes slower
+        import parquet_output
+        os.makedirs(parquet_dir, exist_ok=True)
+
+    def export(table):
+        csv_file_path, sha256 = export_table(accdb_file_path, table, output_dir)
+        if parquet_dir is not None:
+            start = time.perf_counter()
+            rows = parquet_output.csv_to_parquet(csv_file_path, os.path.join(parquet_dir, f"{table}.parquet"))
+            logger.info(f"Converted '{table}' ({rows} rows) to Parquet in {time.perf_counter() - start:.2f}s")
+        return csv_file_path, sha256
+
+    results = export_tables(list_tables(accdb_file_path), export, workers)
+    return output_dir, {table: sha256 for table, (_, sha256) in results.items()}
+
+
+def accdb_stream_to_s3(accdb_file_path, previous_hashes=None, compression='none', workers=None, provider=None):
+    """
+    Streams every table of the Access database to its S3 key in the provider's folders, with the compression's suffix,
+    running up to workers (EXPORT_WORKERS) mdb-export processes at once. The tables whose hash
+    is in previous_hashes are left as they are in S3.
+    Returns ({table: SHA-256 hex digest of its CSV}, {table: S3 key})
+    """
+    previous_hashes = previous_hashes or {}
+    results = export_tables(
+        list_tables(accdb_file_path),
+        lambda table: stream_table(accdb_file_path, table, previous_hashes.get(table), compression, provider),
+        workers
+    )
+    return {table: sha256 for table, (_, sha256) in results.items()}, {table: key for table, (key, _) in results.items()}
+
+
+def list_tables(accdb_file_path):
+    result = subprocess.run(["mdb-tables", "-1", accdb_file_path], capture_output=True, text=True, check=True)
+    return result.stdout.splitlines()
+
+
+def export_tables(tables, export, workers=None):
+    """
+    Calls export(table) for every table, up to workers (EXPORT_WORKERS) at once.
+    Returns {table: what export returned}, or raises ExportError once every table was attempted
+    """
+    start = time.perf_counter()
+    failures = {}
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers or EXPORT_WORKERS) as executor:
+        futures = {executor.submit(export, table): table for table in tables}
+        for future in as_completed(futures):
+            table = futures[future]
+            try:
+                results[table] = future.result()
+            except subprocess.CalledProcessError as e:
+                failures[table] = f"mdb-export exited with {e.returncode}: {(e.stderr or '').strip()}"
+            except (OSError, ClientError, ValueError) as e:
+                # ValueError includes pyarrow's ArrowInvalid
+                failures[table] = str(e)
+
+    logger.info(f"Exported {len(results)}/{len(tables)} tables in {time.perf_counter() - start:.2f}s")
+    if failures:
+        raise ExportError(failures)
+    return results
+
+
+def export_table(accdb_file_path, table, output_dir):
+    """
+    Exports one table to <output_dir>/<table>.csv. Returns (csv file path, SHA-256 hex digest)
+    """
+    logger.info(f"Extracting Microsoft Access Table: '{table}' to CSV")
+    csv_file_path = os.path.join(output_dir, f"{table}.csv")
+    start = time.perf_counter()
+
+    with open(csv_file_path, "wb") as csv_file:
+        sha256 = run_mdb_export(accdb_file_path, table, csv_file.write)
+
+    logger.info(f"Extracted '{table}' ({os.path.getsize(csv_file_path)} bytes) in {time.perf_counter() - start:.2f}s")
+    return csv_file_path, sha256
+
+
+def stream_table(accdb_file_path, table, previous_hash=None, compression='none', provider=None):
+    """
+    Pipes one table through the compressor into a multipart upload to its S3 key. With previous_hash,
+    a first mdb-export only hashes the CSV and the table is left as it is in S3 when it hashes to
+    previous_hash: an unchanged table costs an export but no transfer, a changed one two exports.
+    Returns (S3 key, SHA-256 hex digest of the CSV)
+    """
+    key = stream_s3_key(table, compression, provider)
+    start = time.perf_counter()
+
+    if previous_hash is not None:
+        sha256 = run_mdb_export(accdb_file_path, table, lambda chunk: None)
+        if sha256 == previous_hash:
+            logger.info(f"'{table}' hasn't changed, kept S3 path: {bucket_name}/{key}")
+            return key, sha256
+
+    compressor = get_compressor(compression)
+    with MultipartUploadWriter(s3, bucket_name, key, STREAM_PART_SIZE) as writer:
+        if compressor is None:
+            sha256 = run_mdb_export(accdb_file_path, table, writer.write)
+        else:
+            sha256 = run_mdb_export(accdb_file_path, table, lambda chunk: writer.write(compressor.compress(chunk)))
+            writer.write(compressor.flush())
+
+    logger.info(f"Streamed '{table}' to S3 path: {bucket_name}/{key} ({writer.bytes_written} bytes) in {time.perf_counter() - start:.2f}s")
+    return key, sha256
+
+
+def get_compressor(compression):
+    """
+    An object with compress(data) and flush() for the compression, None for 'none'
+    """
+    if compression == 'gzip':
+        # wbits 31: a gzip member, what .gz readers expect
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if compression == 'zstd':
+        # Imported when used, the other modes don't need it
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    if compression == 'none':
+        return None
+    raise ValueError(f"Unknown compression '{compression}', expected one of {list(COMPRESSION_SUFFIXES)}")
+
+
+def run_mdb_export(accdb_file_path, table, write):
+    """
+    Runs mdb-export for one table, passing its output to write in chunks as it comes.
+    Returns the SHA-256 hex digest of the output. Raises CalledProcessError if mdb-export fails
+    """
+    sha256 = hashlib.sha256()
+    # stderr goes to a file so a chatty mdb-export can't block on a full pipe while stdout is read
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(["mdb-export", accdb_file_path, table], stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            with process.stdout:
+                for chunk in iter(lambda: process.stdout.read(EXPORT_CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+                    write(chunk)
+        except BaseException:
+            # The output couldn't be written, don't leave mdb-export running
+            process.kill()
+            process.wait()
+            raise
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(process.returncode, process.args, stderr=stderr.read().decode(errors='replace'))
+    return sha256.hexdigest()
 
 # Grab last url that was used to pull data from Dynamo
 def get_last_downloaded_file(provider):
@@ -170,23 +606,56 @@ def get_last_downloaded_file(provider):
         logger.error(f"An error occurred: couldn't find dynamodb record for {provider}, {e.response['Error']['Message']}")
         return None
     
-def update_last_downloaded_file(provider, filename):
+def get_table_hashes(item, key=None):
+    """
+    {table: SHA-256} of the dataset recorded in the provider's item, {} without one.
+
+    With key, a function returning the S3 key a table is uploaded to by this run, the hash of a table
+    whose CSV wasn't recorded in that object (another compression, OUTPUT_FORMAT parquet) is None:
+    the object doesn't have the table's content yet
+    """
+    if not item:
+        return {}
+    hashes = {}
+    for table, value in item.get('tableHashes', {}).get('M', {}).items():
+        # Items written before the keys were recorded have the hash alone
+        recorded = value['M'] if 'M' in value else {'sha256': value}
+        if key is not None and recorded.get('key', {}).get('S') != key(table):
+            hashes[table] = None
+        else:
+            hashes[table] = recorded['sha256']['S']
+    return hashes
+
+
+def update_last_downloaded_file(provider, filename, table_hashes=None, table_keys=None):
+    """
+    Records filename as the provider's last downloaded dataset, with the hash of each of its tables
+    and, from table_keys, the S3 key its CSV was uploaded to
+    """
+    table_keys = table_keys or {}
     try:
+        update_expression = "SET #file = :file"
+        names = {'#file': "file"}
+        values = {':file': {"S": filename}}
+        if table_hashes is not None:
+            update_expression += ", #tableHashes = :tableHashes"
+            names['#tableHashes'] = "tableHashes"
+            tables = {}
+            for table, sha256 in table_hashes.items():
+                tables[table] = {"M": {"sha256": {"S": sha256}}}
+                if table in table_keys:
+                    tables[table]["M"]["key"] = {"S": table_keys[table]}
+            values[':tableHashes'] = {"M": tables}
+
         response = dynamodb.update_item(
             TableName=table_name,
             Key={'provider': {'S': provider}},
-            UpdateExpression="SET #file = :file",
-            ExpressionAttributeNames={
-                '#file': "file"
-            },
-            ExpressionAttributeValues={
-                ':file': {"S": filename},
-            },
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
         )
         logger.info(f"Updated DynamoDB provider record: '{provider}' with file: {filename}")
         return response
     except ClientError as e:
         logger.error(f"Couldn't update last url used: {e.response['Error']['Message']}")
         return None
-
-
@@ -0,0 +1,64 @@
+import logging
+import re
+
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+logger = logging.getLogger()
+
+# Rows are read, typed and written in blocks of this many bytes of CSV
+BLOCK_SIZE = 16 * 1024 * 1024
+# mdb-export writes dates as 01/02/24 00:00:00 unless told otherwise
+TIMESTAMP_PARSERS = ["%m/%d/%y %H:%M:%S", pv.ISO8601]
+
+_COLUMN_ERROR = re.compile(r"CSV column #(\d+)")
+
+
+class _ColumnTypeError(Exception):
+
+    def __init__(self, column):
+        self.column = column
+        super().__init__(column)
+
+
+def csv_to_parquet(csv_path, parquet_path, compression='zstd', block_size=BLOCK_SIZE):
+    """
+    Converts an mdb-export CSV to Parquet one block at a time. The column types are inferred
+    from the first block. When a later block doesn't fit them the column is read as a string
+    instead, and the conversion starts over. Returns the number of rows
+    """
+    column_types = {}
+    while True:
+        try:
+            return _convert(csv_path, parquet_path, column_types, compression, block_size)
+        except _ColumnTypeError as e:
+            if e.column in column_types:
+                raise
+            logger.info(f"Column '{e.column}' of {csv_path} doesn't fit its inferred type, reading it as a string")
+            column_types[e.column] = pa.string()
+
+
+def _convert(csv_path, parquet_path, column_types, compression, block_size):
+    reader = pv.open_csv(
+        csv_path,
+        read_options=pv.ReadOptions(block_size=block_size),
+        convert_options=pv.ConvertOptions(column_types=column_types, timestamp_parsers=TIMESTAMP_PARSERS, strings_can_be_null=True),
+    )
+    # A column empty in the first block has no type to infer
+    schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in reader.schema])
+    rows = 0
+    with pq.ParquetWriter(parquet_path, schema, compression=compression) as writer:
+        while True:
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                break
+            except pa.ArrowInvalid as e:
+                match = _COLUMN_ERROR.search(str(e))
+                if match is None:
+                    raise
+                raise _ColumnTypeError(reader.schema.names[int(match.group(1))]) from e
+            writer.write_batch(batch.cast(schema) if batch.schema != schema else batch)
+            rows += batch.num_rows
+    return rows
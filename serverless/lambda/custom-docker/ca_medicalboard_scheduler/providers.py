@@ -0,0 +1,153 @@
+"""
+The medical boards whose datasets the scheduler ingests, each publishing a zip on its own FTP server.
+
+PROVIDERS configures them as a JSON list, one object per board:
+
+    [{"name": "California", "ftpAddress": "165.235.11.87", "directory": "MBC",
+      "filename": "MBCPhysicianAndSurgeonInformation-PUBLIC-{date}.zip", "ftpUser": "PoLYviEW3",
+      "ftpPassParam": "/fwa/FTP_PASSWORD", "ftpPort": 21, "s3Prefix": "MedicalBoards/California/",
+      "daysLimit": 30, "commandsPerSecond": 5}]
+
+{date} is the dataset date, YYYYMMDD. ftpPort, s3Prefix (MedicalBoards/<name>/), daysLimit and
+commandsPerSecond (no limit) are optional. Without PROVIDERS only the California board is ingested,
+from FTP_ADDRESS, FTP_PORT and FTP_PASS_KEY_PARAM.
+"""
+import ftplib
+import json
+import os
+import re
+import time
+
+
+DATE_PLACEHOLDER = '{date}'
+
+# The keys of a provider's PROVIDERS object and the Provider argument each of them is
+CONFIG_KEYS = {
+    'name': 'name',
+    'ftpAddress': 'ftp_address',
+    'directory': 'directory',
+    'filename': 'filename',
+    'ftpUser': 'ftp_user',
+    'ftpPassParam': 'ftp_pass_param',
+    'ftpPort': 'ftp_port',
+    's3Prefix': 's3_prefix',
+    'daysLimit': 'days_limit',
+    'commandsPerSecond': 'commands_per_second',
+}
+
+
+class Provider():
+    """
+    A medical board: where its dataset zips are, where its tables go in the bucket, and the
+    name keying its DynamoDB item
+    """
+
+    def __init__(self, name, ftp_address, directory, filename, ftp_user, ftp_pass_param, ftp_port=21,
+                 s3_prefix=None, days_limit=30, commands_per_second=None):
+        if filename.count(DATE_PLACEHOLDER) != 1:
+            raise ValueError(f"Provider '{name}': filename '{filename}' needs one {DATE_PLACEHOLDER}")
+        self.name = name
+        self.ftp_address = ftp_address
+        self.directory = directory
+        self.filename = filename
+        self.ftp_user = ftp_user
+        self.ftp_pass_param = ftp_pass_param
+        self.ftp_port = int(ftp_port)
+        self.s3_prefix = s3_prefix or f"MedicalBoards/{name}/"
+        self.days_limit = int(days_limit)
+        self.commands_per_second = commands_per_second
+
+        # group 1 is the dataset date
+        before, after = filename.split(DATE_PLACEHOLDER)
+        self.pattern = re.compile(rf"^{re.escape(before)}(\d{{8}}){re.escape(after)}$")
+
+    def __repr__(self):
+        return f"Provider({self.name!r})"
+
+    @classmethod
+    def from_config(cls, config):
+        unknown = set(config) - set(CONFIG_KEYS)
+        if unknown:
+            raise ValueError(f"Provider '{config.get('name')}': unknown keys {sorted(unknown)}, expected {list(CONFIG_KEYS)}")
+        return cls(**{CONFIG_KEYS[key]: value for key, value in config.items()})
+
+    def generate_filename(self, date):
+        return self.filename.replace(DATE_PLACEHOLDER, date.strftime('%Y%m%d'))
+
+    def dataset_date(self, filename):
+        """
+        The date of the dataset filename as YYYYMMDD, None if it isn't one of the provider's zips
+        """
+        match = self.pattern.match(filename)
+        return match.group(1) if match else None
+
+    def key(self, path):
+        return f"{self.s3_prefix}{path}"
+
+    def connect(self, password):
+        """
+        A new FTP connection logged in to the provider's server, in its directory
+        """
+        ftp = RateLimitedFTP(self.commands_per_second)
+        try:
+            ftp.connect(self.ftp_address, self.ftp_port)
+            ftp.login(user=self.ftp_user, passwd=password)
+            ftp.cwd(self.directory)
+        except BaseException:
+            ftp.close()
+            raise
+        return ftp
+
+
+class RateLimitedFTP(ftplib.FTP):
+    """
+    ftplib.FTP sending at most commands_per_second commands, waiting before one when needed.
+    None sends them as they come
+    """
+
+    def __init__(self, commands_per_second=None, **kwargs):
+        super().__init__(**kwargs)
+        self.min_interval = 1 / commands_per_second if commands_per_second else 0
+        self.last_command = None
+
+    def putcmd(self, line):
+        if self.min_interval:
+            now = time.monotonic()
+            if self.last_command is not None and now < self.last_command + self.min_interval:
+                time.sleep(self.last_command + self.min_interval - now)
+                now = self.last_command + self.min_interval
+            self.last_command = now
+        super().putcmd(line)
+
+
+def california(environ=os.environ):
+    """
+    The California board, the one provider ingested without PROVIDERS
+    """
+    return Provider(
+        name='California',
+        ftp_address=environ['FTP_ADDRESS'],
+        directory='MBC',
+        filename='MBCPhysicianAndSurgeonInformation-PUBLIC-{date}.zip',
+        ftp_user='PoLYviEW3',
+        ftp_pass_param=environ['FTP_PASS_KEY_PARAM'],
+        ftp_port=environ.get('FTP_PORT', 21),
+        s3_prefix='MedicalBoards/California/',
+    )
+
+
+def load_providers(environ=os.environ):
+    """
+    The providers of PROVIDERS, [California] without it
+    """
+    if not environ.get('PROVIDERS'):
+        return [california(environ)]
+
+    providers = [Provider.from_config(config) for config in json.loads(environ['PROVIDERS'])]
+    if not providers:
+        raise ValueError("PROVIDERS is empty")
+    names = [provider.name for provider in providers]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"PROVIDERS has the same name more than once: {duplicates}")
+    return providers
@@ -0,0 +1,178 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+
+# S3 takes parts of 5 MiB to 5 GiB, except the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+
+
+class MultipartUploadWriter():
+    """
+    File-like writer uploading what it's given to an S3 object with a multipart upload,
+    as it arrives.
+
+    At most part_size bytes are buffered, plus max_pending parts being uploaded in the
+    background, so memory doesn't grow with the object. The SHA-256 of the object is
+    computed on the way through and, once the upload completes, tagged on the object
+    as sha256. Used as a context manager the upload is completed on exit, or aborted
+    if the block raised.
+    """
+
+    def __init__(self, s3, bucket, key, part_size=DEFAULT_PART_SIZE, max_pending=2):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.max_pending = max_pending
+        self.bytes_written = 0
+        self.sha256 = hashlib.sha256()
+        self._buffer = bytearray()
+        self._parts = []
+        self._part_count = 0
+        self._pending = []
+        # The SHA-256 once completed, '' once aborted
+        self.checksum = None
+        self._executor = ThreadPoolExecutor(max_workers=max_pending)
+        self._upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.bytes_written += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._upload_part(part)
+        return len(data)
+
+
+    def close(self):
+        """
+        Uploads what's left and completes the upload. Returns the object's SHA-256 hex digest
+        """
+        if self.checksum is not None:
+            return self.checksum
+        try:
+            # An empty object still needs one (empty) part
+            if self._buffer or self._part_count == 0:
+                self._upload_part(bytes(self._buffer))
+                self._buffer = bytearray()
+            for future in self._pending:
+                future.result()
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': sorted(self._parts, key=lambda part: part['PartNumber'])}
+            )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._executor.shutdown()
+
+        self.checksum = self.sha256.hexdigest()
+        self.s3.put_object_tagging(
+            Bucket=self.bucket,
+            Key=self.key,
+            Tagging={'TagSet': [{'Key': 'sha256', 'Value': self.checksum}]}
+        )
+        logger.info(f"Uploaded {self.bytes_written} bytes in {len(self._parts)} parts to s3://{self.bucket}/{self.key}, sha256 {self.checksum}")
+        return self.checksum
+
+
+    def abort(self):
+        if self.checksum is not None:
+            return
+        self.checksum = ''
+        self._executor.shutdown(cancel_futures=True)
+        self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        logger.info(f"Aborted the upload to s3://{self.bucket}/{self.key}")
+
+
+    def _upload_part(self, body):
+        # Wait for the oldest part when max_pending are in flight, so the buffers stay bounded
+        if len(self._pending) >= self.max_pending:
+            self._pending.pop(0).result()
+        self._part_count += 1
+        self._pending.append(self._executor.submit(self._put_part, self._part_count, body))
+
+
+    def _put_part(self, part_number, body):
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        self._parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+
+class S3ObjectReader(io.RawIOBase):
+    """
+    Seekable, read-only view of an S3 object that fetches the ranges it's asked for,
+    so zipfile can read an archive straight from S3. Wrap it in open_s3_object's
+    io.BufferedReader to fetch large ranges.
+    """
+
+    def __init__(self, s3, bucket, key):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.size = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self._position = 0
+
+
+    def readable(self):
+        return True
+
+
+    def seekable(self):
+        return True
+
+
+    def tell(self):
+        return self._position
+
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self.size + offset
+        return self._position
+
+
+    def readinto(self, buffer):
+        if self._position >= self.size or len(buffer) == 0:
+            return 0
+        end = min(self._position + len(buffer), self.size) - 1
+        body = self.s3.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={self._position}-{end}")['Body'].read()
+        buffer[:len(body)] = body
+        self._position += len(body)
+        return len(body)
+
+
+def open_s3_object(s3, bucket, key, buffer_size=DEFAULT_PART_SIZE):
+    return io.BufferedReader(S3ObjectReader(s3, bucket, key), buffer_size=buffer_size)
@@ -0,0 +1,59 @@
+"""Time find_latest_file takes to find the newest dataset zip with one directory
+listing, against probing each day with SIZE like the scheduler used to.
+
+The FTP stand-in sleeps COMMAND_DELAY before every reply for the round trip to the
+board's server, and the newest zip is DAYS_AGO days old, so probing sends
+DAYS_AGO + 1 SIZE commands.
+
+run from serverless/lambda/custom-docker/ (needs moto and pyftpdlib):
+    python -m tests.benchmark.bench_listing
+"""
+import datetime
+import ftplib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "ca_medicalboard_scheduler"))
+
+import boto3  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from tests import conftest  # noqa: E402, sets the environment app.py reads
+from tests.ftp_server import FTPServer  # noqa: E402
+
+
+COMMAND_DELAY = 0.03
+DAYS_AGO = 20
+RUNS = 3
+
+
+def find_ms(app, server):
+    timings = []
+    for _ in range(RUNS):
+        with ftplib.FTP() as ftp:
+            ftp.connect("127.0.0.1", server.port)
+            ftp.login(server.user, server.password)
+            ftp.cwd("MBC")
+            start = time.perf_counter()
+            filename = app.find_latest_file(ftp)
+            timings.append((time.perf_counter() - start) * 1000)
+    assert filename is not None
+    return min(timings)
+
+
+def main():
+    date = datetime.date.today() - datetime.timedelta(days=DAYS_AGO)
+    files = {f"MBC/MBCPhysicianAndSurgeonInformation-PUBLIC-{date.strftime('%Y%m%d')}.zip": b""}
+
+    with mock_aws():
+        boto3.client("ssm").put_parameter(Name=os.environ["FTP_PASS_KEY_PARAM"], Value=conftest.FTP_PASSWORD, Type="SecureString")
+        import app
+
+    for name, denied in (("MLSD", ()), ("NLST", ("MLSD",)), ("SIZE probe", ("MLSD", "NLST"))):
+        with FTPServer(files, denied=denied, command_delay=COMMAND_DELAY) as server:
+            print(f"{name:12} {find_ms(app, server):8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
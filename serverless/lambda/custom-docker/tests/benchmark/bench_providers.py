@@ -0,0 +1,64 @@
+"""Time ingest_providers takes to check BOARDS providers one after the other, like
+one image per state would, against checking them all at once.
+
+Each provider has its own FTP stand-in, which refuses directory listings and sleeps
+COMMAND_DELAY before every reply for the round trip to the board's server. Its newest
+zip is DAYS_AGO days old and already downloaded, so each check logs in and probes
+DAYS_AGO + 1 days with SIZE.
+
+run from serverless/lambda/custom-docker/ (needs moto and pyftpdlib):
+    python -m tests.benchmark.bench_providers
+"""
+import contextlib
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "ca_medicalboard_scheduler"))
+
+import boto3  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from tests import conftest  # noqa: E402, sets the environment app.py reads
+from tests.ftp_server import FTPServer  # noqa: E402
+
+
+BOARDS = 12
+COMMAND_DELAY = 0.03
+DAYS_AGO = 5
+
+
+def main():
+    with mock_aws(), contextlib.ExitStack() as stack:
+        ssm = boto3.client("ssm")
+        ssm.put_parameter(Name=os.environ["FTP_PASS_KEY_PARAM"], Value=conftest.FTP_PASSWORD, Type="SecureString")
+        boto3.client("dynamodb").create_table(
+            TableName=os.environ["DATASET_INFO_TABLE"],
+            BillingMode="PAY_PER_REQUEST",
+            AttributeDefinitions=[{"AttributeName": "provider", "AttributeType": "S"}],
+            KeySchema=[{"AttributeName": "provider", "KeyType": "HASH"}],
+        )
+        import app
+        import providers
+
+        boards = []
+        date = datetime.date.today() - datetime.timedelta(days=DAYS_AGO)
+        for i in range(BOARDS):
+            name = f"Board{i:02}"
+            server = stack.enter_context(FTPServer(denied=("MLSD", "NLST"), command_delay=COMMAND_DELAY))
+            provider = providers.Provider(name, "127.0.0.1", "DATA", f"{name}-{{date}}.zip", server.user,
+                                          os.environ["FTP_PASS_KEY_PARAM"], ftp_port=server.port)
+            server.add_file(f"DATA/{provider.generate_filename(date)}")
+            app.update_last_downloaded_file(provider=name, filename=provider.generate_filename(date))
+            boards.append(provider)
+
+        for name, workers in (("one at a time", 1), ("concurrent", BOARDS)):
+            start = time.perf_counter()
+            results = app.ingest_providers(boards, "/tmp/bench_providers", workers=workers)
+            assert set(results.values()) == {False}
+            print(f"{name:14} {(time.perf_counter() - start) * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
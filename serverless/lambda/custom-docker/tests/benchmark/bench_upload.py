@@ -0,0 +1,74 @@
+"""Wall time of uploading the converted CSV files: the old loop creating an S3 client
+per file and uploading them one after the other, against upload_csv_files, one shared
+client uploading UPLOAD_WORKERS files at once.
+
+S3 is a moto server on localhost, whose responses are slowed down by RESPONSE_DELAY
+for the round trip to S3. The files are one large Dataset table and many small REF_
+tables, like the physician dataset.
+
+run from serverless/lambda/custom-docker/ (needs moto[server]):
+    python -m tests.benchmark.bench_upload
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "ca_medicalboard_scheduler"))
+
+import boto3  # noqa: E402
+from moto.server import ThreadedMotoServer  # noqa: E402
+
+from tests import conftest  # noqa: E402, sets the environment app.py reads
+
+
+RESPONSE_DELAY = 0.02
+REF_FILES = 30
+DATASET_SIZE = 64 * 1024 * 1024
+
+
+def old_upload(app, output_dir):
+    for csv_file in os.listdir(output_dir):
+        boto3.client('s3').upload_file(os.path.join(output_dir, csv_file), app.bucket_name, app.csv_s3_key(csv_file))
+
+
+def main():
+    logging.disable(logging.INFO)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    os.environ["AWS_ENDPOINT_URL"] = f"http://{host}:{port}"
+
+    # Every request to the moto server waits RESPONSE_DELAY
+    import moto.moto_server.werkzeug_app as werkzeug_app
+    dispatch = werkzeug_app.DomainDispatcherApplication.__call__
+
+    def delayed(self, environ, start_response):
+        time.sleep(RESPONSE_DELAY)
+        return dispatch(self, environ, start_response)
+    werkzeug_app.DomainDispatcherApplication.__call__ = delayed
+
+    try:
+        boto3.client("ssm").put_parameter(Name=os.environ["FTP_PASS_KEY_PARAM"], Value=conftest.FTP_PASSWORD, Type="SecureString")
+        boto3.client("s3").create_bucket(Bucket=os.environ["DATA_BUCKET"])
+        import app
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            with open(os.path.join(output_dir, "PhysicianData.csv"), "wb") as f:
+                f.write(os.urandom(DATASET_SIZE))
+            for i in range(REF_FILES):
+                with open(os.path.join(output_dir, f"REF_Table{i}.csv"), "wb") as f:
+                    f.write(os.urandom(64 * 1024))
+
+            for name, upload in (("client per file, serial", lambda: old_upload(app, output_dir)),
+                                 ("shared client, pooled", lambda: app.upload_csv_files(output_dir))):
+                start = time.perf_counter()
+                upload()
+                print(f"{name:24} {time.perf_counter() - start:8.2f}s")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+
+# app.py isn't a package, the image copies it to the task root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ca_medicalboard_scheduler"))
+
+# app.py reads its configuration at import time
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("DATASET_INFO_TABLE", "dataset-info-test")
+os.environ.setdefault("DATA_BUCKET", "dataset-bucket-test")
+os.environ.setdefault("FTP_PASS_KEY_PARAM", "/fwa/FTP_PASSWORD")
+os.environ.setdefault("FTP_ADDRESS", "127.0.0.1")
+
+FTP_PASSWORD = "secret"
+
+
+@pytest.fixture()
+def aws():
+    """ moto with the SSM parameter, DynamoDB table and bucket app.py is configured with"""
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+
+    with moto.mock_aws():
+        boto3.client("ssm").put_parameter(Name=os.environ["FTP_PASS_KEY_PARAM"], Value=FTP_PASSWORD, Type="SecureString")
+        boto3.client("dynamodb").create_table(
+            TableName=os.environ["DATASET_INFO_TABLE"],
+            BillingMode="PAY_PER_REQUEST",
+            AttributeDefinitions=[{"AttributeName": "provider", "AttributeType": "S"}],
+            KeySchema=[{"AttributeName": "provider", "KeyType": "HASH"}],
+        )
+        boto3.client("s3").create_bucket(Bucket=os.environ["DATA_BUCKET"])
+        yield
+
+
+@pytest.fixture()
+def app(aws):
+    import app
+
+    # The passwords are cached for the whole run, each test has its own moto SSM
+    app.get_ftp_password.cache_clear()
+    return app
+
+
+@pytest.fixture()
+def mdbtools(monkeypatch):
+    """ The mdb-tables and mdb-export stand-ins of tests/mdbtools on PATH"""
+    from tests.mdbtools import DIRECTORY
+
+    monkeypatch.setenv("PATH", DIRECTORY + os.pathsep + os.environ["PATH"])
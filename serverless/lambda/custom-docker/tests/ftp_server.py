@@ -0,0 +1,77 @@
+"""A local FTP server standing in for the medical board's, serving a temporary
+directory with pyftpdlib.
+
+    with FTPServer(files={"MBC/a.zip": b"..."}) as server:
+        ftp = ftplib.FTP()
+        ftp.connect("127.0.0.1", server.port)
+        ftp.login(server.user, server.password)
+
+denied refuses commands with a 550 like a locked down server would, and
+command_delay is slept before answering each command, the round trip to a remote
+server. .commands records every command received.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.ioloop import IOLoop
+from pyftpdlib.servers import ThreadedFTPServer
+
+
+class FTPServer():
+
+    def __init__(self, files=None, user="PoLYviEW3", password="secret", denied=(), command_delay=0):
+        self.files = files or {}
+        self.user = user
+        self.password = password
+        self.denied = {command.upper() for command in denied}
+        self.command_delay = command_delay
+        self.commands = []
+
+
+    def __enter__(self):
+        self._root = tempfile.TemporaryDirectory()
+        self.root = self._root.name
+        for path, content in self.files.items():
+            self.add_file(path, content)
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_user(self.user, self.password, self.root, perm="elr")
+        server = self
+
+        class Handler(FTPHandler):
+
+            def process_command(self, cmd, *args, **kwargs):
+                server.commands.append(cmd)
+                if server.command_delay:
+                    time.sleep(server.command_delay)
+                if cmd in server.denied:
+                    self.respond("550 Permission denied.")
+                    return
+                return super().process_command(cmd, *args, **kwargs)
+
+        Handler.authorizer = authorizer
+        # An IOLoop of its own, the shared one would be served and closed by every server running at once
+        self._server = ThreadedFTPServer(("127.0.0.1", 0), Handler, ioloop=IOLoop())
+        # The session threads poll every second by default, which close_all waits out
+        self._server.poll_timeout = 0.05
+        self.port = self._server.socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"timeout": 0.05, "handle_exit": False}, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def __exit__(self, *exc):
+        self._server.close_all()
+        self._thread.join(timeout=5)
+        self._root.cleanup()
+
+
+    def add_file(self, path, content=b""):
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(content)
@@ -0,0 +1,22 @@
+"""Stand-ins for the mdb-tables and mdb-export commands of mdbtools, which the
+image builds from source and a test machine rarely has.
+
+The "Access database" they read is a JSON file written by write_database:
+
+    {"tables": {"REF_State": {"columns": ["code", "name"], "rows": [["CA", "California"]],
+                              "delay": 0.1, "exit": 0}}}
+
+delay is slept before exporting the table and a non-zero exit makes mdb-export fail
+with it. The mdbtools fixture of conftest.py puts this directory first on PATH.
+"""
+import json
+import os
+
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_database(path, tables):
+    with open(path, "w") as f:
+        json.dump({"tables": tables}, f)
+    return str(path)
@@ -0,0 +1,67 @@
+import json
+import os
+
+import boto3
+import pytest
+
+from tests.mdbtools import write_database
+
+
+BUCKET = os.environ["DATA_BUCKET"]
+FILENAME = "MBCPhysicianAndSurgeonInformation-PUBLIC-20240102.zip"
+TABLES = {
+    "REF_State": {"columns": ["code", "name"], "rows": [["CA", "California"]]},
+    "REF_LicenseType": {"columns": ["code"], "rows": [["A"]]},
+    "PhysicianData": {"columns": ["license", "name"], "rows": [["A12345", "Jane Doe"]]},
+}
+
+
+@pytest.fixture()
+def export(app, mdbtools, tmp_path):
+    def export(tables):
+        return app.accdb_convert_to_csv(write_database(tmp_path / "PhysicianData.accdb", tables))
+    return export
+
+
+def _keys():
+    return sorted(obj["Key"] for obj in boto3.client("s3").list_objects_v2(Bucket=BUCKET).get("Contents", []))
+
+
+def test_first_dataset_uploads_every_table(app, export):
+
+    output_dir, hashes = export(TABLES)
+
+    manifest = app.publish_dataset(FILENAME, output_dir, hashes, app.get_table_hashes(None))
+
+    assert manifest["changedTables"] == ["PhysicianData", "REF_LicenseType", "REF_State"]
+    assert _keys() == [
+        "MedicalBoards/California/Dataset/PhysicianData.csv",
+        "MedicalBoards/California/Manifests/MBCPhysicianAndSurgeonInformation-PUBLIC-20240102.json",
+        "MedicalBoards/California/REFS/REF_LicenseType.csv",
+        "MedicalBoards/California/REFS/REF_State.csv",
+    ]
+
+
+def test_only_changed_tables_are_uploaded(app, export):
+
+    output_dir, hashes = export(TABLES)
+    app.update_last_downloaded_file(provider="California", filename=FILENAME, table_hashes=hashes)
+    previous = app.get_table_hashes(app.get_last_downloaded_file(provider="California"))
+    assert previous == hashes
+
+    tables = {name: table for name, table in TABLES.items() if name != "REF_LicenseType"}
+    tables["PhysicianData"] = {**TABLES["PhysicianData"], "rows": [["A12345", "Jane Doe"], ["G54321", "John Roe"]]}
+    output_dir, hashes = export(tables)
+    manifest = app.publish_dataset("MBCPhysicianAndSurgeonInformation-PUBLIC-20240103.zip", output_dir, hashes, previous)
+
+    assert manifest["changedTables"] == ["PhysicianData"]
+    assert manifest["removedTables"] == ["REF_LicenseType"]
+    assert manifest["tables"]["REF_State"] == {
+        "sha256": previous["REF_State"], "key": "MedicalBoards/California/REFS/REF_State.csv", "changed": False,
+    }
+    assert _keys() == [
+        "MedicalBoards/California/Dataset/PhysicianData.csv",
+        "MedicalBoards/California/Manifests/MBCPhysicianAndSurgeonInformation-PUBLIC-20240103.json",
+    ]
+    stored = boto3.client("s3").get_object(Bucket=BUCKET, Key="MedicalBoards/California/Manifests/MBCPhysicianAndSurgeonInformation-PUBLIC-20240103.json")
+    assert json.load(stored["Body"]) == manifest
@@ -0,0 +1,67 @@
+import hashlib
+import os
+import subprocess
+import time
+
+import pytest
+
+from tests.mdbtools import write_database
+
+
+TABLES = {
+    "REF_State": {"columns": ["code", "name"], "rows": [["CA", "California"], ["NV", "Nevada"]]},
+    "REF_LicenseType": {"columns": ["code", "description"], "rows": [["A", "Physician and Surgeon"]]},
+    "PhysicianData": {"columns": ["license", "name", "year"], "rows": [["A12345", "Jane Doe", 1999]]},
+    "Discipline": {"columns": ["license", "action"], "rows": []},
+}
+
+
+@pytest.fixture()
+def database(tmp_path, mdbtools):
+    def write(tables):
+        return write_database(tmp_path / "PhysicianData.accdb", tables)
+    return write
+
+
+def test_exports_every_table(app, database, tmp_path):
+
+    output_dir, hashes = app.accdb_convert_to_csv(database(TABLES))
+
+    assert output_dir == str(tmp_path / "PhysicianData_csv")
+    assert sorted(os.listdir(output_dir)) == sorted(f"{table}.csv" for table in TABLES)
+    with open(os.path.join(output_dir, "REF_State.csv"), "rb") as f:
+        content = f.read()
+    assert content == b'"code","name"\n"CA","California"\n"NV","Nevada"\n'
+    assert sorted(hashes) == sorted(TABLES)
+    assert hashes["REF_State"] == hashlib.sha256(content).hexdigest()
+
+
+def test_exports_the_tables_concurrently(app, database):
+
+    tables = {name: {**table, "delay": 0.5} for name, table in TABLES.items()}
+    tables["PhysicianData"]["delay"] = 1
+
+    start = time.perf_counter()
+    app.accdb_convert_to_csv(database(tables), workers=len(tables))
+
+    # As long as the largest table, not the sum of them (2.5s)
+    assert time.perf_counter() - start < 1.8
+
+
+def test_reports_every_failed_table(app, database, tmp_path):
+
+    tables = {**TABLES, "Discipline": {**TABLES["Discipline"], "exit": 3}, "REF_State": {**TABLES["REF_State"], "exit": 1}}
+
+    with pytest.raises(app.ExportError) as e:
+        app.accdb_convert_to_csv(database(tables))
+
+    assert sorted(e.value.failures) == ["Discipline", "REF_State"]
+    assert e.value.failures["Discipline"] == "mdb-export exited with 3: Error: couldn't export Discipline"
+    # The other tables were still exported
+    assert os.path.getsize(tmp_path / "PhysicianData_csv" / "PhysicianData.csv") > 0
+
+
+def test_fails_when_the_tables_cannot_be_listed(app, mdbtools, tmp_path):
+
+    with pytest.raises(subprocess.CalledProcessError):
+        app.accdb_convert_to_csv(str(tmp_path / "missing.accdb"))
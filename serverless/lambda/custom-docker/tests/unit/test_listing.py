@@ -0,0 +1,81 @@
+import datetime
+import ftplib
+
+import pytest
+
+from tests.ftp_server import FTPServer
+
+
+def _name(days_ago):
+    date = datetime.date.today() - datetime.timedelta(days=days_ago)
+    return f"MBCPhysicianAndSurgeonInformation-PUBLIC-{date.strftime('%Y%m%d')}.zip"
+
+
+FILES = {
+    f"MBC/{_name(40)}": b"too old",
+    f"MBC/{_name(9)}": b"older",
+    f"MBC/{_name(3)}": b"latest",
+    "MBC/MBCPhysicianAndSurgeonInformation-PUBLIC-latest.zip": b"not a dataset date",
+    "MBC/README.txt": b"",
+}
+
+
+@pytest.fixture()
+def ftp_server(request):
+    with FTPServer(FILES, **getattr(request, "param", {})) as server:
+        yield server
+
+
+@pytest.fixture()
+def ftp(ftp_server):
+    with ftplib.FTP() as ftp:
+        ftp.connect("127.0.0.1", ftp_server.port)
+        ftp.login(ftp_server.user, ftp_server.password)
+        ftp.cwd("MBC")
+        ftp_server.commands.clear()
+        yield ftp
+
+
+@pytest.mark.parametrize("ftp_server", [{}, {"denied": ["MLSD"]}], indirect=True, ids=["mlsd", "nlst"])
+def test_lists_the_directory_once(app, ftp, ftp_server):
+
+    assert app.find_latest_file(ftp) == _name(3)
+    assert "SIZE" not in ftp_server.commands
+
+
+@pytest.mark.parametrize("ftp_server", [{"denied": ["MLSD", "NLST"]}], indirect=True)
+def test_probes_when_listing_is_denied(app, ftp, ftp_server):
+
+    assert app.find_latest_file(ftp) == _name(3)
+    assert ftp_server.commands.count("SIZE") == 4
+
+
+@pytest.mark.parametrize("ftp_server", [{"denied": ["MLSD", "NLST"]}], indirect=True)
+def test_probing_stops_at_the_last_download(app, ftp, ftp_server):
+
+    assert app.find_latest_file(ftp, last_downloaded_file=_name(1)) == _name(1)
+    assert ftp_server.commands.count("SIZE") == 1
+
+
+def test_ignores_files_outside_the_window(app, ftp):
+
+    assert app.find_latest_file(ftp, days_limit=2) is None
+    assert app.find_latest_file(ftp, days_limit=5) == _name(3)
+
+
+def test_is_downloaded(app):
+
+    assert app.is_downloaded(_name(3), _name(3))
+    assert app.is_downloaded(_name(9), _name(3))
+    assert not app.is_downloaded(_name(3), _name(9))
+    assert not app.is_downloaded(_name(3), "")
+
+
+def test_skips_the_dataset_already_downloaded(app, ftp_server, tmp_path, monkeypatch):
+
+    provider = app.DEFAULT_PROVIDER
+    monkeypatch.setattr(provider, "ftp_port", ftp_server.port)
+    app.update_last_downloaded_file(provider="California", filename=_name(3))
+
+    assert app.download_latest_zip(provider, tmp_path) is False
+    assert "RETR" not in ftp_server.commands
@@ -0,0 +1,94 @@
+import datetime
+import os
+
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from tests.mdbtools import write_database
+
+
+BUCKET = os.environ["DATA_BUCKET"]
+FILENAME = "MBCPhysicianAndSurgeonInformation-PUBLIC-20240102.zip"
+TABLES = {
+    "REF_State": {"columns": ["code", "name"], "rows": [["CA", "California"], ["NV", "Nevada"]]},
+    "PhysicianData": {
+        "columns": ["license", "name", "year", "issued", "expires"],
+        "rows": [
+            ["A12345", "Jane Doe", 1999, "01/02/99 00:00:00", None],
+            ["G54321", "John Roe", 2004, "06/30/04 00:00:00", None],
+        ],
+    },
+}
+
+
+@pytest.fixture()
+def convert(app, mdbtools, tmp_path):
+    def convert(tables=TABLES):
+        parquet_dir = tmp_path / "PhysicianData_parquet"
+        output_dir, hashes = app.accdb_convert_to_csv(write_database(tmp_path / "PhysicianData.accdb", tables), parquet_dir=parquet_dir)
+        return output_dir, hashes, parquet_dir
+    return convert
+
+
+def test_infers_the_column_types(convert):
+
+    _, _, parquet_dir = convert()
+
+    table = pq.read_table(parquet_dir / "PhysicianData.parquet")
+    assert table.schema.field("license").type == pa.string()
+    assert table.schema.field("year").type == pa.int64()
+    assert pa.types.is_timestamp(table.schema.field("issued").type)
+    # Empty in every row
+    assert table.schema.field("expires").type == pa.string()
+    assert table.column("issued").to_pylist()[0] == datetime.datetime(1999, 1, 2)
+    assert pq.ParquetFile(parquet_dir / "PhysicianData.parquet").metadata.row_group(0).column(0).compression == "ZSTD"
+
+
+def test_later_batches_widen_the_schema(tmp_path):
+    import parquet_output
+
+    csv_path = tmp_path / "REF_Code.csv"
+    rows = [f'{i},"row {i}"' for i in range(2000)] + ['"X1","not a number"'] + ['"",""']
+    csv_path.write_text('"code","description"\n' + "\n".join(rows) + "\n")
+
+    assert parquet_output.csv_to_parquet(str(csv_path), str(tmp_path / "REF_Code.parquet"), block_size=4096) == 2002
+
+    table = pq.read_table(tmp_path / "REF_Code.parquet")
+    assert table.schema.field("code").type == pa.string()
+    assert table.column("code").to_pylist()[:2] == ["0", "1"]
+    assert table.column("code").to_pylist()[-2:] == ["X1", None]
+
+
+def test_uploads_a_partition_per_dataset_date(app, convert):
+
+    output_dir, hashes, parquet_dir = convert()
+
+    manifest = app.publish_dataset(FILENAME, output_dir, hashes, {}, "parquet", parquet_dir)
+
+    keys = sorted(obj["Key"] for obj in boto3.client("s3").list_objects_v2(Bucket=BUCKET)["Contents"])
+    assert keys == [
+        "MedicalBoards/California/Manifests/MBCPhysicianAndSurgeonInformation-PUBLIC-20240102.json",
+        "MedicalBoards/California/Parquet/PhysicianData/datasetDate=2024-01-02/PhysicianData.parquet",
+        "MedicalBoards/California/Parquet/REF_State/datasetDate=2024-01-02/REF_State.parquet",
+    ]
+    assert manifest["tables"]["REF_State"] == {
+        "sha256": hashes["REF_State"],
+        "changed": True,
+        "parquetKey": "MedicalBoards/California/Parquet/REF_State/datasetDate=2024-01-02/REF_State.parquet",
+    }
+
+
+def test_both_formats(app, convert):
+
+    output_dir, hashes, parquet_dir = convert()
+
+    manifest = app.publish_dataset(FILENAME, output_dir, hashes, {"REF_State": hashes["REF_State"]}, "both", parquet_dir)
+
+    keys = {obj["Key"] for obj in boto3.client("s3").list_objects_v2(Bucket=BUCKET)["Contents"]}
+    # Only the CSV of the changed table, the Parquet snapshot of both
+    assert "MedicalBoards/California/Dataset/PhysicianData.csv" in keys
+    assert "MedicalBoards/California/REFS/REF_State.csv" not in keys
+    assert "MedicalBoards/California/Parquet/REF_State/datasetDate=2024-01-02/REF_State.parquet" in keys
+    assert manifest["tables"]["REF_State"]["key"] == "MedicalBoards/California/REFS/REF_State.csv"
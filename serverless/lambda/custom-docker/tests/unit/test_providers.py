@@ -0,0 +1,206 @@
+import datetime
+import io
+import json
+import os
+import time
+import zipfile
+
+import boto3
+import pytest
+
+import providers
+from tests.ftp_server import FTPServer
+from tests.mdbtools import write_database
+
+
+BUCKET = os.environ["DATA_BUCKET"]
+TABLE = os.environ["DATASET_INFO_TABLE"]
+DATE = datetime.date.today() - datetime.timedelta(days=2)
+
+TABLES = {
+    "REF_State": {"columns": ["code", "name"], "rows": [["CA", "California"], ["NV", "Nevada"]]},
+    "PhysicianData": {"columns": ["license", "name", "year"], "rows": [["A12345", "Jane Doe", 1999]]},
+}
+
+
+def _provider(name, **config):
+    return providers.Provider(**{
+        "name": name,
+        "ftp_address": "127.0.0.1",
+        "directory": name.upper(),
+        "filename": f"{name}Licensees-{{date}}.zip",
+        "ftp_user": f"{name.lower()}-user",
+        "ftp_pass_param": f"/fwa/{name}/FTP_PASSWORD",
+        **config,
+    })
+
+
+def test_provider_filenames():
+
+    provider = _provider("Nevada")
+
+    assert provider.generate_filename(datetime.date(2024, 1, 2)) == "NevadaLicensees-20240102.zip"
+    assert provider.dataset_date("NevadaLicensees-20240102.zip") == "20240102"
+    assert provider.dataset_date("NevadaLicensees-latest.zip") is None
+    assert provider.dataset_date("NevadaLicensees-20240102.zip.part") is None
+    assert provider.key("REFS/REF_State.csv") == "MedicalBoards/Nevada/REFS/REF_State.csv"
+
+
+def test_provider_needs_a_dated_filename():
+
+    with pytest.raises(ValueError):
+        _provider("Nevada", filename="NevadaLicensees.zip")
+
+
+def test_loads_california_without_providers():
+
+    [california] = providers.load_providers({"FTP_ADDRESS": "165.235.11.87", "FTP_PASS_KEY_PARAM": "/fwa/FTP_PASSWORD"})
+
+    assert california.name == "California"
+    assert california.ftp_port == 21
+    assert california.directory == "MBC"
+    assert california.generate_filename(datetime.date(2024, 1, 2)) == "MBCPhysicianAndSurgeonInformation-PUBLIC-20240102.zip"
+    assert california.key("Dataset/PhysicianData.csv") == "MedicalBoards/California/Dataset/PhysicianData.csv"
+
+
+def test_loads_providers():
+
+    config = [
+        {"name": "Nevada", "ftpAddress": "10.0.0.1", "directory": "NV", "filename": "NV-{date}.zip",
+         "ftpUser": "nv", "ftpPassParam": "/fwa/NV", "ftpPort": 2121, "commandsPerSecond": 5},
+        {"name": "Oregon", "ftpAddress": "10.0.0.2", "directory": "/", "filename": "OR_{date}.zip",
+         "ftpUser": "or", "ftpPassParam": "/fwa/OR", "s3Prefix": "Boards/OR/", "daysLimit": 7},
+    ]
+
+    nevada, oregon = providers.load_providers({"PROVIDERS": json.dumps(config)})
+
+    assert (nevada.ftp_port, nevada.commands_per_second, nevada.s3_prefix) == (2121, 5, "MedicalBoards/Nevada/")
+    assert (oregon.days_limit, oregon.s3_prefix) == (7, "Boards/OR/")
+
+
+@pytest.mark.parametrize("config", [
+    [],
+    [{"name": "Nevada", "ftpAddress": "10.0.0.1", "directory": "NV", "filename": "NV-{date}.zip", "ftpUser": "nv", "ftpPassParam": "/fwa/NV", "port": 21}],
+    [{"name": "Nevada", "ftpAddress": "10.0.0.1", "directory": "NV", "filename": "NV-{date}.zip", "ftpUser": "nv", "ftpPassParam": "/fwa/NV"}] * 2,
+], ids=["empty", "unknown key", "duplicate name"])
+def test_rejects_bad_providers(config):
+
+    with pytest.raises(ValueError):
+        providers.load_providers({"PROVIDERS": json.dumps(config)})
+
+
+def test_rate_limits_the_commands():
+
+    with FTPServer({"NEVADA/README.txt": b""}, user="nevada-user") as server:
+        provider = _provider("Nevada", ftp_port=server.port, commands_per_second=20)
+        with provider.connect(server.password) as ftp:
+            start = time.perf_counter()
+            for _ in range(5):
+                ftp.voidcmd("NOOP")
+            elapsed = time.perf_counter() - start
+
+    # At least 1/20s between each of them
+    assert elapsed >= 4 / 20
+
+
+def _dataset(tmp_path, name):
+    database = write_database(tmp_path / f"{name}.accdb", TABLES)
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        archive.write(database, f"{name}/{name}.accdb")
+    return data.getvalue()
+
+
+@pytest.fixture()
+def servers():
+    """ The FTP server of each provider"""
+    with FTPServer(user="nevada-user", password="nevada-secret") as nevada, FTPServer(user="oregon-user", password="oregon-secret") as oregon:
+        yield {"Nevada": nevada, "Oregon": oregon}
+
+
+@pytest.fixture()
+def boards(app, mdbtools, servers, tmp_path):
+    """ Two providers, each with its own FTP server, user and SSM password"""
+    ssm = boto3.client("ssm")
+    boards = []
+    for name, server in servers.items():
+        provider = _provider(name, ftp_port=server.port, commands_per_second=50)
+        server.add_file(f"{provider.directory}/{provider.generate_filename(DATE)}", _dataset(tmp_path, name))
+        ssm.put_parameter(Name=provider.ftp_pass_param, Value=server.password, Type="SecureString")
+        boards.append(provider)
+    return boards
+
+
+def _publish_next_dataset(boards, servers, tmp_path):
+    """ The same tables again, in a dataset a day newer"""
+    for provider in boards:
+        servers[provider.name].add_file(f"{provider.directory}/{provider.generate_filename(DATE + datetime.timedelta(days=1))}", _dataset(tmp_path, provider.name))
+
+
+def _keys(prefix):
+    return {obj["Key"] for obj in boto3.client("s3").list_objects_v2(Bucket=BUCKET, Prefix=prefix).get("Contents", [])}
+
+
+def test_ingests_every_provider(app, boards, tmp_path):
+
+    assert app.ingest_providers(boards, str(tmp_path / "work"), workers=2) == {"Nevada": True, "Oregon": True}
+
+    keys = {obj["Key"] for obj in boto3.client("s3").list_objects_v2(Bucket=BUCKET)["Contents"]}
+    for provider in boards:
+        assert {
+            f"MedicalBoards/{provider.name}/Dataset/PhysicianData.csv",
+            f"MedicalBoards/{provider.name}/REFS/REF_State.csv",
+            f"MedicalBoards/{provider.name}/Manifests/{provider.name}Licensees-{DATE.strftime('%Y%m%d')}.json",
+        } <= keys
+        item = app.get_last_downloaded_file(provider=provider.name)
+        assert item["file"]["S"] == provider.generate_filename(DATE)
+        assert sorted(app.get_table_hashes(item)) == sorted(TABLES)
+
+    # The next run finds every dataset already downloaded
+    assert app.ingest_providers(boards, str(tmp_path / "work"), workers=2) == {"Nevada": False, "Oregon": False}
+
+
+def test_a_failing_provider_doesnt_stop_the_others(app, boards, tmp_path):
+
+    boto3.client("ssm").put_parameter(Name=boards[0].ftp_pass_param, Value="wrong", Type="SecureString", Overwrite=True)
+
+    with pytest.raises(app.IngestError) as error:
+        app.ingest_providers(boards, str(tmp_path / "work"), workers=2)
+
+    assert list(error.value.failures) == ["Nevada"]
+    assert error.value.results == {"Oregon": True}
+    assert app.get_last_downloaded_file(provider="Nevada") is None
+    assert boto3.client("dynamodb").get_item(TableName=TABLE, Key={"provider": {"S": "Oregon"}})["Item"]["file"]["S"] == boards[1].generate_filename(DATE)
+
+
+def test_csv_after_parquet_uploads_every_table(app, boards, servers, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+
+    monkeypatch.setattr(app, "OUTPUT_FORMAT", "parquet")
+    app.ingest_providers(boards, str(tmp_path / "work"), workers=2)
+    assert _keys("MedicalBoards/Nevada/REFS/") == set()
+
+    # The tables haven't changed, but their CSV files were never uploaded
+    _publish_next_dataset(boards, servers, tmp_path)
+    monkeypatch.setattr(app, "OUTPUT_FORMAT", "csv")
+    app.ingest_providers(boards, str(tmp_path / "work"), workers=2)
+
+    assert _keys("MedicalBoards/Nevada/REFS/") == {"MedicalBoards/Nevada/REFS/REF_State.csv"}
+    assert _keys("MedicalBoards/Nevada/Dataset/") == {"MedicalBoards/Nevada/Dataset/PhysicianData.csv"}
+
+
+def test_another_compression_uploads_every_table(app, boards, servers, tmp_path, monkeypatch):
+
+    monkeypatch.setattr(app, "OUTPUT_MODE", "stream")
+    app.ingest_providers(boards, str(tmp_path / "work"), workers=2)
+
+    _publish_next_dataset(boards, servers, tmp_path)
+    monkeypatch.setattr(app, "OUTPUT_COMPRESSION", "gzip")
+    app.ingest_providers(boards, str(tmp_path / "work"), workers=2)
+
+    assert _keys("MedicalBoards/Nevada/REFS/") == {"MedicalBoards/Nevada/REFS/REF_State.csv", "MedicalBoards/Nevada/REFS/REF_State.csv.gz"}
+    manifest = json.loads(boto3.client("s3").get_object(
+        Bucket=BUCKET, Key=f"MedicalBoards/Nevada/Manifests/NevadaLicensees-{(DATE + datetime.timedelta(days=1)).strftime('%Y%m%d')}.json"
+    )["Body"].read())
+    assert manifest["tables"]["REF_State"]["key"] == "MedicalBoards/Nevada/REFS/REF_State.csv.gz"
+    assert manifest["changedTables"] == ["PhysicianData", "REF_State"]
@@ -0,0 +1,103 @@
+import ftplib
+import hashlib
+import io
+import os
+import zipfile
+
+import boto3
+import pytest
+
+import s3_stream
+from tests.ftp_server import FTPServer
+
+
+BUCKET = os.environ["DATA_BUCKET"]
+PART_SIZE = s3_stream.MIN_PART_SIZE
+FILENAME = "MBCPhysicianAndSurgeonInformation-PUBLIC-20240102.zip"
+
+
+def _archive():
+    """ A zip of 2.5 parts, stored so it doesn't compress"""
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("MBC/PhysicianData.accdb", os.urandom(2 * PART_SIZE + PART_SIZE // 2))
+        archive.writestr("MBC/readme.txt", b"public dataset")
+    return data.getvalue()
+
+
+@pytest.fixture(scope="module")
+def archive():
+    return _archive()
+
+
+@pytest.fixture()
+def s3(aws):
+    return boto3.client("s3")
+
+
+def _tags(s3, key):
+    return {tag["Key"]: tag["Value"] for tag in s3.get_object_tagging(Bucket=BUCKET, Key=key)["TagSet"]}
+
+
+def test_uploads_in_parts(s3, archive):
+
+    with s3_stream.MultipartUploadWriter(s3, BUCKET, "archive.zip", PART_SIZE) as writer:
+        for i in range(0, len(archive), 8192):
+            writer.write(archive[i:i + 8192])
+            assert len(writer._buffer) < PART_SIZE
+
+    # The ETag of a multipart object ends with its number of parts
+    assert s3.head_object(Bucket=BUCKET, Key="archive.zip")["ETag"].endswith('-3"')
+    assert s3.get_object(Bucket=BUCKET, Key="archive.zip")["Body"].read() == archive
+    assert _tags(s3, "archive.zip") == {"sha256": hashlib.sha256(archive).hexdigest()}
+
+
+def test_empty_object(s3):
+
+    with s3_stream.MultipartUploadWriter(s3, BUCKET, "empty") as writer:
+        pass
+
+    assert writer.checksum == hashlib.sha256().hexdigest()
+    assert s3.get_object(Bucket=BUCKET, Key="empty")["Body"].read() == b""
+
+
+def test_aborts_on_error(s3, archive):
+
+    with pytest.raises(ftplib.error_temp):
+        with s3_stream.MultipartUploadWriter(s3, BUCKET, "broken.zip", PART_SIZE) as writer:
+            writer.write(archive[:PART_SIZE + 1])
+            raise ftplib.error_temp("421 connection lost")
+
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert "Contents" not in s3.list_objects_v2(Bucket=BUCKET, Prefix="broken.zip")
+
+
+def test_rejects_parts_s3_refuses(s3):
+
+    with pytest.raises(ValueError):
+        s3_stream.MultipartUploadWriter(s3, BUCKET, "archive.zip", PART_SIZE - 1)
+
+
+def test_streams_the_ftp_download(app, s3, archive):
+
+    with FTPServer({f"MBC/{FILENAME}": archive}) as server, ftplib.FTP() as ftp:
+        ftp.connect("127.0.0.1", server.port)
+        ftp.login(server.user, server.password)
+        ftp.cwd("MBC")
+
+        checksum = app.stream_to_s3(ftp, FILENAME, s3, BUCKET, f"MedicalBoards/California/Archive/{FILENAME}", PART_SIZE)
+
+    assert checksum == hashlib.sha256(archive).hexdigest()
+    assert s3.get_object(Bucket=BUCKET, Key=f"MedicalBoards/California/Archive/{FILENAME}")["Body"].read() == archive
+
+
+def test_extracts_from_s3(s3, archive, tmp_path):
+
+    s3.put_object(Bucket=BUCKET, Key="archive.zip", Body=archive)
+
+    with zipfile.ZipFile(s3_stream.open_s3_object(s3, BUCKET, "archive.zip", buffer_size=1024 * 1024)) as zip_ref:
+        zip_ref.extractall(tmp_path)
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as expected:
+        assert (tmp_path / "MBC" / "PhysicianData.accdb").read_bytes() == expected.read("MBC/PhysicianData.accdb")
+    assert (tmp_path / "MBC" / "readme.txt").read_bytes() == b"public dataset"
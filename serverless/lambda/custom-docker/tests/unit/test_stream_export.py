@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import os
+
+import boto3
+import pytest
+
+from tests.mdbtools import write_database
+
+
+BUCKET = os.environ["DATA_BUCKET"]
+TABLES = {
+    "REF_State": {"columns": ["code", "name"], "rows": [["CA", "California"], ["NV", "Nevada"]]},
+    "PhysicianData": {"columns": ["license", "name", "year"], "rows": [["A12345", "Jane Doe", 1999]] * 1000},
+}
+REF_STATE_CSV = b'"code","name"\n"CA","California"\n"NV","Nevada"\n'
+
+
+@pytest.fixture()
+def database(mdbtools, tmp_path):
+    def write(tables=TABLES):
+        return write_database(tmp_path / "PhysicianData.accdb", tables)
+    return write
+
+
+def _get(key):
+    return boto3.client("s3").get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def _incomplete_uploads():
+    return boto3.client("s3").list_multipart_uploads(Bucket=BUCKET).get("Uploads", [])
+
+
+def test_streams_the_tables_without_files(app, database, tmp_path):
+
+    hashes, keys = app.accdb_stream_to_s3(database())
+
+    assert keys == {
+        "REF_State": "MedicalBoards/California/REFS/REF_State.csv",
+        "PhysicianData": "MedicalBoards/California/Dataset/PhysicianData.csv",
+    }
+    assert _get(keys["REF_State"]) == REF_STATE_CSV
+    assert hashes["REF_State"] == hashlib.sha256(REF_STATE_CSV).hexdigest()
+    assert os.listdir(tmp_path) == ["PhysicianData.accdb"]
+
+
+def test_gzip(app, database):
+
+    hashes, keys = app.accdb_stream_to_s3(database(), compression="gzip")
+
+    assert keys["REF_State"] == "MedicalBoards/California/REFS/REF_State.csv.gz"
+    assert gzip.decompress(_get(keys["REF_State"])) == REF_STATE_CSV
+    physician_data = _get(keys["PhysicianData"])
+    assert len(physician_data) < len(gzip.decompress(physician_data)) / 10
+    # The hash is the CSV's, whatever the compression
+    assert hashes["REF_State"] == hashlib.sha256(REF_STATE_CSV).hexdigest()
+
+
+def test_zstd(app, database):
+    zstandard = pytest.importorskip("zstandard")
+
+    _, keys = app.accdb_stream_to_s3(database(), compression="zstd")
+
+    assert keys["REF_State"] == "MedicalBoards/California/REFS/REF_State.csv.zst"
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(_get(keys["REF_State"])) == REF_STATE_CSV
+
+
+def test_unchanged_tables_are_kept(app, database, monkeypatch):
+
+    hashes, _ = app.accdb_stream_to_s3(database())
+    boto3.client("s3").put_object(Bucket=BUCKET, Key="MedicalBoards/California/REFS/REF_State.csv", Body=b"uploaded before")
+    uploads = []
+
+    class Writer(app.MultipartUploadWriter):
+        def __init__(self, s3, bucket, key, *args, **kwargs):
+            uploads.append(key)
+            super().__init__(s3, bucket, key, *args, **kwargs)
+
+    monkeypatch.setattr(app, "MultipartUploadWriter", Writer)
+    new_hashes, _ = app.accdb_stream_to_s3(database(), previous_hashes={"REF_State": hashes["REF_State"], "PhysicianData": "0" * 64})
+
+    # Hashed before anything is sent
+    assert uploads == ["MedicalBoards/California/Dataset/PhysicianData.csv"]
+    assert new_hashes == hashes
+    assert _get("MedicalBoards/California/REFS/REF_State.csv") == b"uploaded before"
+    assert _incomplete_uploads() == []
+
+
+def test_failed_exports_abort_their_upload(app, database):
+
+    with pytest.raises(app.ExportError) as e:
+        app.accdb_stream_to_s3(database({**TABLES, "REF_State": {**TABLES["REF_State"], "exit": 2}}), compression="gzip")
+
+    assert list(e.value.failures) == ["REF_State"]
+    assert _incomplete_uploads() == []
+    assert "Contents" not in boto3.client("s3").list_objects_v2(Bucket=BUCKET, Prefix="MedicalBoards/California/REFS/")
+
+
+def test_unknown_compression(app, database):
+
+    with pytest.raises(ValueError):
+        app.get_compressor("lz4")
@@ -0,0 +1,56 @@
+import os
+
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+
+
+BUCKET = os.environ["DATA_BUCKET"]
+
+
+@pytest.fixture()
+def output_dir(tmp_path):
+    files = {
+        "REF_State.csv": b'"code","name"\n"CA","California"\n',
+        "REF_LicenseType.csv": b'"code"\n"A"\n',
+        "PhysicianData.csv": b"x" * (11 * 1024 * 1024),
+        "Discipline.csv": b'"license","action"\n',
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_bytes(content)
+    return tmp_path
+
+
+def test_uploads_every_file(app, output_dir):
+
+    timings = app.upload_csv_files(output_dir)
+
+    assert sorted(timings) == [
+        "MedicalBoards/California/Dataset/Discipline.csv",
+        "MedicalBoards/California/Dataset/PhysicianData.csv",
+        "MedicalBoards/California/REFS/REF_LicenseType.csv",
+        "MedicalBoards/California/REFS/REF_State.csv",
+    ]
+    s3 = boto3.client("s3")
+    for key in timings:
+        body = s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+        assert body == (output_dir / key.rsplit("/", 1)[1]).read_bytes()
+
+
+def test_large_files_are_uploaded_in_parts(app, output_dir, monkeypatch):
+
+    monkeypatch.setattr(app, "TRANSFER_CONFIG", TransferConfig(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024))
+
+    app.upload_csv_files(output_dir, workers=2)
+
+    s3 = boto3.client("s3")
+    assert s3.head_object(Bucket=BUCKET, Key="MedicalBoards/California/Dataset/PhysicianData.csv")["ETag"].endswith('-3"')
+    assert "-" not in s3.head_object(Bucket=BUCKET, Key="MedicalBoards/California/REFS/REF_State.csv")["ETag"]
+
+
+def test_upload_errors_are_raised(app, output_dir):
+
+    boto3.client("s3").delete_bucket(Bucket=BUCKET)
+
+    with pytest.raises(Exception, match="NoSuchBucket"):
+        app.upload_csv_files(output_dir)